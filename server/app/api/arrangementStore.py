@@ -0,0 +1,141 @@
+import re
+import time
+from datetime import timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.codec import SUMMARY, CodecError, decode_arrangement, encode_arrangement
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.logger import get_logger
+from app.metrics import CACHE_REQUESTS
+from app.models import SongArrangement, utcnow
+
+logger = get_logger(__name__)
+
+# Stored arrangements older than this are ignored and regenerated.
+ARRANGEMENT_MAX_AGE_DAYS = settings.arrangement_max_age_days
+# After a DB error, skip lookups for a while instead of failing every request.
+ERROR_COOLDOWN_SECONDS = 30.0
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def query_key(song_query: str) -> str:
+    """'Wonderwall - Oasis ' and 'wonderwall oasis' share one key."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", song_query.lower())).strip()
+
+
+def _aware(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+
+class ArrangementStore:
+    """
+    Pre-generated FullSongArrangement payloads, one row per
+    (song, instrument, simplified) variant.
+    """
+
+    def __init__(self, max_age_days: float = ARRANGEMENT_MAX_AGE_DAYS):
+        self.max_age = timedelta(days=max_age_days)
+        self._disabled_until = 0.0
+
+    def ensure_schema(self):
+        if engine.dialect.name == "sqlite":
+            # Dev fallback database: no Alembic run to create the table.
+            SongArrangement.__table__.create(bind=engine, checkfirst=True)
+
+    def lookup(self, song_query: str, instrument: str, simplified: bool):
+        if time.monotonic() < self._disabled_until:
+            return None
+        try:
+            with SessionLocal() as db:
+                row = db.execute(
+                    select(SongArrangement.arrangement, SongArrangement.updated_at)
+                    .where(
+                        SongArrangement.query_key == query_key(song_query),
+                        SongArrangement.instrument == instrument,
+                        SongArrangement.simplified == simplified,
+                    )
+                ).first()
+        except SQLAlchemyError as e:
+            self._disabled_until = time.monotonic() + ERROR_COOLDOWN_SECONDS
+            logger.warning(f"Arrangement lookup failed, skipping store for {ERROR_COOLDOWN_SECONDS:.0f}s: {e}")
+            return None
+
+        if row is None or _aware(row.updated_at) < utcnow() - self.max_age:
+            CACHE_REQUESTS.inc(cache="arrangements", result="miss")
+            return None
+        try:
+            arrangement = decode_arrangement(row.arrangement)
+        except (CodecError, UnicodeDecodeError) as e:
+            # A corrupt row is regenerated (and overwritten) like a missing one.
+            logger.warning(f"Undecodable stored arrangement for '{song_query}' ({instrument}), treating as a miss: {e}")
+            CACHE_REQUESTS.inc(cache="arrangements", result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache="arrangements", result="hit")
+        return arrangement
+
+    def summaries(self, song_id: int) -> list:
+        """Every stored variant of a song, without tablature or chord diagrams."""
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(SongArrangement.instrument, SongArrangement.simplified,
+                       SongArrangement.arrangement, SongArrangement.updated_at)
+                .where(SongArrangement.song_id == song_id)
+                .order_by(SongArrangement.instrument, SongArrangement.simplified)
+            ).all()
+        return [
+            {
+                **decode_arrangement(r.arrangement, sections=(SUMMARY,)),
+                "instrument": r.instrument,
+                "simplified": r.simplified,
+                "updatedAt": r.updated_at,
+            }
+            for r in rows
+        ]
+
+    def fresh_variants(self, keys) -> set:
+        """Subset of (query_key, instrument, simplified) that is stored and fresh."""
+        keys = set(keys)
+        if not keys:
+            return set()
+        cutoff = utcnow() - self.max_age
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(SongArrangement.query_key, SongArrangement.instrument, SongArrangement.simplified)
+                .where(SongArrangement.query_key.in_({k[0] for k in keys}))
+                .where(SongArrangement.updated_at >= cutoff)
+            ).all()
+        return {tuple(r) for r in rows} & keys
+
+    def save(self, song_query: str, instrument: str, simplified: bool, arrangement: dict,
+             song_id: int = None, demand_score: float = None):
+        key = query_key(song_query)
+        payload = encode_arrangement(arrangement)
+        with SessionLocal() as db:
+            row = db.execute(
+                select(SongArrangement).where(
+                    SongArrangement.query_key == key,
+                    SongArrangement.instrument == instrument,
+                    SongArrangement.simplified == simplified,
+                )
+            ).scalar_one_or_none()
+            if row is None:
+                row = SongArrangement(query_key=key, instrument=instrument, simplified=simplified)
+                db.add(row)
+            row.song_id = song_id
+            row.arrangement = payload
+            row.demand_score = demand_score
+            row.updated_at = utcnow()
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another writer inserted the same variant first; theirs is as good.
+                db.rollback()
+
+
+# Singleton instance
+arrangement_store = ArrangementStore()
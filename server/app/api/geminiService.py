@@ -1,15 +1,36 @@
-import os
 import re
 import json
 import asyncio
+import functools
+import threading
 import time
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-
-# Load environment variables
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+from app import deadlines
+from app.api.replayStore import ReplayMissError, provider_store
+from app.api.prompts import (
+    GEMINI_PROMPTS,
+    GEMINI_KEY_INSTRUCTIONS,
+    GEMINI_COMPLEXITY,
+    output_budget,
+    render,
+)
+from app.api.tokenUsage import token_usage
+from app.config import settings
+from app.executors import ExecutorSaturated, gemini_executor
+from app.logger import get_logger
+from app.profiling import span, to_thread
+from app.tracing import start_span
+from app.metrics import (
+    AI_MODEL_FALLBACKS,
+    AI_PARSE_FAILURES,
+    AI_PROVIDER_IN_FLIGHT,
+    AI_PROVIDER_LATENCY,
+    AI_RATE_LIMITED,
+    AI_SERVED,
+)
+
+GEMINI_API_KEY = settings.gemini_api_key
+
+logger = get_logger(__name__)
 
 # --- CONFIGURATION ---
 # We prioritize the newest, fast models. 
@@ -24,43 +45,134 @@ FALLBACK_MODELS = [
 class GeminiMusicService:
     def __init__(self):
         self.available = False
-
-        if not GEMINI_API_KEY:
-            print("❌ GEMINI_API_KEY is missing in .env file.")
+        self._route_configs = {}
+        # google.generativeai (and the grpc/IPython stack behind it) is
+        # imported on first use or by warm_up(), not at process start.
+        self._genai = None
+        self._sdk_lock = threading.Lock()
+
+        if not GEMINI_API_KEY and not provider_store.replaying:
+            logger.warning("GEMINI_API_KEY is missing in .env file; Gemini disabled", extra={"provider": "gemini"})
             return
 
+        # Global Settings (max_output_tokens is set per route)
+        self.generation_config = {
+            "temperature": 0.2, 
+            "top_p": 0.95,
+            "top_k": 40,
+            "response_mime_type": "application/json",
+        }
+
+        self.system_instruction = (
+            "You are an expert session musician and music theory professor. "
+            "You strictly output valid JSON data matching specific schemas. "
+            "You prioritize harmonic accuracy (slash chords, extensions) over simplicity. "
+            "Do not include markdown formatting (like ```json)."
+        )
+
+        # We don't instantiate a specific model here anymore, we do it per request
+        self.available = True 
+        logger.info("Gemini service initialized", extra={"provider": "gemini", "models": FALLBACK_MODELS})
+
+    def _sdk(self):
+        """The configured google.generativeai module, imported once."""
+        if self._genai is not None:
+            return self._genai
+        with self._sdk_lock:
+            if self._genai is None:
+                started = time.perf_counter()
+                import google.generativeai as genai
+                from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+                if GEMINI_API_KEY:
+                    genai.configure(api_key=GEMINI_API_KEY)
+                self.safety_settings = {
+                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+                }
+                self._genai = genai
+                logger.info("Gemini SDK loaded", extra={
+                    "provider": "gemini", "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                })
+        return self._genai
+
+    async def warm_up(self):
+        """Imports the SDK in a worker thread so the first request doesn't pay for it."""
+        if not self.available or provider_store.replaying or self._genai is not None:
+            return
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            # Global Settings
-            self.generation_config = {
-                "temperature": 0.2, 
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
-            }
-
-            self.safety_settings = {
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            }
-
-            self.system_instruction = (
-                "You are an expert session musician and music theory professor. "
-                "You strictly output valid JSON data matching specific schemas. "
-                "You prioritize harmonic accuracy (slash chords, extensions) over simplicity. "
-                "Do not include markdown formatting (like ```json)."
+            await gemini_executor.run(self._sdk)
+        except Exception:
+            self.available = False
+            logger.error("Gemini SDK failed to load; Gemini disabled", exc_info=True, extra={"provider": "gemini"})
+
+    @staticmethod
+    def _log_fields(route: str, model_name: str, started: float) -> dict:
+        return {
+            "provider": "gemini",
+            "model": model_name,
+            "route": route,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _generation_config(self, route: str) -> dict:
+        config = self._route_configs.get(route)
+        if config is None:
+            config = {**self.generation_config, "max_output_tokens": output_budget(route)}
+            self._route_configs[route] = config
+        return config
+
+    def _make_model(self, model_name: str, route: str):
+        genai = self._sdk()
+        return genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=self._generation_config(route),
+            safety_settings=self.safety_settings,
+            system_instruction=self.system_instruction
+        )
+
+    async def _call_model(self, model_name: str, route: str, prompt: str) -> str:
+        """One SDK call, or a lookup in the provider store in replay mode."""
+        if provider_store.replaying:
+            with span("gemini.replay", model=model_name):
+                entry = await provider_store.replay("gemini", model_name, prompt)
+            token_usage.record(route, "gemini", model_name, entry["promptTokens"], entry["completionTokens"])
+            return entry["text"]
+
+        if self._genai is None:
+            # First call before warm-up finished: import the SDK off the loop.
+            current_model = await asyncio.to_thread(self._make_model, model_name, route)
+        else:
+            current_model = self._make_model(model_name, route)
+        started = time.perf_counter()
+        # The SDK call can't be cancelled once it is on a worker thread, so it
+        # gets the remaining budget as its own timeout as well.
+        call = current_model.generate_content
+        left = deadlines.remaining()
+        if left is not None:
+            call = functools.partial(call, request_options={"timeout": max(left, 0.1)})
+        with AI_PROVIDER_IN_FLIGHT.track(provider="gemini"):
+            # A dedicated pool, so slow SDK calls can't starve the default
+            # executor that sync dependencies and handlers run on.
+            response = await deadlines.wait_for(
+                to_thread("gemini.generate_content", call, prompt, executor=gemini_executor), "gemini"
             )
 
-            # We don't instantiate a specific model here anymore, we do it per request
-            self.available = True 
-            print(f"✓ Gemini Service Initialized (Fallback Chain: {', '.join(FALLBACK_MODELS)})")
-
-        except Exception as e:
-            print(f"❌ Gemini initialization error: {e}")
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) if usage else 0
+        completion_tokens = getattr(usage, "candidates_token_count", 0) if usage else 0
+        if usage is not None:
+            token_usage.record(route, "gemini", model_name, prompt_tokens, completion_tokens)
+
+        text = response.text
+        if provider_store.recording and text:
+            await asyncio.to_thread(
+                provider_store.record, "gemini", model_name, route, prompt, text,
+                prompt_tokens, completion_tokens, (time.perf_counter() - started) * 1000,
+            )
+        return text
 
-    async def _generate_json(self, prompt: str) -> dict:
+    async def _generate_json(self, prompt: str, route: str) -> dict:
         """
         Smart generation that switches models if Quota Exceeded (429), Overloaded (503), or Not Found (404).
         """
@@ -70,53 +182,83 @@ class GeminiMusicService:
         last_error = None
 
         # --- FALLBACK LOOP ---
-        for model_name in FALLBACK_MODELS:
-            try:
-                # Instantiate specific model for this attempt
-                current_model = genai.GenerativeModel(
-                    model_name=model_name,
-                    generation_config=self.generation_config,
-                    safety_settings=self.safety_settings,
-                    system_instruction=self.system_instruction
-                )
-
-                # print(f"→ Trying {model_name}...") 
-
-                # Run API call
-                response = await asyncio.to_thread(current_model.generate_content, prompt)
+        for attempt, model_name in enumerate(FALLBACK_MODELS, 1):
+            deadlines.check(f"gemini {model_name}")
+            started = time.perf_counter()
+            outcome = "ok"
+            with start_span("gemini.generate", route=route, model=model_name, attempt=attempt) as trace_span:
+                try:
+                    # Run API call against a model instantiated for this attempt
+                    text = await self._call_model(model_name, route, prompt)
+
+                    if not text: 
+                        raise ValueError("Empty response")
                 
-                if not response.text: 
-                    raise ValueError("Empty response")
+                    # CLEANER
+                    with span("gemini.clean"):
+                        text = text.strip()
+                        text = re.sub(r"^```json\s*", "", text)
+                        text = re.sub(r"^```\s*", "", text)
+                        text = re.sub(r"\s*```$", "", text)
                 
-                # CLEANER
-                text = response.text.strip()
-                text = re.sub(r"^```json\s*", "", text)
-                text = re.sub(r"^```\s*", "", text)
-                text = re.sub(r"\s*```$", "", text)
+                    with span("gemini.parse", chars=len(text)):
+                        data = json.loads(text)
+                    AI_SERVED.inc(route=route, provider="gemini", model=model_name)
+                    return data
+
+                except deadlines.DeadlineExceeded:
+                    outcome = "deadline"
+                    raise
+                except ExecutorSaturated:
+                    # Another model won't help; let the caller shed or reroute.
+                    outcome = "saturated"
+                    logger.warning("Gemini executor saturated", extra=self._log_fields(route, model_name, started))
+                    raise
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    raise
+                except ReplayMissError as e:
+                    # Recordings are per model; a fallback model may have one.
+                    outcome = "replay_miss"
+                    last_error = e
+                    logger.warning("No Gemini recording for this model, switching", extra=self._log_fields(route, model_name, started))
+                    AI_MODEL_FALLBACKS.inc(route=route, model=model_name, reason=outcome)
+                except Exception as e:
+                    error_str = str(e)
+                    last_error = e
                 
-                return json.loads(text)
-
-            except Exception as e:
-                error_str = str(e)
-                last_error = e
-                
-                # LOGIC: If it's a connection/quota/model error, try the next one.
-                if "429" in error_str or "Quota" in error_str:
-                    print(f"⚠ {model_name} rate limited. Switching...")
-                    continue 
-                elif "404" in error_str or "not found" in error_str.lower():
-                    print(f"⚠ {model_name} not found (check SDK version). Switching...")
-                    continue
-                elif "503" in error_str or "Overloaded" in error_str:
-                    print(f"⚠ {model_name} overloaded. Switching...")
-                    continue
-                else:
-                    # If it's a parsing/logic error, don't switch models, just fail
-                    print(f"❌ Error with {model_name}: {e}")
-                    raise e 
+                    # LOGIC: If it's a connection/quota/model error, try the next one.
+                    if "429" in error_str or "Quota" in error_str:
+                        outcome = "rate_limited"
+                        AI_RATE_LIMITED.inc(provider="gemini", model=model_name)
+                        logger.warning("Gemini model rate limited, switching", extra=self._log_fields(route, model_name, started))
+                    elif "404" in error_str or "not found" in error_str.lower():
+                        outcome = "not_found"
+                        logger.warning("Gemini model not found (check SDK version), switching", extra=self._log_fields(route, model_name, started))
+                    elif "503" in error_str or "Overloaded" in error_str:
+                        outcome = "overloaded"
+                        logger.warning("Gemini model overloaded, switching", extra=self._log_fields(route, model_name, started))
+                    else:
+                        # If it's a parsing/logic error, don't switch models, just fail
+                        if isinstance(e, json.JSONDecodeError) or error_str == "Empty response":
+                            outcome = "parse_error"
+                            AI_PARSE_FAILURES.inc(route=route, provider="gemini")
+                        else:
+                            outcome = "error"
+                        logger.error(f"Gemini call failed: {e}", extra=self._log_fields(route, model_name, started))
+                        raise e 
+                    AI_MODEL_FALLBACKS.inc(route=route, model=model_name, reason=outcome)
+                finally:
+                    trace_span.set(outcome=outcome)
+                    if outcome != "ok":
+                        trace_span.set_status(outcome)
+                    AI_PROVIDER_LATENCY.observe(
+                        time.perf_counter() - started,
+                        route=route, provider="gemini", model=model_name, outcome=outcome,
+                    )
 
         # If we get here, ALL models failed
-        print("❌ All Gemini models exhausted.")
+        logger.error("All Gemini models exhausted", extra={"provider": "gemini", "route": route})
         raise Exception("Service busy. Please try again in 1 minute.")
 
     # ---------------------------
@@ -129,183 +271,52 @@ class GeminiMusicService:
         is_simplified = getattr(request, 'simplify', False) 
 
         if target_key and target_key != "Original":
-            key_instruction = f"TRANSPOSE the entire song to the key of {target_key}."
+            key_instruction = GEMINI_KEY_INSTRUCTIONS["transpose"].substitute(key=target_key)
         else:
-            key_instruction = "Use the ORIGINAL key of the recording."
+            key_instruction = GEMINI_KEY_INSTRUCTIONS["original"]
 
-        if is_simplified:
-            complexity = "Constraint: BEGINNER MODE. Simplify chords to open triads."
-        else:
-            complexity = (
-                "Constraint: PROFESSIONAL SESSION MODE.\n"
-                "1. PRESERVE MODULATIONS (key changes).\n"
-                "2. PRESERVE BASS LINES: Use slash chords (e.g. G/B, D/F#).\n"
-                "3. PRESERVE EXTENSIONS: Keep 'sus4', 'add9', 'maj7' voicings."
-            )
+        complexity = GEMINI_COMPLEXITY["simplified" if is_simplified else "full"]
 
-        prompt = f"""
-        Act as a professional transcriber. Create a valid JSON song sheet for "{request.songQuery}" on {instrument}.
-        {key_instruction}
-        {complexity}
-
-        Required JSON schema:
-        {{
-          "songTitle": "Exact Song Title",
-          "artist": "Artist Name", 
-          "key": "Key (e.g. C Major)",
-          "instrument": "{instrument}",
-          "tuning": "Standard (E A D G B E)",
-          "capoFret": 0,
-          "progressionSummary": ["Chord1", "Chord2"],
-          "tablature": [
-            {{
-              "section": "Verse 1",
-              "lines": [
-                {{"lyrics": "Line of lyrics with chords aligned above", "isChordLine": true}},
-                {{"lyrics": "Line of lyrics text", "isChordLine": false}}
-              ]
-            }}
-          ],
-          "chordDiagrams": [
-            {{
-                "chord": "C",
-                "frets": [-1, 3, 2, 0, 1, 0], 
-                "fingers": [0, 3, 2, 0, 1, 0],
-                "capoFret": 0
-            }}
-          ],
-          "substitutions": [
-             {{
-                "originalChord": "Target Chord", 
-                "substitutedChord": "Sub Chord", 
-                "theory": "Explanation"
-             }}
-          ],
-          "practiceTips": ["Tip 1"]
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(
+            GEMINI_PROMPTS, "chords",
+            song=request.songQuery,
+            instrument=instrument,
+            key_instruction=key_instruction,
+            complexity=complexity,
+        )
+        return await self._generate_json(prompt, "chords")
 
     async def generate_backing_track(self, prompt_text: str) -> dict:
-        full_prompt = f"""
-        Act as a music producer. Create a 1-bar loop (16 steps, 4/4) backing track: "{prompt_text}".
-        
-        Required JSON schema:
-        {{
-          "title": "Track Title",
-          "style": "Style", 
-          "bpm": 120,
-          "key": "Key",
-          "description": "Desc",
-          "youtubeQueries": ["Query 1"],
-          "tracks": [
-            {{
-              "instrument": "drums",
-              "steps": [
-                {{"beat": 0, "notes": ["kick"], "duration": 1}},
-                {{"beat": 4, "notes": ["snare"], "duration": 1}}
-              ]
-            }},
-            {{
-              "instrument": "bass",
-              "steps": [ {{"beat": 0, "notes": ["C2"], "duration": 2}} ]
-            }},
-            {{
-              "instrument": "keys",
-              "steps": [ {{"beat": 0, "notes": ["C4"], "duration": 4}} ]
-            }}
-          ]
-        }}
-        """
-        return await self._generate_json(full_prompt)
+        prompt = render(GEMINI_PROMPTS, "backing-track", prompt=prompt_text)
+        return await self._generate_json(prompt, "backing-track")
 
     async def generate_lesson(self, skill: str, instrument: str, focus: str) -> dict:
-        prompt = f"""
-        Create a lesson plan for {instrument}, Level: {skill}, Topic: {focus}.
-        
-        Required JSON schema:
-        {{
-          "title": "Lesson Title",
-          "overview": "Summary",
-          "totalDuration": "45 mins",
-          "lesson": "Markdown content...",
-          "goals": ["Goal 1"],
-          "duration": "45 mins" 
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(GEMINI_PROMPTS, "lesson", skill=skill, instrument=instrument, focus=focus)
+        return await self._generate_json(prompt, "lesson")
 
     async def generate_rhythm_pattern(self, time_sig: str, level: str) -> dict:
-        prompt = f"""
-        Create a rhythm pattern. Time: {time_sig}, Level: {level}.
-
-        Required JSON schema:
-        {{
-          "name": "Pattern Name",
-          "timeSignature": "{time_sig}",
-          "description": "How to play",
-          "pattern": [
-            {{"beat": 1, "stroke": "Down", "duration": "quarter"}},
-            {{"beat": 2, "stroke": "Up", "duration": "eighth"}}
-          ]
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(GEMINI_PROMPTS, "rhythm", time_sig=time_sig, level=level)
+        return await self._generate_json(prompt, "rhythm")
+
+    async def describe_rhythm_pattern(self, name: str, time_sig: str, level: str, grid: str) -> dict:
+        prompt = render(GEMINI_PROMPTS, "rhythm-description", name=name, time_sig=time_sig, level=level, grid=grid)
+        return await self._generate_json(prompt, "rhythm-description")
 
     async def generate_melody(self, key: str, style: str) -> dict:
-        prompt = f"""
-        Compose a short melody in {key}, {style} style.
-
-        Required JSON schema:
-        {{
-          "scale": "Scale",
-          "key": "{key}",
-          "notes": ["C4"],
-          "intervals": ["M3"],
-          "suggestion": "Tip"
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(GEMINI_PROMPTS, "melody", key=key, style=style)
+        return await self._generate_json(prompt, "melody")
 
     async def generate_improv_tips(self, query: str) -> dict:
-        prompt = f"""
-        Improvisation advice for: "{query}".
-
-        Required JSON schema:
-        {{
-            "style": "Style",
-            "recommendedScales": ["Scale"],
-            "tips": ["Tip"],
-            "backingTrackSearch": "Query"
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(GEMINI_PROMPTS, "improv", query=query)
+        return await self._generate_json(prompt, "improv")
 
     async def generate_lyrics(self, topic: str, genre: str, mood: str) -> dict:
-        prompt = f"""
-        Write lyrics. Topic: {topic}, Genre: {genre}, Mood: {mood}.
-        
-        Required JSON schema:
-        {{
-            "title": "Title",
-            "structure": ["Verse", "Chorus"],
-            "lyrics": "Lyrics with [Chords]..."
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(GEMINI_PROMPTS, "lyrics", topic=topic, genre=genre, mood=mood)
+        return await self._generate_json(prompt, "lyrics")
 
     async def get_practice_advice(self, sessions: list) -> dict:
-        prompt = f"""
-        Analyze practice sessions: {json.dumps(sessions)}.
-
-        Required JSON schema:
-        {{
-            "insight": "Observation",
-            "recommendation": "Next step",
-            "focusArea": "Focus"
-        }}
-        """
-        return await self._generate_json(prompt)
+        prompt = render(GEMINI_PROMPTS, "practice-advice", sessions=json.dumps(sessions, separators=(",", ":")))
+        return await self._generate_json(prompt, "practice-advice")
 
 # Singleton instance
 gemini_music_service = GeminiMusicService()
\ No newline at end of file
@@ -1,108 +1,178 @@
+import asyncio
 import httpx
 import json
-import re
-import os
 import time
-from dotenv import load_dotenv
-
-load_dotenv()
-GROK_API_KEY = os.getenv("GROK_API_KEY")
+from app import deadlines
+from app.api.replayStore import ReplayMissError, provider_store
+from app.config import settings
+from app.api.prompts import GROK_PROMPTS, GROK_SIMPLIFY, output_budget, render
+from app.api.tokenUsage import token_usage
+from app.logger import get_logger
+from app.profiling import span
+from app.tracing import start_span
+from app.metrics import (
+    AI_PARSE_FAILURES,
+    AI_PROVIDER_IN_FLIGHT,
+    AI_PROVIDER_LATENCY,
+    AI_RATE_LIMITED,
+    AI_SERVED,
+)
+
+logger = get_logger(__name__)
+
+GROK_API_KEY = settings.grok_api_key
+GROK_API_URL = settings.grok_api_url
+GROK_MODEL = "grok-beta"
+# Per attempt; capped at whatever is left of the request deadline.
+GROK_TIMEOUT_SECONDS = 60.0
+_JSON_DECODER = json.JSONDecoder()
 
 class GrokService:
     def __init__(self):
         self.api_key = GROK_API_KEY
         self.headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
-        self.available = bool(self.headers)
+        self.available = bool(self.headers) or provider_store.replaying
+        self.api_url = GROK_API_URL
+        # Optional httpx transport override (used by the benchmark fakes).
+        self.transport = None
 
-    async def _call_grok(self, prompt: str, max_tokens: int = 3000, retries: int = 2):
+    async def _call_grok(self, prompt: str, route: str, retries: int = 2):
+        if provider_store.replaying:
+            try:
+                with span("grok.replay"):
+                    entry = await provider_store.replay("grok", GROK_MODEL, prompt)
+            except ReplayMissError:
+                logger.warning("No Grok recording for this prompt", extra={"provider": "grok", "route": route})
+                raise
+            token_usage.record(route, "grok", GROK_MODEL, entry["promptTokens"], entry["completionTokens"])
+            return entry["text"]
         if not self.headers:
             raise Exception("GROK_API_KEY missing")
 
         payload = {
-            "model": "grok-beta",
+            "model": GROK_MODEL,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.75,
-            "max_tokens": max_tokens,
+            "max_tokens": output_budget(route),
             "top_p": 0.92
         }
 
         for attempt in range(retries + 1):
+            deadlines.check(f"grok attempt {attempt + 1}")
+            started = time.perf_counter()
+            outcome = "ok"
+            wait = 2 ** attempt
+            trace_span = start_span("grok.request", route=route, model=GROK_MODEL, attempt=attempt + 1)
             try:
-                async with httpx.AsyncClient(timeout=60.0) as client:
-                    resp = await client.post(
-                        "https://api.x.ai/v1/chat/completions",
-                        json=payload,
-                        headers=self.headers
-                    )
+                timeout = deadlines.timeout(GROK_TIMEOUT_SECONDS)
+                async with httpx.AsyncClient(timeout=timeout, transport=self.transport) as client:
+                    with AI_PROVIDER_IN_FLIGHT.track(provider="grok"), span("grok.http", attempt=attempt + 1), trace_span:
+                        # Let x.ai correlate the call with our trace.
+                        traceparent = trace_span.traceparent()
+                        headers = {**self.headers, "traceparent": traceparent} if traceparent else self.headers
+                        resp = await client.post(
+                            self.api_url,
+                            json=payload,
+                            headers=headers
+                        )
+                        trace_span.set(status_code=resp.status_code)
+                        if resp.status_code == 429:
+                            trace_span.set_status("rate_limited")
                     if resp.status_code == 429:
-                        wait = 2 ** attempt
-                        print(f"Grok rate limited — retrying in {wait}s (attempt {attempt + 1})")
-                        time.sleep(wait)
-                        continue
-                    resp.raise_for_status()
-                    return resp.json()["choices"][0]["message"]["content"]
+                        outcome = "rate_limited"
+                        AI_RATE_LIMITED.inc(provider="grok", model=GROK_MODEL)
+                        logger.warning("Grok rate limited, retrying", extra=self._log_fields(route, attempt, wait, started))
+                    else:
+                        resp.raise_for_status()
+                        body = resp.json()
+                        usage = body.get("usage") or {}
+                        token_usage.record(
+                            route, "grok", GROK_MODEL,
+                            usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                        )
+                        content = body["choices"][0]["message"]["content"]
+                        if provider_store.recording and content:
+                            await asyncio.to_thread(
+                                provider_store.record, "grok", GROK_MODEL, route, prompt, content,
+                                usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                                (time.perf_counter() - started) * 1000,
+                            )
+                        return content
+            except asyncio.CancelledError:
+                # Client went away or the deadline hit; closing the client aborts the call.
+                outcome = "cancelled"
+                raise
             except Exception as e:
+                outcome = "error"
+                if isinstance(e, httpx.TimeoutException) and timeout < GROK_TIMEOUT_SECONDS:
+                    # The timeout was the request deadline's, not x.ai's.
+                    outcome = "deadline"
+                    raise deadlines.DeadlineExceeded(f"grok attempt {attempt + 1}: deadline exceeded") from e
                 if attempt == retries:
                     raise e
-                wait = 2 ** attempt
-                print(f"Grok request failed — retrying in {wait}s (attempt {attempt + 1})")
-                time.sleep(wait)
+                logger.warning(f"Grok request failed, retrying: {e}", extra=self._log_fields(route, attempt, wait, started))
+            finally:
+                AI_PROVIDER_LATENCY.observe(
+                    time.perf_counter() - started,
+                    route=route, provider="grok", model=GROK_MODEL, outcome=outcome,
+                )
+
+            # Back off without blocking the event loop, if the budget allows
+            # another attempt after the wait.
+            if attempt < retries:
+                deadlines.check("grok retry", need=wait + deadlines.MIN_ATTEMPT_SECONDS)
+                await asyncio.sleep(wait)
+
+        raise Exception("Grok rate limited on every attempt")
+
+    @staticmethod
+    def _log_fields(route: str, attempt: int, wait: float, started: float) -> dict:
+        return {
+            "provider": "grok",
+            "model": GROK_MODEL,
+            "route": route,
+            "attempt": attempt + 1,
+            "retry_in_s": wait,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
 
-    def _extract_json(self, text: str):
+    def _extract_json(self, text: str, route: str):
+        with span("grok.parse", chars=len(text or "")):
+            data = self._parse_json(text)
+        if data is None:
+            AI_PARSE_FAILURES.inc(route=route, provider="grok")
+        else:
+            AI_SERVED.inc(route=route, provider="grok", model=GROK_MODEL)
+        return data
+
+    def _parse_json(self, text: str):
+        """The first JSON object in the reply, however deeply nested or wrapped in prose."""
         if not text:
             return None
-        match = re.search(r"\{(?:[^{}]|(?:\{[^{}]*\}))*\}", text, re.DOTALL)
-        if not match:
-            return None
-        try:
-            return json.loads(match.group(0))
-        except json.JSONDecodeError:
-            return None
+        start = text.find("{")
+        while start != -1:
+            try:
+                data, _ = _JSON_DECODER.raw_decode(text, start)
+                if isinstance(data, dict):
+                    return data
+            except json.JSONDecodeError:
+                pass
+            start = text.find("{", start + 1)
+        return None
 
     async def generate_song_arrangement(self, request):
         if not self.available:
             raise Exception("Grok service not available")
 
         instrument = getattr(request, 'instrument', 'Guitar')
-        simplify = "Use only easy open chords" if getattr(request, 'simplify', True) else "Include richer voicings"
-
-        prompt = f"""
-You are UltimateGuitar.com's best transcriber.
-Song: "{request.songQuery}"
-Instrument: {instrument}
-{simplify}
+        simplify = GROK_SIMPLIFY[bool(getattr(request, 'simplify', True))]
 
-Return ONLY valid JSON — no markdown:
-{{
-  "songTitle": "Exact title",
-  "artist": "Artist name",
-  "key": "e.g. C Major",
-  "instrument": "{instrument}",
-  "tuning": "E A D G B E",
-  "progressionSummary": ["C", "Am", "F", "G"],
-  "tablature": [
-    {{
-      "section": "Verse 1",
-      "lines": [
-        {{"lyrics": "C               Am", "isChordLine": true}},
-        {{"lyrics": "Fly me to the moon", "isChordLine": false}}
-      ]
-    }}
-  ],
-  "chordDiagrams": [
-    {{"chord": "C", "frets": [-1,3,2,0,1,0], "fingers": [0,3,2,0,1,0], "capoFret": 0}}
-  ],
-  "substitutions": [],
-  "practiceTips": ["Practice at 70 BPM", "Focus on clean changes"]
-}}
-Use real chords & lyrics. Return ONLY JSON.
-"""
-
-        text = await self._call_grok(prompt)
+        prompt = render(GROK_PROMPTS, "chords", song=request.songQuery, instrument=instrument, simplify=simplify)
+        text = await self._call_grok(prompt, "chords")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
+        data = self._extract_json(text, "chords")
         if not data:
             raise ValueError("Grok did not return valid JSON")
         return data
@@ -111,33 +181,12 @@ Use real chords & lyrics. Return ONLY JSON.
         if not self.available:
             raise Exception("Grok service not available")
 
-        full_prompt = f"""
-Create a backing track arrangement based on: {prompt}
-
-Return ONLY valid JSON with this structure:
-{{
-  "title": "Track Title",
-  "style": "pop rock",
-  "bpm": 120,
-  "key": "C major",
-  "tracks": [
-    {{
-      "instrument": "drums",
-      "steps": [
-        {{"beat": 1, "notes": ["kick"]}},
-        {{"beat": 2, "notes": ["snare"]}}
-      ]
-    }}
-  ],
-  "youtubeQueries": ["search term 1", "search term 2"],
-  "description": "Brief description"
-}}
-"""
-        text = await self._call_grok(full_prompt)
+        full_prompt = render(GROK_PROMPTS, "backing-track", prompt=prompt)
+        text = await self._call_grok(full_prompt, "backing-track")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
+        data = self._extract_json(text, "backing-track")
         if not data:
             raise ValueError("Grok did not return valid JSON for backing track")
         return data
@@ -146,27 +195,38 @@ Return ONLY valid JSON with this structure:
         if not self.available:
             raise Exception("Grok service not available")
 
-        prompt = f"Generate a {level} {time_sig} drum pattern in 16th notes. Return ONLY JSON: {{'pattern': 'x--x--x--x--x--x-', 'description': 'brief description', 'difficulty': '{level}'}}"
-        text = await self._call_grok(prompt)
+        prompt = render(GROK_PROMPTS, "rhythm", level=level, time_sig=time_sig)
+        text = await self._call_grok(prompt, "rhythm")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
+        data = self._extract_json(text, "rhythm")
         if not data or "pattern" not in data:
             raise ValueError("Grok did not return valid rhythm pattern")
         return data
 
+    async def describe_rhythm_pattern(self, name: str, time_sig: str, level: str, grid: str):
+        if not self.available:
+            raise Exception("Grok service not available")
+
+        prompt = render(GROK_PROMPTS, "rhythm-description", name=name, time_sig=time_sig, level=level, grid=grid)
+        text = await self._call_grok(prompt, "rhythm-description")
+        data = self._extract_json(text, "rhythm-description")
+        if not data or "description" not in data:
+            raise ValueError("Grok did not return a rhythm description")
+        return data
+
     async def generate_melody(self, key: str, style: str):
         if not self.available:
             raise Exception("Grok service not available")
 
-        prompt = f"Write a short {style} melody in {key} using note names and durations (e.g. C4/4 E4/4 G4/2). Return ONLY JSON: {{'melody': 'C4 E4 G4', 'description': 'brief description', 'style': '{style}'}}"
-        text = await self._call_grok(prompt)
+        prompt = render(GROK_PROMPTS, "melody", key=key, style=style)
+        text = await self._call_grok(prompt, "melody")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
-        if not data or "melody" not in data:
+        data = self._extract_json(text, "melody")
+        if not data:
             raise ValueError("Grok did not return valid melody")
         return data
 
@@ -174,12 +234,12 @@ Return ONLY valid JSON with this structure:
         if not self.available:
             raise Exception("Grok service not available")
 
-        prompt = f"Give 3 concise improv tips for {query}. Return ONLY valid JSON with 'response', 'scales', 'targetNotes', 'techniques'."
-        text = await self._call_grok(prompt)
+        prompt = render(GROK_PROMPTS, "improv", query=query)
+        text = await self._call_grok(prompt, "improv")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
+        data = self._extract_json(text, "improv")
         if not data:
             raise ValueError("Grok did not return valid improv tips")
         return data
@@ -188,13 +248,13 @@ Return ONLY valid JSON with this structure:
         if not self.available:
             raise Exception("Grok service not available")
 
-        prompt = f"Write original lyrics about {topic} in {genre} style, {mood} mood. Verse-Chorus structure. Return ONLY JSON: {{'lyrics': 'full lyrics here', 'title': 'optional title', 'structure': 'verse-chorus'}}"
-        text = await self._call_grok(prompt)
+        prompt = render(GROK_PROMPTS, "lyrics", topic=topic, genre=genre, mood=mood)
+        text = await self._call_grok(prompt, "lyrics")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
-        if not data or "lyrics" not in data:
+        data = self._extract_json(text, "lyrics")
+        if not data:
             raise ValueError("Grok did not return valid lyrics")
         return data
 
@@ -202,13 +262,13 @@ Return ONLY valid JSON with this structure:
         if not self.available:
             raise Exception("Grok service not available")
 
-        prompt = f"Analyze these practice sessions and give personalized advice: {json.dumps(sessions[:3])}. Return ONLY JSON: {{'advice': 'main advice', 'insights': ['insight1', 'insight2'], 'nextGoals': ['goal1', 'goal2']}}"
-        text = await self._call_grok(prompt)
+        prompt = render(GROK_PROMPTS, "practice-advice", sessions=json.dumps(sessions[:3], separators=(",", ":")))
+        text = await self._call_grok(prompt, "practice-advice")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
-        if not data or "advice" not in data:
+        data = self._extract_json(text, "practice-advice")
+        if not data:
             raise ValueError("Grok did not return valid practice advice")
         return data
 
@@ -216,45 +276,13 @@ Return ONLY valid JSON with this structure:
         if not self.available:
             raise Exception("Grok service not available")
 
-        prompt = f"""
-You are an excellent, patient {instrument} teacher.
-Write a clear, detailed, and encouraging lesson for a {skill.title()} player focusing on {focus}.
-Use Markdown. Aim for 600–900 words — thorough but readable.
-
-Return ONLY valid JSON with this structure:
-{{
-  "lesson": "# Full markdown lesson content here...",
-  "title": "{focus.title()} Lesson",
-  "duration": "30-45 minutes",
-  "goals": ["Goal 1", "Goal 2", "Goal 3"]
-}}
-
-Structure the lesson with:
-# {focus.title()} – {skill.title()} Level Lesson
-
-## Goals Today
-- Goal 1
-- Goal 2
-- Goal 3
-
-## Warm-Up (5 mins)
-Brief warm-up with tempo
-
-## Core Idea
-Explain the concept clearly with 1–2 examples
-
-## 3 Exercises
-Include tabs/fingerings
-
-Return ONLY the JSON, no other text.
-"""
-
-        text = await self._call_grok(prompt, max_tokens=4000)
+        prompt = render(GROK_PROMPTS, "lesson", instrument=instrument, skill=skill.title(), focus=focus.title())
+        text = await self._call_grok(prompt, "lesson")
         if not text:
             raise ValueError("Empty response from Grok")
             
-        data = self._extract_json(text)
-        if not data or "lesson" not in data:
+        data = self._extract_json(text, "lesson")
+        if not data:
             raise ValueError("Grok did not return valid lesson")
         
         return data
@@ -0,0 +1,243 @@
+# app/api/melodyArray.py
+"""
+Array-backed melodies.
+
+Melodies used to be note-name strings ("C4/4 E4/4 G4/2") re-parsed by every
+consumer. `MelodyArray` parses once into four parallel numpy arrays (MIDI
+pitch, onset and duration in ticks, velocity), so transposition, range,
+interval histograms and contour are single vectorized operations.
+
+Stored form (`melodies.melody_data`, via app.models.MelodyType):
+
+    b"NXM" | version u8 | note count u32 | pitch int16[n] | onset int32[n]
+    | duration int32[n] | velocity uint8[n]        (little-endian)
+
+Decoding is a few `np.frombuffer` views, no parsing. The melodies table
+also stores pitch_min/pitch_max/pitch_span/note_count, so range filters
+("within an octave") run in SQL; see `span_at_most`.
+
+    python -m app.api.melodyArray     # whole-table analytics
+"""
+import re
+import struct
+import time
+
+import numpy as np
+
+PPQ = 480                 # ticks per quarter note
+DEFAULT_VELOCITY = 96
+MAGIC = b"NXM"
+FORMAT_VERSION = 1
+# Interval histogram bins: unison up to two octaves; wider leaps land in the last bin.
+MAX_INTERVAL = 24
+
+_HEADER = struct.Struct("<3sBI")
+# Note or rest, optional octave, optional "/denominator" duration (4 = quarter).
+_TOKEN = re.compile(r"([A-Ga-g]|[Rr])([#b]?)(-?\d)?(?:/([\d.]+))?")
+_PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+_DTYPES = (("pitch", "<i2"), ("onset", "<i4"), ("duration", "<i4"), ("velocity", "u1"))
+
+
+class MelodyArray:
+    __slots__ = ("pitch", "onset", "duration", "velocity")
+
+    def __init__(self, pitch, onset=None, duration=None, velocity=None):
+        self.pitch = np.asarray(pitch, dtype=np.int16)
+        n = len(self.pitch)
+        if duration is None:
+            duration = np.full(n, PPQ, dtype=np.int32)
+        self.duration = np.asarray(duration, dtype=np.int32)
+        if onset is None:
+            onset = np.concatenate(([0], np.cumsum(self.duration[:-1]))) if n else []
+        self.onset = np.asarray(onset, dtype=np.int32)
+        if velocity is None:
+            velocity = np.full(n, DEFAULT_VELOCITY, dtype=np.uint8)
+        self.velocity = np.asarray(velocity, dtype=np.uint8)
+
+    # ---------------------------
+    # Conversion
+    # ---------------------------
+
+    @classmethod
+    def from_names(cls, melody) -> "MelodyArray":
+        """'C4/4 E4/8 R/8 G4/2' or ['C4', 'E4'] (octave defaults to 4, duration to a quarter)."""
+        tokens = melody if isinstance(melody, (list, tuple)) else re.split(r"[\s,|]+", str(melody))
+        pitch, onset, duration = [], [], []
+        tick = 0
+        for token in tokens:
+            match = _TOKEN.fullmatch(str(token).strip())
+            if not match:
+                continue
+            letter, accidental, octave, denominator = match.groups()
+            length = round(PPQ * 4 / float(denominator)) if denominator else PPQ
+            if letter.upper() != "R":
+                offset = {"#": 1, "b": -1}.get(accidental, 0)
+                octave = int(octave) if octave else 4
+                pitch.append((octave + 1) * 12 + _PITCH_CLASSES[letter.upper()] + offset)
+                onset.append(tick)
+                duration.append(length)
+            tick += length
+        return cls(pitch, onset, duration)
+
+    def names(self) -> list:
+        """['C4', 'E4', ...] (sharps)."""
+        return [f"{_NAMES[p % 12]}{p // 12 - 1}" for p in self.pitch.tolist()]
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(self))]
+        parts += [getattr(self, name).astype(dtype, copy=False).tobytes() for name, dtype in _DTYPES]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob) -> "MelodyArray":
+        blob = bytes(blob) if isinstance(blob, memoryview) else blob
+        magic, version, n = _HEADER.unpack_from(blob)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"not a v{FORMAT_VERSION} melody blob")
+        melody = cls.__new__(cls)
+        offset = _HEADER.size
+        for name, dtype in _DTYPES:
+            array = np.frombuffer(blob, dtype=dtype, count=n, offset=offset)
+            setattr(melody, name, array)
+            offset += array.nbytes
+        return melody
+
+    @classmethod
+    def coerce(cls, value) -> "MelodyArray":
+        """A MelodyArray from itself, a stored blob, or note names."""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            if bytes(value[:3]) == MAGIC:
+                return cls.from_bytes(value)
+            value = bytes(value).decode()
+        return cls.from_names(value)
+
+    # ---------------------------
+    # Analysis
+    # ---------------------------
+
+    def __len__(self):
+        return len(self.pitch)
+
+    def __eq__(self, other):
+        return isinstance(other, MelodyArray) and all(
+            np.array_equal(getattr(self, name), getattr(other, name)) for name, _ in _DTYPES
+        )
+
+    def __repr__(self):
+        return f"MelodyArray({' '.join(self.names()[:8])}{' ...' if len(self) > 8 else ''})"
+
+    def transpose(self, semitones: int) -> "MelodyArray":
+        pitch = np.clip(self.pitch.astype(np.int32) + semitones, 0, 127)
+        return MelodyArray(pitch, self.onset, self.duration, self.velocity)
+
+    @property
+    def pitch_min(self):
+        return int(self.pitch.min()) if len(self) else None
+
+    @property
+    def pitch_max(self):
+        return int(self.pitch.max()) if len(self) else None
+
+    @property
+    def span(self) -> int:
+        """Range in semitones (0 for an empty melody)."""
+        return int(self.pitch.max() - self.pitch.min()) if len(self) else 0
+
+    def intervals(self) -> np.ndarray:
+        """Signed semitone steps between consecutive notes."""
+        return np.diff(self.pitch.astype(np.int32))
+
+    def interval_histogram(self) -> np.ndarray:
+        """Counts of |interval| 0..MAX_INTERVAL semitones."""
+        return np.bincount(np.minimum(np.abs(self.intervals()), MAX_INTERVAL), minlength=MAX_INTERVAL + 1)
+
+    def contour(self) -> np.ndarray:
+        """-1 / 0 / +1 per step: the melody's up-down shape."""
+        return np.sign(self.intervals()).astype(np.int8)
+
+
+# ---------------------------
+# Table-level queries
+# ---------------------------
+
+def span_at_most(semitones: int):
+    """SQL filter: melodies whose range fits in `semitones` (12 = an octave)."""
+    from app.models import Melody
+
+    return Melody.pitch_span <= semitones
+
+
+def analyze(blobs) -> dict:
+    """
+    Aggregate statistics over stored melody blobs. Only the pitch bytes of
+    each blob are sliced out; they are concatenated once and intervals for
+    every melody are computed in one pass, masking the steps that would
+    cross from one melody to the next.
+    """
+    chunks, lengths = [], []
+    for blob in blobs:
+        if isinstance(blob, (bytes, memoryview)) and blob[:3] == MAGIC:
+            n = _HEADER.unpack_from(blob)[2]
+            chunks.append(blob[_HEADER.size:_HEADER.size + 2 * n])
+        else:
+            melody = MelodyArray.coerce(blob)
+            n = len(melody)
+            chunks.append(melody.pitch.astype("<i2").tobytes())
+        lengths.append(n)
+    if not lengths:
+        return {"melodies": 0, "notes": 0}
+
+    pitch = np.frombuffer(b"".join(chunks), dtype="<i2").astype(np.int32)
+    lengths = np.asarray(lengths)
+    ends = np.cumsum(lengths)
+    steps = np.diff(pitch)
+    # Position i is a step inside one melody unless i+1 starts the next one.
+    starts = ends[:-1]
+    inside = np.ones(len(steps), dtype=bool)
+    inside[starts[(starts > 0) & (starts <= len(steps))] - 1] = False
+    steps = steps[inside]
+
+    non_empty = lengths > 0
+    first = (ends - lengths)[non_empty]
+    spans = np.maximum.reduceat(pitch, first) - np.minimum.reduceat(pitch, first) if first.size else np.empty(0)
+
+    return {
+        "melodies": int(len(lengths)),
+        "notes": int(lengths.sum()),
+        "pitchHistogram": np.bincount(pitch % 12, minlength=12).tolist(),
+        "intervalHistogram": np.bincount(np.minimum(np.abs(steps), MAX_INTERVAL), minlength=MAX_INTERVAL + 1).tolist(),
+        "contour": {
+            "up": int((steps > 0).sum()), "down": int((steps < 0).sum()), "repeat": int((steps == 0).sum()),
+        },
+        "spanPercentiles": {
+            str(p): int(v) for p, v in zip((50, 90, 99), np.percentile(spans, (50, 90, 99))) if spans.size
+        },
+        "withinOctave": float((spans <= 12).mean()) if spans.size else 0.0,
+    }
+
+
+def analyze_table(batch_size: int = 10000) -> dict:
+    """`analyze` over the melodies table, streamed in batches."""
+    from sqlalchemy import LargeBinary, select, type_coerce
+
+    from app.database import SessionLocal
+    from app.models import Melody
+
+    with SessionLocal() as db:
+        # Raw bytes: skip the ORM type's per-row decode.
+        rows = db.execute(
+            select(type_coerce(Melody.melody_data, LargeBinary)).where(Melody.melody_data.is_not(None))
+        ).yield_per(batch_size)
+        return analyze(row[0] for row in rows)
+
+
+if __name__ == "__main__":
+    import json
+
+    started = time.perf_counter()
+    stats = analyze_table()
+    stats["durationSeconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(stats, indent=2))
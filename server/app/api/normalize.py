@@ -0,0 +1,337 @@
+# app/api/normalize.py
+"""
+Repairs provider output into the response models in app/schemas.py.
+
+Gemini is prompted with the schemas themselves; Grok's prompts still ask
+for older shapes (a melody string, "scales"/"techniques", a "verse-chorus"
+structure string, "advice"/"insights"/"nextGoals"), and either provider
+occasionally returns a string where a list is expected. Instead of turning
+a paid call into a 500, `normalize` validates the payload as-is and only
+when that fails maps known alternate shapes, coerces scalar/list mismatches
+and derives missing fields from the payload or the request, then validates
+once more. Validators are built once per route at import.
+"""
+import re
+from typing import List, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.logger import get_logger
+from app.metrics import AI_NORMALIZED
+from app.schemas import (
+    BackingTrackResult,
+    FullSongArrangement,
+    ImprovTipsResult,
+    LessonResult,
+    LyricsResult,
+    MelodySuggestionResult,
+    PracticeAdviceResult,
+)
+
+logger = get_logger(__name__)
+
+
+class NormalizationError(ValueError):
+    """Provider output that could not be repaired into the route's schema."""
+
+
+ROUTE_MODELS = {
+    "chords": FullSongArrangement,
+    "backing-track": BackingTrackResult,
+    "melody": MelodySuggestionResult,
+    "improv": ImprovTipsResult,
+    "lyrics": LyricsResult,
+    "practice-advice": PracticeAdviceResult,
+    "lesson": LessonResult,
+}
+_VALIDATORS = {route: TypeAdapter(model) for route, model in ROUTE_MODELS.items()}
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def _split_list(text: str) -> List[str]:
+    """'a, b' / bulleted lines -> ['a', 'b']."""
+    parts = text.splitlines() if "\n" in text.strip() else re.split(r"[;,]", text)
+    return [p for p in (_BULLET.sub("", part).strip() for part in parts) if p]
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return _split_list(value)
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if v is not None and str(v).strip()]
+    return [str(value)]
+
+
+def _as_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return "\n".join(str(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def _first(data: dict, *names):
+    for name in names:
+        value = data.get(name)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def _coerce_fields(model, data: dict):
+    """Top-level str <-> List[str] mismatches, in place."""
+    for name, field in model.model_fields.items():
+        value = data.get(name)
+        if value is None:
+            continue
+        annotation = field.annotation
+        if annotation is str and not isinstance(value, str):
+            if isinstance(value, (list, tuple, int, float)):
+                data[name] = _as_text(value)
+        elif get_origin(annotation) in (list, List) and get_args(annotation) == (str,) and isinstance(value, str):
+            data[name] = _split_list(value)
+
+
+# ---------------------------
+# Music theory (melody)
+# ---------------------------
+
+# Note name, optional octave, optional "/duration" suffix.
+_NOTE = re.compile(r"([A-Ga-g])([#b]?)(-?\d)?(?:/[\d.]+)?")
+_PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_INTERVAL_NAMES = ("P1", "m2", "M2", "m3", "M3", "P4", "TT", "P5", "m6", "M6", "m7", "M7")
+
+
+def _parse_notes(melody) -> List[str]:
+    """'C4/4 E4/4 G4/2' or ['C4', 'E4'] -> ['C4', 'E4', 'G4']; rests dropped."""
+    tokens = melody if isinstance(melody, list) else re.split(r"[\s,|]+", str(melody))
+    notes = []
+    for token in tokens:
+        match = _NOTE.fullmatch(str(token).strip())
+        if match:
+            letter, accidental, octave = match.groups()
+            notes.append(f"{letter.upper()}{accidental}{octave or ''}")
+    return notes
+
+
+def _midi(note: str):
+    match = _NOTE.match(note)
+    if not match:
+        return None
+    letter, accidental, octave = match.groups()
+    offset = {"#": 1, "b": -1}.get(accidental, 0)
+    return (int(octave) if octave else 4) * 12 + _PITCH_CLASSES[letter.upper()] + offset
+
+
+def _intervals(notes: List[str]) -> List[str]:
+    pitches = [p for p in map(_midi, notes) if p is not None]
+    names = []
+    for a, b in zip(pitches, pitches[1:]):
+        step = abs(b - a)
+        names.append("P8" if step and step % 12 == 0 else _INTERVAL_NAMES[step % 12])
+    return names
+
+
+def _scale_for_key(key: str) -> str:
+    match = re.match(r"\s*([A-Ga-g][#b]?)\s*(.*)$", key or "")
+    if not match:
+        return key
+    tonic, quality = match.group(1).capitalize(), match.group(2).strip().lower()
+    if quality in ("", "major", "maj"):
+        return f"{tonic} major"
+    if quality in ("m", "min", "minor"):
+        return f"{tonic} natural minor"
+    return f"{tonic} {quality}"
+
+
+# ---------------------------
+# Per-route repairs
+# ---------------------------
+# Each fills missing fields in place from alternate keys or the request
+# context; type coercion of declared fields happens afterwards.
+
+def _repair_chords(data: dict, context: dict):
+    request = context.get("request")
+    if not data.get("songTitle") and request is not None:
+        data["songTitle"] = request.songQuery
+    if not data.get("instrument") and request is not None:
+        data["instrument"] = request.instrument
+    if not data.get("artist"):
+        data["artist"] = "Unknown Artist"
+    for diagram in data.get("chordDiagrams") or []:
+        if isinstance(diagram, dict) and isinstance(diagram.get("frets"), list):
+            diagram["frets"] = ["X" if str(f).lower() == "x" else f for f in diagram["frets"]]
+
+
+_TRACK_ALIASES = {
+    "drum": "drums", "percussion": "drums", "bass guitar": "bass",
+    "piano": "keys", "keyboard": "keys", "keyboards": "keys", "organ": "keys",
+    "electric guitar": "guitar", "pad": "synth", "synths": "synth",
+}
+
+
+def _repair_backing_track(data: dict, context: dict):
+    tracks = []
+    for track in data.get("tracks") or []:
+        if not isinstance(track, dict):
+            continue
+        name = str(track.get("instrument", "")).strip().lower()
+        track["instrument"] = _TRACK_ALIASES.get(name, name)
+        for step in track.get("steps") or []:
+            if isinstance(step, dict) and isinstance(step.get("notes"), str):
+                step["notes"] = [step["notes"]]
+        tracks.append(track)
+    data["tracks"] = tracks
+    if not data.get("style") and context.get("prompt"):
+        data["style"] = context["prompt"]
+    if not data.get("title"):
+        data["title"] = data.get("style") or "Backing Track"
+
+
+def _repair_melody(data: dict, context: dict):
+    if not data.get("key"):
+        data["key"] = context.get("key", "")
+    if not data.get("notes"):
+        data["notes"] = _parse_notes(_first(data, "melody", "sequence") or [])
+    elif isinstance(data["notes"], str):
+        data["notes"] = _parse_notes(data["notes"])
+    if not data.get("intervals"):
+        data["intervals"] = _intervals(data["notes"])
+    if not data.get("scale"):
+        data["scale"] = _scale_for_key(data["key"])
+    if not data.get("suggestion"):
+        data["suggestion"] = _as_text(_first(data, "description", "tips", "advice") or "")
+    if not data["notes"]:
+        # Nothing to play: let validation reject it.
+        data.pop("notes")
+
+
+def _repair_improv(data: dict, context: dict):
+    if not data.get("style"):
+        data["style"] = context.get("query", "")
+    if not data.get("recommendedScales"):
+        data["recommendedScales"] = _as_list(_first(data, "scales", "scale"))
+    if not data.get("tips"):
+        tips = _as_list(_first(data, "techniques", "advice"))
+        if isinstance(data.get("response"), str):
+            tips.insert(0, data["response"].strip())
+        targets = _as_list(data.get("targetNotes"))
+        if targets:
+            tips.append("Target notes: " + ", ".join(targets))
+        if tips:
+            data["tips"] = tips
+    if not data.get("backingTrackSearch"):
+        data["backingTrackSearch"] = f"{data['style']} backing track".strip()
+
+
+_SECTION_HEADER = re.compile(
+    r"^\s*\[?((?:pre-?)?(?:verse|chorus|bridge|intro|outro|hook|refrain)\b[^\]:\n]*)\]?:?\s*$", re.I | re.M
+)
+
+
+def _split_structure(text: str) -> List[str]:
+    parts = re.split(r"\s*(?:,|/|>|\||->|–|—|(?<!pre)-)\s*", text, flags=re.I)
+    return [p.strip().title() for p in parts if p.strip()]
+
+
+def _repair_lyrics(data: dict, context: dict):
+    if isinstance(data.get("lyrics"), (list, tuple)):
+        data["lyrics"] = "\n".join(map(str, data["lyrics"]))
+    structure = data.get("structure")
+    if isinstance(structure, str):
+        data["structure"] = _split_structure(structure)
+    elif not structure and isinstance(data.get("lyrics"), str):
+        data["structure"] = [h.strip().title() for h in _SECTION_HEADER.findall(data["lyrics"])]
+    if not data.get("title"):
+        data["title"] = str(context.get("topic", "Untitled")).title()
+
+
+def _repair_practice_advice(data: dict, context: dict):
+    insights = _as_list(_first(data, "insights", "observations"))
+    goals = _as_list(_first(data, "nextGoals", "goals"))
+    advice = _as_text(_first(data, "advice", "summary"))
+    if not data.get("insight"):
+        data["insight"] = " ".join(insights) or advice
+    if not data.get("recommendation"):
+        data["recommendation"] = advice or " ".join(goals)
+    if not data.get("focusArea"):
+        data["focusArea"] = goals[0] if goals else "General practice"
+
+
+_GOALS_SECTION = re.compile(r"^#+\s*(?:[^\n]*\bgoals?\b)[^\n]*\n(.*?)(?=^#|\Z)", re.I | re.M | re.S)
+
+
+def _repair_lesson(data: dict, context: dict):
+    lesson = _as_text(data.get("lesson"))
+    if not data.get("title"):
+        heading = re.search(r"^#\s+(.+)$", lesson, re.M)
+        focus = context.get("focus")
+        data["title"] = heading.group(1).strip() if heading else f"{str(focus).title()} Lesson" if focus else "Lesson"
+    if isinstance(data.get("duration"), (int, float)):
+        data["duration"] = f"{int(data['duration'])} mins"
+    elif not data.get("duration"):
+        data["duration"] = "45 mins"
+    if not data.get("goals"):
+        section = _GOALS_SECTION.search(lesson)
+        data["goals"] = _as_list(section.group(1)) if section else []
+
+
+_REPAIRS = {
+    "chords": _repair_chords,
+    "backing-track": _repair_backing_track,
+    "melody": _repair_melody,
+    "improv": _repair_improv,
+    "lyrics": _repair_lyrics,
+    "practice-advice": _repair_practice_advice,
+    "lesson": _repair_lesson,
+}
+
+# ---------------------------
+# Entry point
+# ---------------------------
+
+
+def normalize(route: str, data, provider: str = "unknown", **context):
+    """
+    The route's response model built from provider output. Raises
+    NormalizationError when the payload can't be repaired. Routes without
+    a model pass through unchanged.
+    """
+    validator = _VALIDATORS.get(route)
+    if validator is None:
+        return data
+    if isinstance(data, BaseModel):
+        data = data.model_dump()
+
+    try:
+        result = validator.validate_python(data)
+        AI_NORMALIZED.inc(route=route, provider=provider, outcome="valid")
+        return result
+    except ValidationError:
+        pass
+
+    if not isinstance(data, dict):
+        AI_NORMALIZED.inc(route=route, provider=provider, outcome="rejected")
+        raise NormalizationError(f"{route}: expected a JSON object, got {type(data).__name__}")
+
+    repaired = dict(data)
+    _REPAIRS[route](repaired, context)
+    _coerce_fields(ROUTE_MODELS[route], repaired)
+    try:
+        result = validator.validate_python(repaired)
+    except ValidationError as e:
+        AI_NORMALIZED.inc(route=route, provider=provider, outcome="rejected")
+        fields = sorted({".".join(map(str, err["loc"])) for err in e.errors()})
+        raise NormalizationError(f"{route}: unrepairable response ({', '.join(fields)})") from e
+
+    AI_NORMALIZED.inc(route=route, provider=provider, outcome="repaired")
+    logger.debug(
+        "Repaired provider response",
+        extra={"route": route, "provider": provider, "keys": sorted(data)},
+    )
+    return result
@@ -0,0 +1,146 @@
+from string import Template
+from app.profiling import span
+
+# --- OUTPUT BUDGETS ---
+# max output tokens per route, shared by Gemini and Grok. Sized from the
+# largest responses we see in practice plus headroom; a full arrangement with
+# tablature is the only payload that needs thousands of tokens.
+OUTPUT_TOKEN_BUDGETS = {
+    "chords": 4096,
+    "backing-track": 1024,
+    "lesson": 2048,
+    "lyrics": 1024,
+    "improv": 384,
+    "melody": 256,
+    "rhythm": 384,
+    "rhythm-description": 160,
+    "practice-advice": 256,
+}
+DEFAULT_OUTPUT_TOKENS = 1024
+
+
+def output_budget(route: str) -> int:
+    return OUTPUT_TOKEN_BUDGETS.get(route, DEFAULT_OUTPUT_TOKENS)
+
+
+def _compile(text: str) -> Template:
+    # Strip indentation and blank lines once, at import time.
+    return Template("\n".join(line.strip() for line in text.strip().splitlines() if line.strip()))
+
+
+# ---------------------------
+# Gemini templates
+# ---------------------------
+# Schema exemplars are kept to one compact line each: types instead of
+# sample values wherever the model doesn't need an example to get it right.
+
+GEMINI_PROMPTS = {
+    "chords": _compile("""
+        Act as a professional transcriber. Create a JSON song sheet for "$song" on $instrument.
+        $key_instruction
+        $complexity
+        Schema: {"songTitle":str,"artist":str,"key":"C Major","instrument":"$instrument","tuning":"E A D G B E","capoFret":0,"progressionSummary":[str],"tablature":[{"section":"Verse 1","lines":[{"lyrics":str,"isChordLine":bool}]}],"chordDiagrams":[{"chord":"C","frets":[-1,3,2,0,1,0],"fingers":[0,3,2,0,1,0],"capoFret":0}],"substitutions":[{"originalChord":str,"substitutedChord":str,"theory":str}],"practiceTips":[str]}
+        Chord lines hold chords aligned above the lyric line that follows.
+    """),
+    "backing-track": _compile("""
+        Act as a music producer. Create a 1-bar loop (16 steps, 4/4) backing track: "$prompt".
+        Schema: {"title":str,"style":str,"bpm":int,"key":str,"description":str,"youtubeQueries":[str],"tracks":[{"instrument":"drums|bass|keys|guitar|synth","steps":[{"beat":0,"notes":["kick"],"duration":1}]}]}
+        Include drums, bass and keys tracks; beat is the step index 0-15.
+    """),
+    "lesson": _compile("""
+        Create a lesson plan for $instrument, Level: $skill, Topic: $focus.
+        Schema: {"title":str,"lesson":"markdown","duration":"45 mins","goals":[str]}
+    """),
+    "rhythm": _compile("""
+        Create a rhythm pattern. Time: $time_sig, Level: $level.
+        Schema: {"name":str,"timeSignature":"$time_sig","description":str,"pattern":[{"beat":1,"stroke":"Down|Up","duration":"quarter"}]}
+    """),
+    "rhythm-description": _compile("""
+        Explain how to practise this $level rhythm in $time_sig: "$name", 16th grid $grid (x = strum).
+        Schema: {"description":"two sentences"}
+    """),
+    "melody": _compile("""
+        Compose a short melody in $key, $style style.
+        Schema: {"scale":str,"key":"$key","notes":["C4"],"intervals":["M3"],"suggestion":str}
+    """),
+    "improv": _compile("""
+        Improvisation advice for: "$query".
+        Schema: {"style":str,"recommendedScales":[str],"tips":[str],"backingTrackSearch":str}
+    """),
+    "lyrics": _compile("""
+        Write lyrics. Topic: $topic, Genre: $genre, Mood: $mood.
+        Schema: {"title":str,"structure":["Verse","Chorus"],"lyrics":"lyrics with [Chords]"}
+    """),
+    "practice-advice": _compile("""
+        Analyze practice sessions: $sessions.
+        Schema: {"insight":str,"recommendation":str,"focusArea":str}
+    """),
+}
+
+GEMINI_KEY_INSTRUCTIONS = {
+    "transpose": Template("TRANSPOSE the entire song to the key of $key."),
+    "original": "Use the ORIGINAL key of the recording.",
+}
+
+GEMINI_COMPLEXITY = {
+    "simplified": "Constraint: BEGINNER MODE. Simplify chords to open triads.",
+    "full": (
+        "Constraint: PROFESSIONAL SESSION MODE. "
+        "Preserve modulations (key changes), bass lines as slash chords (G/B, D/F#) "
+        "and extensions (sus4, add9, maj7)."
+    ),
+}
+
+# ---------------------------
+# Grok templates
+# ---------------------------
+
+GROK_PROMPTS = {
+    "chords": _compile("""
+        You are UltimateGuitar.com's best transcriber.
+        Song: "$song"
+        Instrument: $instrument
+        $simplify
+        Use real chords & lyrics. Return ONLY valid JSON, no markdown:
+        {"songTitle":str,"artist":str,"key":"C Major","instrument":"$instrument","tuning":"E A D G B E","progressionSummary":["C","Am","F","G"],"tablature":[{"section":"Verse 1","lines":[{"lyrics":"C               Am","isChordLine":true},{"lyrics":"Fly me to the moon","isChordLine":false}]}],"chordDiagrams":[{"chord":"C","frets":[-1,3,2,0,1,0],"fingers":[0,3,2,0,1,0],"capoFret":0}],"substitutions":[],"practiceTips":[str]}
+    """),
+    "backing-track": _compile("""
+        Create a backing track arrangement based on: $prompt
+        Return ONLY valid JSON:
+        {"title":str,"style":str,"bpm":120,"key":str,"tracks":[{"instrument":"drums","steps":[{"beat":1,"notes":["kick"]}]}],"youtubeQueries":[str],"description":str}
+    """),
+    "rhythm": _compile("""
+        Generate a $level $time_sig drum pattern in 16th notes. Return ONLY JSON: {"pattern":"x--x--x--x--x--x-","description":str,"difficulty":"$level"}
+    """),
+    "rhythm-description": _compile("""
+        In two sentences, explain how to practise the $level $time_sig rhythm '$name' (16th grid $grid, x = strum). Return ONLY JSON: {"description":str}
+    """),
+    "melody": _compile("""
+        Write a short $style melody in $key using note names and durations (e.g. C4/4 E4/4 G4/2). Return ONLY JSON: {"melody":"C4 E4 G4","description":str,"style":"$style"}
+    """),
+    "improv": _compile("""
+        Give 3 concise improv tips for $query. Return ONLY valid JSON with 'response', 'scales', 'targetNotes', 'techniques'.
+    """),
+    "lyrics": _compile("""
+        Write original lyrics about $topic in $genre style, $mood mood. Verse-Chorus structure. Return ONLY JSON: {"lyrics":str,"title":str,"structure":"verse-chorus"}
+    """),
+    "practice-advice": _compile("""
+        Analyze these practice sessions and give personalized advice: $sessions. Return ONLY JSON: {"advice":str,"insights":[str],"nextGoals":[str]}
+    """),
+    "lesson": _compile("""
+        You are an excellent, patient $instrument teacher.
+        Write a clear, encouraging Markdown lesson (600-900 words) for a $skill player focusing on $focus.
+        Sections: "# $focus – $skill Level Lesson", "## Goals Today" (3 bullets), "## Warm-Up (5 mins)" with tempo, "## Core Idea" with 1-2 examples, "## 3 Exercises" with tabs/fingerings.
+        Return ONLY JSON: {"lesson":"markdown","title":"$focus Lesson","duration":"30-45 minutes","goals":[str]}
+    """),
+}
+
+GROK_SIMPLIFY = {
+    True: "Use only easy open chords",
+    False: "Include richer voicings",
+}
+
+
+def render(templates: dict, route: str, **fields) -> str:
+    with span("prompt.render", route=route):
+        return templates[route].substitute(**fields)
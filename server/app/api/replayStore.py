@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import orjson
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+# --- CONFIGURATION ---
+# PROVIDER_MODE: live (default) | record | replay
+# REPLAY_LATENCY_MS: empty (no delay) | "recorded" | "<ms>" | "<p50>:<p99>"
+PROVIDER_MODE = settings.provider_mode.lower()
+PROVIDER_STORE_DIR = settings.provider_store_dir
+REPLAY_LATENCY_MS = settings.replay_latency_ms
+# Decoded entries kept in memory; the files stay the source of truth.
+MEMO_SIZE = 1024
+
+# 99th percentile of the standard normal, for fitting p50/p99 to a log-normal.
+_Z99 = 2.3263
+
+
+class ReplayMissError(Exception):
+    """No recording exists for this provider/model/prompt."""
+
+
+class _LatencyProfile:
+    def __init__(self, spec: str, seed: int = None):
+        self.spec = (spec or "").strip().lower()
+        self.rng = random.Random(seed)
+        self.fixed = None
+        self.lognormal = None
+
+        if not self.spec or self.spec in ("none", "0", "recorded"):
+            return
+        if ":" in self.spec:
+            p50, p99 = (float(v) for v in self.spec.split(":", 1))
+            mu = math.log(max(p50, 1e-3))
+            sigma = max(0.0, (math.log(max(p99, p50)) - mu) / _Z99)
+            self.lognormal = (mu, sigma)
+        else:
+            self.fixed = float(self.spec)
+
+    def delay_ms(self, recorded_ms: float) -> float:
+        if self.spec == "recorded":
+            return recorded_ms or 0.0
+        if self.lognormal:
+            return self.rng.lognormvariate(*self.lognormal)
+        return self.fixed or 0.0
+
+
+class ProviderStore:
+    """
+    Content-addressed store of provider responses.
+
+    Entries are keyed by sha256(provider, model, prompt) and written as
+    zlib-compressed JSON under <dir>/<key[:2]>/<key>.z, so identical
+    prompts share one file and the tree stays shallow.
+    """
+
+    def __init__(self, mode: str = "live", directory: str = PROVIDER_STORE_DIR, latency: str = "",
+                 memo_size: int = MEMO_SIZE):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown PROVIDER_MODE: {mode!r}")
+        self.mode = mode
+        self.directory = directory
+        self.latency = _LatencyProfile(latency)
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{provider}\0{model}\0{prompt}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.z")
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._memo[key] = entry
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None:
+                self._memo.move_to_end(key)
+                return entry
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = orjson.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(orjson.dumps(entry), 6))
+        os.replace(tmp, path)
+        self._remember(key, entry)
+
+    def record(self, provider: str, model: str, route: str, prompt: str, text: str,
+               prompt_tokens=0, completion_tokens=0, latency_ms: float = 0.0):
+        self.put(self.key(provider, model, prompt), {
+            "provider": provider,
+            "model": model,
+            "route": route,
+            "text": text,
+            "promptTokens": int(prompt_tokens or 0),
+            "completionTokens": int(completion_tokens or 0),
+            "latencyMs": round(latency_ms, 2),
+            "recordedAt": time.time(),
+        })
+
+    async def replay(self, provider: str, model: str, prompt: str) -> dict:
+        entry = self.get(self.key(provider, model, prompt))
+        if entry is None:
+            CACHE_REQUESTS.inc(cache="replay", result="miss")
+            raise ReplayMissError(f"No recording for {provider}/{model}")
+        CACHE_REQUESTS.inc(cache="replay", result="hit")
+
+        delay = self.latency.delay_ms(entry.get("latencyMs", 0.0))
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        return entry
+
+
+# Singleton instance
+provider_store = ProviderStore(PROVIDER_MODE, PROVIDER_STORE_DIR, REPLAY_LATENCY_MS)
+if provider_store.mode != "live":
+    logger.info(
+        f"Provider {provider_store.mode} mode enabled",
+        extra={"store": os.path.abspath(PROVIDER_STORE_DIR), "latency_profile": REPLAY_LATENCY_MS or None},
+    )
@@ -0,0 +1,193 @@
+import random
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+
+# --- CONFIGURATION ---
+# Patterns live on a sixteenth-note grid. Simple meters (x/4) get four steps
+# per beat; compound meters (x/8) count eighth-note pulses, two steps each.
+STEPS_PER_QUARTER = 4
+STEPS_PER_EIGHTH = 2
+MAX_PRACTICE_SET = 64
+
+DURATION_NAMES = {
+    1: "sixteenth",
+    2: "eighth",
+    3: "dotted eighth",
+    4: "quarter",
+    6: "dotted quarter",
+    8: "half",
+    12: "dotted half",
+    16: "whole",
+}
+
+Meter = namedtuple("Meter", ["label", "beats", "steps_per_beat", "steps"])
+
+# density: onsets per quarter note before Euclidean spreading.
+# rotation: grid steps the Euclidean necklace is rotated by.
+# syncopation: default chance an on-beat onset is anticipated by one step.
+Template = namedtuple("Template", ["name", "density", "rotation", "syncopation", "description"])
+
+TEMPLATES = {
+    "beginner": [
+        Template("Steady Quarters", 1.0, 0, 0.0, "All downstrokes, one per beat. Count out loud and keep the wrist loose."),
+        Template("Straight Eighths", 2.0, 0, 0.0, "Down on the beat, up on the 'and'. Keep the hand moving even on rests."),
+        Template("Half-Time Pulse", 0.5, 0, 0.0, "Long, ringing strums. Let each chord sustain until the next hit."),
+        Template("Quarter and Eighths", 1.5, 0, 0.0, "Mix of quarter and eighth strums. Accent the first beat of the bar."),
+    ],
+    "intermediate": [
+        Template("Folk Strum", 1.5, 0, 0.15, "Down, down-up, up-down-up feel. Ghost the missed strokes."),
+        Template("Tresillo Drive", 0.75, 0, 0.0, "3-3-2 grouping over the bar. Lock in with the kick drum."),
+        Template("Pop Push", 1.75, 1, 0.25, "Anticipate the downbeats slightly for forward momentum."),
+        Template("Shuffle Grid", 1.25, 0, 0.2, "Uneven spacing that leans on the off-beats."),
+        Template("Backbeat Eighths", 2.0, 2, 0.1, "Eighth-note strum shifted to emphasise the backbeat."),
+    ],
+    "advanced": [
+        Template("Funk Sixteenths", 2.75, 0, 0.4, "Busy sixteenth grid. Mute the strings between accents."),
+        Template("Cinquillo", 1.25, 1, 0.3, "Five-note Afro-Cuban cell. Keep the pulse internal."),
+        Template("Displaced Syncopation", 2.25, 3, 0.5, "Off-beat heavy. Tap your foot on every beat to stay grounded."),
+        Template("Bossa Clave", 1.25, 2, 0.35, "Bossa-nova clave spread over the bar."),
+    ],
+    "expert": [
+        Template("Three Against Four", 0.75, 0, 0.3, "Polyrhythmic layer of three over the beat grid."),
+        Template("Five Against Four", 1.25, 0, 0.45, "Quintuplet-feel layer against the pulse."),
+        Template("Seven Over Sixteen", 1.75, 5, 0.55, "Asymmetric seven-stroke necklace rotated off the downbeat."),
+        Template("Broken Sixteenths", 3.0, 7, 0.6, "Dense, displaced sixteenths. Practise slowly with a metronome."),
+    ],
+}
+
+
+@lru_cache(maxsize=64)
+def parse_time_signature(time_sig: str) -> Meter:
+    try:
+        top, bottom = (int(part) for part in time_sig.strip().split("/"))
+    except (ValueError, AttributeError):
+        raise ValueError(f"Invalid time signature: {time_sig!r}")
+    if top < 1 or top > 32 or bottom not in (2, 4, 8, 16):
+        raise ValueError(f"Unsupported time signature: {time_sig!r}")
+
+    if bottom == 8:
+        steps_per_beat = STEPS_PER_EIGHTH
+    else:
+        steps_per_beat = STEPS_PER_QUARTER * 4 // bottom
+    return Meter(f"{top}/{bottom}", top, steps_per_beat, top * steps_per_beat)
+
+
+def normalize_level(level: str) -> str:
+    """Maps UI labels like 'Expert (Polyrhythmic)' onto template tiers."""
+    word = (level if isinstance(level, str) else "").strip().split(" ")[0].lower()
+    return word if word in TEMPLATES else "beginner"
+
+
+def euclidean(pulses: int, steps: int, rotation: int = 0) -> list:
+    """Bjorklund-equivalent Euclidean rhythm as a 0/1 list."""
+    if steps <= 0:
+        return []
+    pulses = max(0, min(pulses, steps))
+    rotation %= steps
+    return [1 if ((i + rotation) * pulses) % steps < pulses else 0 for i in range(steps)]
+
+
+def _syncopate(grid: list, steps_per_beat: int, amount: float, rng: random.Random) -> list:
+    """Anticipates on-beat onsets by one step, never touching beat one."""
+    if amount <= 0:
+        return grid
+    grid = list(grid)
+    for step in range(steps_per_beat, len(grid), steps_per_beat):
+        if grid[step] and not grid[step - 1] and rng.random() < amount:
+            grid[step], grid[step - 1] = 0, 1
+    return grid
+
+
+def _duration_name(steps: int) -> str:
+    return DURATION_NAMES.get(steps, f"{steps}/16")
+
+
+def _pattern_events(grid: list, meter: Meter) -> list:
+    onsets = [i for i, hit in enumerate(grid) if hit]
+    events = []
+    for idx, step in enumerate(onsets):
+        nxt = onsets[idx + 1] if idx + 1 < len(onsets) else meter.steps + onsets[0]
+        events.append({
+            "beat": round(1 + step / meter.steps_per_beat, 3),
+            "step": step,
+            "stroke": "Down" if step % 2 == 0 else "Up",
+            "duration": _duration_name(nxt - step),
+            "accent": step % meter.steps_per_beat == 0,
+        })
+    return events
+
+
+def _int_param(value, name: str) -> int:
+    """Request ints arrive from raw JSON; anything else is a ValueError (a 400), not a TypeError."""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    return value
+
+
+def _seed_for(*parts) -> int:
+    return zlib.crc32("|".join(str(p) for p in parts).encode())
+
+
+class RhythmPatternGenerator:
+    """
+    Deterministic strum/drum pattern generator.
+    Emits RhythmPatternResult-shaped dicts without touching an LLM.
+    """
+
+    def generate(self, time_sig: str, level: str, syncopation: float = None, variant: int = None, seed: int = None) -> dict:
+        if not isinstance(time_sig, str):
+            raise ValueError(f"Invalid time signature: {time_sig!r}")
+        meter = parse_time_signature(time_sig)
+        tier = normalize_level(level)
+        templates = TEMPLATES[tier]
+        if variant is not None:
+            variant = _int_param(variant, "variant")
+        if seed is not None:
+            seed = _int_param(seed, "seed")
+        if syncopation is not None and (isinstance(syncopation, bool) or not isinstance(syncopation, (int, float))):
+            raise ValueError(f"syncopation must be a number, got {syncopation!r}")
+        rng = random.Random(_seed_for(meter.label, tier, variant, seed))
+
+        template = templates[variant % len(templates)] if variant is not None else rng.choice(templates)
+        amount = template.syncopation if syncopation is None else max(0.0, min(1.0, float(syncopation)))
+
+        pulses = max(1, round(template.density * meter.steps / STEPS_PER_QUARTER))
+        grid = euclidean(pulses, meter.steps, template.rotation)
+        grid[0] = 1
+        grid = _syncopate(grid, meter.steps_per_beat, amount, rng)
+
+        return {
+            "name": template.name,
+            "timeSignature": meter.label,
+            "description": template.description,
+            "pattern": _pattern_events(grid, meter),
+            "grid": "".join("x" if hit else "-" for hit in grid),
+        }
+
+    def generate_practice_set(self, time_sig: str, level: str, count: int = 8, seed: int = None) -> list:
+        """
+        A graded set of distinct patterns: cycles through the tier's templates
+        while ramping syncopation from the template default towards 1.0.
+        """
+        count = max(1, min(_int_param(count, "count"), MAX_PRACTICE_SET))
+        templates = TEMPLATES[normalize_level(level)]
+        results, seen = [], set()
+
+        for i in range(count * 4):
+            if len(results) == count:
+                break
+            template = templates[i % len(templates)]
+            ramp = (i // len(templates)) / max(1, count)
+            amount = min(1.0, template.syncopation + ramp)
+            pattern = self.generate(time_sig, level, syncopation=amount, variant=i, seed=seed)
+            if pattern["grid"] in seen:
+                continue
+            seen.add(pattern["grid"])
+            results.append(pattern)
+
+        return results
+
+
+# Singleton instance
+rhythm_generator = RhythmPatternGenerator()
@@ -0,0 +1,335 @@
+# app/api/songIndex.py
+"""
+Near-duplicate resolution for free-text song queries.
+
+"wonderwall oasis", "Oasis - Wonderwall", "wonderwall by oasis" and
+"wonderwal oasis chords" should all land on the same stored song.
+`canonical_query` removes case, accents, punctuation, filler words ("by",
+"the", "chords", "feat") and word order. Words that can be part of a title
+("song", "version", ...) are kept. Every known song and stored
+arrangement key is indexed by a MinHash signature of its canonical form's
+character trigrams, cut into BANDS bands of ROWS values (LSH banding). Each
+band is kept as a sorted array of 32-bit keys, so a lookup is BANDS binary
+searches; the entries sharing the most band keys are confirmed by trigram
+Dice similarity (SONG_INDEX_THRESHOLD) and by their words pairing up one to
+one, allowing a single typo in longer words: "Love Story" and "Love Song",
+or "Perfect" and "Perfect Duet", score high but are different songs. With the defaults a pair at the
+threshold shares a band >99.9% of the time. Lookup cost does not grow with
+index size; memory is about 8 bytes per band per entry plus the query text.
+
+The arrays are built offline and loaded from SONG_INDEX_PATH:
+
+    python -m app.api.songIndex --output song_index.npz
+
+Without that file the index is built from the database on first use.
+Queries that are generated fresh are added as they arrive.
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+SONG_INDEX_PATH = settings.song_index_path
+# Trigram Dice similarity needed to treat two queries as the same song.
+SONG_INDEX_THRESHOLD = settings.song_index_threshold
+SONG_INDEX_BANDS = settings.song_index_bands
+SONG_INDEX_ROWS = settings.song_index_rows
+# Per-band bucket scan cap, so a bucket crowded by a common word ("love")
+# can't blow the budget; the other bands still find the match.
+MAX_CANDIDATES_PER_BAND = 64
+# Candidates confirmed by Dice, most shared bands first. A true match
+# shares several bands; chance collisions usually share one.
+MAX_VERIFIED = 8
+# New entries are searched linearly until there are this many, then merged.
+MERGE_EVERY = 512
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_FILLER = frozenset({
+    "by", "the", "feat", "ft", "featuring", "and", "chords", "chord", "tab", "tabs", "lyrics",
+})
+# Words at least this long may differ by one edit and still pair up.
+TYPO_MIN_LENGTH = 5
+
+# Fixed seed: signatures must match the ones saved in SONG_INDEX_PATH.
+_RNG = np.random.default_rng(0x5EED)
+_PERMUTATIONS = SONG_INDEX_BANDS * SONG_INDEX_ROWS
+_MUL = _RNG.integers(1, 2 ** 63, _PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_ADD = _RNG.integers(0, 2 ** 63, _PERMUTATIONS, dtype=np.uint64)
+_FOLD = np.uint64(0x9E3779B97F4A7C15)
+
+
+def canonical_query(song_query: str) -> str:
+    """Case, accents, punctuation, filler words and word order removed."""
+    text = song_query.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    tokens = sorted({t for t in _NON_WORD.sub(" ", text).split() if t not in _FILLER})
+    return " ".join(tokens)
+
+
+def _trigrams(canonical: str) -> set:
+    padded = f"  {canonical} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def band_keys(grams: set) -> np.ndarray:
+    """One uint32 key per band from the MinHash signature of `grams`."""
+    digests = b"".join(hashlib.blake2b(g.encode(), digest_size=8).digest() for g in grams)
+    hashes = np.frombuffer(digests, dtype=np.uint64)
+    signature = (hashes[:, None] * _MUL + _ADD).min(axis=0).reshape(SONG_INDEX_BANDS, SONG_INDEX_ROWS)
+    keys = signature[:, 0]
+    for row in range(1, SONG_INDEX_ROWS):
+        keys = keys * _FOLD ^ signature[:, row]
+    return (keys >> np.uint64(32)).astype(np.uint32)
+
+
+def dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def _one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insertion, deletion or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:] or (len(a) == len(b) and a[i + 1:] == b[i + 1:])
+
+
+def same_words(a: str, b: str) -> bool:
+    """Canonical forms whose words pair up one to one, exactly or with one typo in a long word."""
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return False
+    unmatched = [w for w in words_b]
+    for word in words_a:
+        if word in unmatched:
+            unmatched.remove(word)
+            continue
+        close = next((w for w in unmatched if min(len(w), len(word)) >= TYPO_MIN_LENGTH and _one_edit(word, w)), None)
+        if close is None:
+            return False
+        unmatched.remove(close)
+    return True
+
+
+@dataclass
+class SongMatch:
+    query: str
+    song_id: Optional[int]
+    score: float
+
+
+class SongIndex:
+    def __init__(self, path: str = SONG_INDEX_PATH, threshold: float = SONG_INDEX_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        empty = np.empty((SONG_INDEX_BANDS, 0), np.uint32)
+        self._arrays = (empty, empty.astype(np.int32), np.empty(0, np.int64), [])
+        self._pending = []     # (band keys, song_id, query) not yet merged
+        self._known = set()    # canonical forms already indexed
+
+    # ---------------------------
+    # Building
+    # ---------------------------
+
+    @staticmethod
+    def _sorted_bands(keys: np.ndarray):
+        orders = np.argsort(keys, axis=1, kind="stable").astype(np.int32)
+        return np.take_along_axis(keys, orders, axis=1), orders
+
+    @staticmethod
+    def _unsorted_bands(band_values, band_orders) -> np.ndarray:
+        keys = np.empty_like(band_values)
+        np.put_along_axis(keys, band_orders.astype(np.intp), band_values, axis=1)
+        return keys
+
+    def build(self, entries):
+        """entries: iterable of (query, song_id or None). Replaces the index."""
+        keys, song_ids, queries, known = [], [], [], set()
+        for query, song_id in entries:
+            query = " ".join(query.split())
+            canonical = canonical_query(query)
+            if not canonical or canonical in known:
+                continue
+            known.add(canonical)
+            keys.append(band_keys(_trigrams(canonical)))
+            song_ids.append(-1 if song_id is None else song_id)
+            queries.append(query)
+        matrix = np.stack(keys, axis=1) if keys else np.empty((SONG_INDEX_BANDS, 0), np.uint32)
+        with self._lock:
+            self._arrays = (*self._sorted_bands(matrix), np.array(song_ids, dtype=np.int64), queries)
+            self._pending = []
+            self._known = known
+            self._loaded = True
+        return len(queries)
+
+    def save(self, path: str = None):
+        band_values, band_orders, song_ids, queries = self._arrays
+        blob = "\n".join(queries).encode()
+        np.savez(
+            path or self.path,
+            band_values=band_values, band_orders=band_orders,
+            song_ids=song_ids, queries=np.frombuffer(blob, np.uint8),
+        )
+
+    def load(self):
+        """From SONG_INDEX_PATH if present, else from the database."""
+        started = time.perf_counter()
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                queries = data["queries"].tobytes().decode().split("\n") if data["queries"].size else []
+                arrays = data["band_values"], data["band_orders"], data["song_ids"]
+            if arrays[0].shape[0] != SONG_INDEX_BANDS:
+                logger.warning(f"{self.path} was built with other band settings, rebuilding from the database")
+                self.build(_database_entries())
+                source = "database"
+            else:
+                with self._lock:
+                    self._arrays = (*arrays, queries)
+                    self._known = {canonical_query(q) for q in queries}
+                    self._loaded = True
+                source = self.path
+        else:
+            self.build(_database_entries())
+            source = "database"
+        logger.info("Song index loaded", extra={
+            "entries": len(self._arrays[3]), "source": source,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+
+    def add(self, query: str, song_id: int = None):
+        query = " ".join(query.split())
+        canonical = canonical_query(query)
+        if not canonical:
+            return
+        keys = band_keys(_trigrams(canonical))
+        with self._lock:
+            if canonical in self._known:
+                return
+            self._known.add(canonical)
+            self._pending.append((keys, -1 if song_id is None else song_id, query))
+            if len(self._pending) < MERGE_EVERY:
+                return
+            pending, self._pending = self._pending, []
+            band_values, band_orders, song_ids, queries = self._arrays
+            merged = np.concatenate(
+                [self._unsorted_bands(band_values, band_orders), np.stack([p[0] for p in pending], axis=1)], axis=1
+            )
+            # One assignment, so a concurrent resolve sees either the old arrays or the new ones.
+            self._arrays = (
+                *self._sorted_bands(merged),
+                np.concatenate([song_ids, np.array([p[1] for p in pending], dtype=np.int64)]),
+                queries + [p[2] for p in pending],
+            )
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self):
+        return len(self._arrays[3]) + len(self._pending)
+
+    # ---------------------------
+    # Lookup
+    # ---------------------------
+
+    @staticmethod
+    def _candidates(band_values, band_orders, keys: np.ndarray):
+        """Entry positions sharing a band key, most shared bands first."""
+        hits = []
+        for b in range(SONG_INDEX_BANDS):
+            values = band_values[b]
+            lo = values.searchsorted(keys[b], side="left")
+            hi = min(values.searchsorted(keys[b], side="right"), lo + MAX_CANDIDATES_PER_BAND)
+            if hi > lo:
+                hits.append(band_orders[b][lo:hi])
+        if not hits:
+            return []
+        positions, shared = np.unique(np.concatenate(hits), return_counts=True)
+        return positions[np.argsort(-shared, kind="stable")[:MAX_VERIFIED]].tolist()
+
+    def resolve(self, song_query: str) -> Optional[SongMatch]:
+        """The indexed query most similar to song_query, if above the threshold."""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self.load()
+        canonical = canonical_query(song_query)
+        if not canonical:
+            return None
+        grams = _trigrams(canonical)
+        keys = band_keys(grams)
+
+        # Pending first, then the arrays, each read once: a merge moves
+        # pending entries into new arrays, so they are seen at least once.
+        pending = self._pending
+        band_values, band_orders, song_ids, queries = self._arrays
+        candidates = [(int(song_ids[i]), queries[i]) for i in self._candidates(band_values, band_orders, keys)]
+        candidates += [(song_id, query) for other, song_id, query in pending if (other == keys).any()]
+
+        best = None
+        for song_id, query in candidates:
+            other = canonical_query(query)
+            score = dice(grams, _trigrams(other))
+            if score >= self.threshold and (best is None or score > best.score) and same_words(canonical, other):
+                best = SongMatch(query, None if song_id < 0 else song_id, round(score, 4))
+
+        CACHE_REQUESTS.inc(cache="song_index", result="hit" if best else "miss")
+        return best
+
+
+def _database_entries():
+    """Songs ("title artist") and stored arrangement keys."""
+    from sqlalchemy import select
+    from sqlalchemy.exc import SQLAlchemyError
+
+    from app.database import SessionLocal
+    from app.models import Song, SongArrangement
+
+    try:
+        with SessionLocal() as db:
+            for title, artist, song_id in db.execute(select(Song.title, Song.artist, Song.id)).yield_per(10000):
+                yield (f"{title} {artist}".strip() if artist else title), song_id
+            for key, song_id in db.execute(select(SongArrangement.query_key, SongArrangement.song_id)).yield_per(10000):
+                yield key, song_id
+    except SQLAlchemyError as e:
+        logger.warning(f"Song index build skipped, database unavailable: {e}")
+
+
+# Singleton instance
+song_index = SongIndex()
+
+
+if __name__ == "__main__":
+    from app.logger import setup_logging
+
+    parser = argparse.ArgumentParser(description="Build the song similarity index from the database.")
+    parser.add_argument("--output", default=SONG_INDEX_PATH)
+    args = parser.parse_args()
+
+    setup_logging()
+    started = time.perf_counter()
+    count = song_index.build(_database_entries())
+    song_index.save(args.output)
+    print(f"Indexed {count} songs into {args.output} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,304 @@
+import hashlib
+import threading
+import wave
+from collections import OrderedDict
+
+import numpy as np
+from app.metrics import CACHE_REQUESTS
+
+# --- CONFIGURATION ---
+# The tracker works on a ~22 kHz mono signal; anything sampled higher is
+# decimated while streaming so memory stays bounded by the block size.
+TARGET_SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+BLOCK_FRAMES = 1 << 16           # PCM frames read from disk per block
+HASH_CHUNK_BYTES = 1 << 20
+
+MIN_BPM = 30.0
+MAX_BPM = 300.0
+PRIOR_BPM = 120.0                # centre of the log-normal tempo prior
+TEMPOGRAM_WINDOW_S = 8.0
+BEAT_TIGHTNESS = 100.0
+LOW_BAND_HZ = 150.0              # kick/bass band used to place downbeats
+MIN_DURATION_S = 2.0
+
+CACHE_SIZE = 256
+
+
+class UnsupportedAudioError(ValueError):
+    pass
+
+
+class _LRUCache:
+    """Small thread-safe LRU keyed by upload hash."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+def _pcm_to_mono(raw: bytes, sampwidth: int, nchannels: int) -> np.ndarray:
+    if sampwidth == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sampwidth == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sampwidth == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif sampwidth == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise UnsupportedAudioError(f"Unsupported sample width: {sampwidth} bytes")
+
+    if nchannels > 1:
+        samples = samples.reshape(-1, nchannels).mean(axis=1)
+    return samples
+
+
+def hash_upload(fileobj) -> str:
+    """SHA-256 of the upload, read in chunks. Leaves the stream rewound."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class _OnsetAccumulator:
+    """
+    Streaming spectral-flux onset detector.
+    Keeps only the STFT overlap between blocks plus one float per hop.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self.window = np.hanning(N_FFT).astype(np.float32)
+        freqs = np.fft.rfftfreq(N_FFT, d=1.0 / sample_rate)
+        self.low_bins = max(2, int(np.searchsorted(freqs, LOW_BAND_HZ)))
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._prev = None
+        self._flux = []
+        self._low_flux = []
+
+    def feed(self, samples: np.ndarray):
+        buf = np.concatenate((self._tail, samples)) if self._tail.size else samples
+        if buf.size < N_FFT:
+            self._tail = buf
+            return
+
+        frames = np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP_LENGTH]
+        spec = np.log1p(100.0 * np.abs(np.fft.rfft(frames * self.window, axis=1)))
+
+        prev = spec[:1] if self._prev is None else self._prev[None, :]
+        diff = np.maximum(np.diff(np.vstack((prev, spec)), axis=0), 0.0)
+        self._flux.append(diff.sum(axis=1))
+        self._low_flux.append(diff[:, :self.low_bins].sum(axis=1))
+        self._prev = spec[-1]
+
+        consumed = frames.shape[0] * HOP_LENGTH
+        self._tail = buf[consumed:].copy()
+
+    def envelopes(self):
+        if not self._flux:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(self._flux), np.concatenate(self._low_flux)
+
+
+def _normalize_onsets(onset: np.ndarray, fps: float) -> np.ndarray:
+    # Remove the slowly varying loudness trend so quiet and loud passages
+    # contribute comparably to the tempogram.
+    width = max(1, int(round(fps)))
+    padded = np.pad(onset, (width // 2, width - 1 - width // 2), mode="reflect")
+    trend = np.convolve(padded, np.ones(width) / width, mode="valid")
+    onset = np.maximum(onset - trend, 0.0)
+    std = onset.std()
+    return onset / std if std > 0 else onset
+
+
+def _estimate_tempo(onset: np.ndarray, fps: float):
+    """Global tempo from an autocorrelation tempogram weighted by a log-normal prior."""
+    min_lag = max(1, int(np.floor(60.0 * fps / MAX_BPM)))
+    max_lag = int(np.ceil(60.0 * fps / MIN_BPM))
+    win = max(max_lag * 2, int(TEMPOGRAM_WINDOW_S * fps))
+    hop = max(1, win // 4)
+
+    if onset.size < win:
+        win = onset.size
+        hop = win
+    nfft = 1 << int(np.ceil(np.log2(2 * win)))
+
+    starts = np.arange(0, onset.size - win + 1, hop)
+    frames = np.lib.stride_tricks.sliding_window_view(onset, win)[starts]
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(frames, n=nfft, axis=1)
+    acf = np.fft.irfft(spectrum * np.conj(spectrum), n=nfft, axis=1)[:, :max_lag + 1]
+    zero_lag = acf[:, :1]
+    acf = np.divide(acf, zero_lag, out=np.zeros_like(acf), where=zero_lag > 0)
+    tempogram = acf.mean(axis=0)
+
+    lags = np.arange(min_lag, min(max_lag, tempogram.size - 2) + 1)
+    bpms = 60.0 * fps / lags
+    prior = np.exp(-0.5 * (np.log2(bpms / PRIOR_BPM)) ** 2)
+    scores = np.maximum(tempogram[lags], 0.0) * prior
+    if not np.any(scores > 0):
+        return PRIOR_BPM, 0.0
+
+    best = int(np.argmax(scores))
+    lag = float(lags[best])
+    # Parabolic interpolation around the peak for sub-frame resolution.
+    if 0 < best < scores.size - 1:
+        a, b, c = scores[best - 1], scores[best], scores[best + 1]
+        denom = a - 2 * b + c
+        if denom != 0:
+            lag += 0.5 * (a - c) / denom
+
+    confidence = float(scores[best] / (scores.mean() * scores.size ** 0.5 + 1e-9))
+    return 60.0 * fps / lag, min(1.0, confidence)
+
+
+def _track_beats(onset: np.ndarray, fps: float, bpm: float) -> np.ndarray:
+    """Dynamic-programming beat tracker (Ellis, 2007)."""
+    period = 60.0 * fps / bpm
+    sigma = max(1.0, period / 32.0)
+    kernel_x = np.arange(-int(4 * sigma), int(4 * sigma) + 1)
+    kernel = np.exp(-0.5 * (kernel_x / sigma) ** 2)
+    local = np.convolve(onset, kernel, mode="same")
+
+    lo_off = int(round(2 * period))
+    hi_off = max(1, int(round(period / 2)))
+    offsets = np.arange(-lo_off, -hi_off + 1)
+    penalty = -BEAT_TIGHTNESS * np.log(-offsets / period) ** 2
+
+    n = local.size
+    cumscore = local.copy()
+    backlink = np.full(n, -1, dtype=np.int64)
+    for i in range(hi_off, n):
+        lo = i - lo_off
+        start = max(0, lo)
+        candidates = cumscore[start:i - hi_off + 1] + penalty[start - lo:]
+        best = int(np.argmax(candidates))
+        cumscore[i] = local[i] + candidates[best]
+        backlink[i] = start + best
+
+    # Start from the strongest peak within the final beat period.
+    tail = max(0, n - int(np.ceil(period)))
+    beat = tail + int(np.argmax(cumscore[tail:]))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    beats = np.array(beats[::-1], dtype=np.int64)
+
+    # The backtrace runs through leading/trailing silence; drop weak edge beats.
+    strong = np.flatnonzero(local[beats] >= 0.5 * np.sqrt(np.mean(local[beats] ** 2)))
+    if strong.size:
+        beats = beats[strong[0]:strong[-1] + 1]
+    return beats
+
+
+def _pick_downbeats(beats: np.ndarray, onset: np.ndarray, low: np.ndarray, beats_per_bar: int) -> np.ndarray:
+    if beats.size == 0 or beats_per_bar <= 1:
+        return beats
+    low_std = low.std()
+    accent = (low / low_std if low_std > 0 else low) + 0.5 * onset
+    strengths = accent[beats]
+    phases = [strengths[p::beats_per_bar].mean() for p in range(min(beats_per_bar, beats.size))]
+    return beats[int(np.argmax(phases))::beats_per_bar]
+
+
+class TempoTracker:
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache = _LRUCache(cache_size)
+
+    def analyze(self, fileobj, beats_per_bar: int = 4) -> dict:
+        """
+        Returns BPM, beat times and downbeat times for a PCM WAV stream.
+        Results are cached per upload hash so re-uploads are free.
+        """
+        key = f"{hash_upload(fileobj)}:{beats_per_bar}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache="tempo", result="hit")
+            return cached
+        CACHE_REQUESTS.inc(cache="tempo", result="miss")
+
+        result = self._analyze_stream(fileobj, beats_per_bar)
+        self.cache.set(key, result)
+        return result
+
+    def _analyze_stream(self, fileobj, beats_per_bar: int) -> dict:
+        try:
+            reader = wave.open(fileobj, "rb")
+        except (wave.Error, EOFError) as e:
+            raise UnsupportedAudioError(f"Only PCM WAV uploads are supported ({e})")
+
+        with reader:
+            nchannels = reader.getnchannels()
+            sampwidth = reader.getsampwidth()
+            framerate = reader.getframerate()
+            total_frames = reader.getnframes()
+
+            decimate = max(1, int(round(framerate / TARGET_SAMPLE_RATE)))
+            sample_rate = framerate / decimate
+            onsets = _OnsetAccumulator(sample_rate)
+            carry = np.zeros(0, dtype=np.float32)
+
+            while True:
+                raw = reader.readframes(BLOCK_FRAMES)
+                if not raw:
+                    break
+                samples = _pcm_to_mono(raw, sampwidth, nchannels)
+                if decimate > 1:
+                    samples = np.concatenate((carry, samples)) if carry.size else samples
+                    usable = samples.size - samples.size % decimate
+                    carry = samples[usable:]
+                    samples = samples[:usable].reshape(-1, decimate).mean(axis=1)
+                onsets.feed(samples.astype(np.float32, copy=False))
+
+        duration = total_frames / float(framerate) if framerate else 0.0
+        if duration < MIN_DURATION_S:
+            raise ValueError(f"Recording too short for tempo analysis (need at least {MIN_DURATION_S:.0f}s)")
+
+        fps = sample_rate / HOP_LENGTH
+        flux, low_flux = onsets.envelopes()
+        onset = _normalize_onsets(flux, fps)
+        low = _normalize_onsets(low_flux, fps)
+
+        bpm, confidence = _estimate_tempo(onset, fps)
+        beat_frames = _track_beats(onset, fps, bpm)
+        downbeat_frames = _pick_downbeats(beat_frames, onset, low, beats_per_bar)
+
+        def to_seconds(frames):
+            return [round(float(t), 3) for t in (frames * HOP_LENGTH + N_FFT / 2) / sample_rate]
+
+        return {
+            "bpm": round(float(bpm), 2),
+            "confidence": round(confidence, 3),
+            "beatsPerBar": beats_per_bar,
+            "duration": round(duration, 3),
+            "beats": to_seconds(beat_frames),
+            "downbeats": to_seconds(downbeat_frames),
+        }
+
+
+# Singleton instance
+tempo_tracker = TempoTracker()
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.metrics import AI_TOKENS
+
+_tally = ContextVar("token_tally", default=None)
+
+
+class TokenTally:
+    """Tokens recorded under one `TokenUsageRecorder.tally()` block."""
+
+    def __init__(self):
+        self.tokens = 0
+
+
+class TokenUsageRecorder:
+    """
+    Keeps per-request prompt/completion token counts reported by providers,
+    plus running totals per (route, provider, model).
+    """
+
+    def __init__(self, history: int = 500):
+        self._recent = deque(maxlen=history)
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, provider: str, model: str, prompt_tokens, completion_tokens):
+        prompt_tokens = int(prompt_tokens or 0)
+        completion_tokens = int(completion_tokens or 0)
+        entry = {
+            "ts": time.time(),
+            "route": route,
+            "provider": provider,
+            "model": model,
+            "promptTokens": prompt_tokens,
+            "completionTokens": completion_tokens,
+        }
+        AI_TOKENS.inc(prompt_tokens, route=route, provider=provider, model=model, kind="prompt")
+        AI_TOKENS.inc(completion_tokens, route=route, provider=provider, model=model, kind="completion")
+
+        tally = _tally.get()
+        if tally is not None:
+            tally.tokens += prompt_tokens + completion_tokens
+
+        key = (route, provider, model)
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._totals.setdefault(key, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+
+    @contextmanager
+    def tally(self):
+        """
+        Counts the tokens recorded inside the block, including by tasks it
+        starts, apart from everything else the process is spending.
+        """
+        tally = TokenTally()
+        token = _tally.set(tally)
+        try:
+            yield tally
+        finally:
+            _tally.reset(token)
+
+    def snapshot(self, recent: int = 50) -> dict:
+        with self._lock:
+            totals = [
+                {
+                    "route": route,
+                    "provider": provider,
+                    "model": model,
+                    "requests": calls,
+                    "promptTokens": prompt,
+                    "completionTokens": completion,
+                    "avgPromptTokens": round(prompt / calls, 1),
+                    "avgCompletionTokens": round(completion / calls, 1),
+                }
+                for (route, provider, model), (calls, prompt, completion) in sorted(self._totals.items())
+            ]
+            latest = list(self._recent)[-recent:] if recent > 0 else []
+        return {"totals": totals, "recent": latest}
+
+
+# Singleton instance
+token_usage = TokenUsageRecorder()
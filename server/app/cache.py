@@ -0,0 +1,268 @@
+# app/cache.py
+"""
+Cache tier shared by every uvicorn worker on a host.
+
+`MemoryCache` is private to one process; `SQLiteCache` keeps entries in a
+WAL-mode SQLite file that all workers open, so a result generated by one
+worker is a hit for the others. Both have the same get/set/delete API with
+per-entry TTLs and store JSON-able values. CACHE_BACKEND picks the default;
+the SQLite file is CACHE_PATH, and without one nothing touches the disk.
+
+SQLite calls can wait up to a second on a busy file, so async code uses the
+`a`-prefixed methods, which run them in a thread (MemoryCache answers
+inline). Purging expired rows happens on a background thread.
+
+An entry set with `stale_ttl` outlives its TTL by that long: `get` no
+longer returns it, but `get_entry` does, along with how long it has been
+stale, and `claim_refresh` lets exactly one caller (across workers, for
+SQLite) take the job of regenerating it for `lease` seconds. The claim is
+kept apart from the entry's freshness, so a failed refresh doesn't make
+the entry look any younger.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+CACHE_PATH = settings.cache_path
+CACHE_BACKEND = (settings.cache_backend or ("sqlite" if CACHE_PATH else "memory")).lower()      # sqlite | memory
+CACHE_MAX_ENTRIES = settings.cache_max_entries
+# SQLite: purge expired/excess rows once every this many writes.
+PURGE_EVERY = 500
+
+
+class _Cache:
+    # True when calls may block on I/O; the async methods then use a thread.
+    blocking = False
+
+    async def _call(self, method, *args):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def aget(self, key: str):
+        return await self._call(self.get, key)
+
+    async def aget_entry(self, key: str):
+        return await self._call(self.get_entry, key)
+
+    async def aset(self, key: str, value, ttl: float, stale_ttl: float = 0):
+        return await self._call(self.set, key, value, ttl, stale_ttl)
+
+    async def aclaim_refresh(self, key: str, lease: float) -> bool:
+        return await self._call(self.claim_refresh, key, lease)
+
+
+class MemoryCache(_Cache):
+    def __init__(self, name: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, fresh_until, expires_at, _ = entry
+                now = time.time()
+                if fresh_until > now:
+                    self._data.move_to_end(key)
+                    CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                    return value
+                if expires_at <= now:
+                    del self._data[key]
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        return None
+
+    def get_entry(self, key: str):
+        """(value, seconds stale; 0 while fresh) or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, fresh_until, expires_at, _ = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    stale = max(0.0, now - fresh_until)
+                    CACHE_REQUESTS.inc(cache=self.name, result="stale" if stale else "hit")
+                    return value, stale
+                del self._data[key]
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        return None
+
+    def set(self, key: str, value, ttl: float, stale_ttl: float = 0):
+        now = time.time()
+        with self._lock:
+            # (value, fresh until, expires at, refresh claimed until)
+            self._data[key] = (value, now + ttl, now + ttl + stale_ttl, 0.0)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def claim_refresh(self, key: str, lease: float) -> bool:
+        """True for the one caller that should regenerate a stale entry; others get False for `lease` seconds."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] > now or entry[2] <= now or entry[3] > now:
+                return False
+            self._data[key] = (*entry[:3], now + lease)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(_Cache):
+    """
+    One table per named cache in a shared SQLite file. Connections are per
+    thread; WAL lets readers in every process proceed while one writes.
+    """
+
+    blocking = True
+
+    def __init__(self, name: str, path: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.path = path
+        self.max_entries = max_entries
+        self.table = "cache_" + "".join(c if c.isalnum() else "_" for c in name)
+        self._local = threading.local()
+        self._writes = 0
+        self._purging = threading.Lock()
+        self._conn()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+                "fresh_until REAL NOT NULL DEFAULT 0, refresh_until REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+            # Files from before stale serving: their rows just read as stale.
+            for column in ("fresh_until", "refresh_until"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {column} REAL NOT NULL DEFAULT 0")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_expires ON {self.table} (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        try:
+            row = self._conn().execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND fresh_until > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed: {e}", extra={"cache": self.name})
+            row = None
+        if row is None:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return None
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return orjson.loads(row[0])
+
+    def get_entry(self, key: str):
+        """(value, seconds stale; 0 while fresh) or None."""
+        now = time.time()
+        try:
+            row = self._conn().execute(
+                f"SELECT value, fresh_until FROM {self.table} WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed: {e}", extra={"cache": self.name})
+            row = None
+        if row is None:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return None
+        stale = max(0.0, now - row[1])
+        CACHE_REQUESTS.inc(cache=self.name, result="stale" if stale else "hit")
+        return orjson.loads(row[0]), stale
+
+    def set(self, key: str, value, ttl: float, stale_ttl: float = 0):
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, fresh_until) VALUES (?, ?, ?, ?)",
+                (key, orjson.dumps(value), now + ttl + stale_ttl, now + ttl),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0 and not self._purging.locked():
+                threading.Thread(target=self._purge, name=f"cache-purge-{self.name}", daemon=True).start()
+        except sqlite3.Error as e:
+            # A busy or read-only cache must never fail the request.
+            logger.warning(f"Cache write failed: {e}", extra={"cache": self.name})
+
+    def _purge(self):
+        if not self._purging.acquire(blocking=False):
+            return
+        try:
+            conn = self._conn()
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                f"ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Cache purge failed: {e}", extra={"cache": self.name})
+        finally:
+            self._purging.release()
+
+    def claim_refresh(self, key: str, lease: float) -> bool:
+        """True for the one caller, in any worker, that should regenerate a stale entry."""
+        now = time.time()
+        try:
+            claimed = self._conn().execute(
+                f"UPDATE {self.table} SET refresh_until = ? "
+                "WHERE key = ? AND fresh_until <= ? AND refresh_until <= ? AND expires_at > ?",
+                (now + lease, key, now, now, now),
+            ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Cache refresh claim failed: {e}", extra={"cache": self.name})
+            return False
+        return claimed == 1
+
+    def delete(self, key: str):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+
+def make_cache(name: str, backend: str = CACHE_BACKEND, path: str = CACHE_PATH):
+    if backend == "memory":
+        return MemoryCache(name)
+    if backend == "sqlite":
+        if not path:
+            logger.warning("CACHE_BACKEND=sqlite needs CACHE_PATH; using in-memory cache", extra={"cache": name})
+            return MemoryCache(name)
+        try:
+            return SQLiteCache(name, path)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache unavailable, using in-memory cache: {e}", extra={"cache": name})
+            return MemoryCache(name)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend!r}")
+
+
+# Singleton instance: generated AI results, keyed by route + canonical input.
+ai_cache = make_cache("ai")
@@ -0,0 +1,209 @@
+# app/codec.py
+"""
+Compact binary encoding for stored arrangements and chord progressions.
+
+Arrangements (`song_arrangements.arrangement`) are split into sections so
+a reader can inflate only what it needs: "summary" (title, key,
+progression, tips...), "chordDiagrams" and "tablature", which is most of
+the bytes. Each section is orjson compressed with zlib against a preset
+dictionary of field names, section labels and chord symbols, so even
+small sections compress well. Layout:
+
+    b"NXA" | version u8 | section count u8
+    per section: name length u8, name, payload length u32 (little-endian)
+    section payloads, in the same order
+
+Progressions (`chord_progressions.progression`) are chord symbols interned
+into CHORDS, one byte each, with an escape for anything else:
+
+    b"NXP" | version u8 | mode u8 | body
+
+Mode 0 is a list of chord indices; 255 escapes a length-prefixed UTF-8
+symbol. Text that doesn't round-trip as space-separated tokens is stored
+in mode 1, zlib compressed as-is.
+
+CHORDS and the preset dictionary belong to FORMAT_VERSION: change either
+and you must bump the version and keep decoding the old one. Values that
+don't start with a magic prefix are legacy JSON/text and decode as before.
+"""
+import struct
+import zlib
+
+import orjson
+
+FORMAT_VERSION = 1
+ARRANGEMENT_MAGIC = b"NXA"
+PROGRESSION_MAGIC = b"NXP"
+
+# Fields big enough to get their own section; everything else is "summary".
+SECTION_FIELDS = ("tablature", "chordDiagrams")
+SUMMARY = "summary"
+
+_ROOTS = ("C", "C#", "Db", "D", "D#", "Eb", "E", "F", "F#", "Gb", "G", "G#", "Ab", "A", "A#", "Bb", "B")
+_QUALITIES = ("", "m", "7", "maj7", "m7", "sus2", "sus4", "dim", "aug", "add9", "6", "m6", "9", "m9")
+# Append-only within a format version: the index is what gets stored.
+CHORDS = tuple(root + quality for root in _ROOTS for quality in _QUALITIES)
+_CHORD_INDEX = {chord: i for i, chord in enumerate(CHORDS)}
+_ESCAPE = 255
+
+# zlib matches against the tail of the dictionary most cheaply, so the
+# most common strings go last.
+_ZDICT = " ".join(CHORDS[::-1]).encode() + (
+    b'"substitutions":[{"originalChord":"","substitutedChord":"","theory":""}]'
+    b'"chordDiagrams":[{"chord":"","frets":["X",0,1,2,3],"fingers":[null,1,2,3],"capoFret":0}]'
+    b'"practiceTips":["Practice slowly"],"tuning":"E A D G B E","capoFret":0,'
+    b'"songTitle":"","artist":"","key":" Major","instrument":"Guitar","progressionSummary":["'
+    b'"tablature":[{"section":"Intro"},{"section":"Verse 1"},{"section":"Pre-Chorus"},'
+    b'{"section":"Chorus"},{"section":"Bridge"},{"section":"Outro"},'
+    b'"lines":[{"lyrics":"","isChordLine":false},{"lyrics":"      ","isChordLine":true}]}'
+)
+
+_SECTION_HEADER = struct.Struct("<I")
+
+
+class CodecError(ValueError):
+    """A stored value that can't be decoded (truncated, bit-flipped or an unknown version)."""
+
+
+def _compress(value) -> bytes:
+    compressor = zlib.compressobj(9, zdict=_ZDICT)
+    return compressor.compress(orjson.dumps(value)) + compressor.flush()
+
+
+def _decompress(data: bytes):
+    decompressor = zlib.decompressobj(zdict=_ZDICT)
+    return orjson.loads(decompressor.decompress(data) + decompressor.flush())
+
+
+def _as_bytes(value) -> bytes:
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, str):
+        return value.encode()
+    return value
+
+
+# ---------------------------
+# Arrangements
+# ---------------------------
+
+def encode_arrangement(arrangement: dict) -> bytes:
+    sections = {SUMMARY: {k: v for k, v in arrangement.items() if k not in SECTION_FIELDS}}
+    for name in SECTION_FIELDS:
+        if name in arrangement:
+            sections[name] = arrangement[name]
+
+    header = [ARRANGEMENT_MAGIC, bytes((FORMAT_VERSION, len(sections)))]
+    payloads = []
+    for name, value in sections.items():
+        payload = _compress(value)
+        header += [bytes((len(name),)), name.encode(), _SECTION_HEADER.pack(len(payload))]
+        payloads.append(payload)
+    return b"".join(header + payloads)
+
+
+def _section_table(blob: bytes):
+    """[(name, start, end)] without inflating anything."""
+    version, count = blob[3], blob[4]
+    if version != FORMAT_VERSION:
+        raise CodecError(f"unsupported arrangement format version {version}")
+    entries, pos = [], 5
+    for _ in range(count):
+        size = blob[pos]
+        name = blob[pos + 1:pos + 1 + size].decode()
+        (length,) = _SECTION_HEADER.unpack_from(blob, pos + 1 + size)
+        entries.append((name, length))
+        pos += 1 + size + _SECTION_HEADER.size
+    table = []
+    for name, length in entries:
+        table.append((name, pos, pos + length))
+        pos += length
+    return table
+
+
+def decode_arrangement(value, sections=None) -> dict:
+    """
+    The stored arrangement as a dict. With `sections` (e.g. ("summary",)),
+    only those sections are inflated and the other fields are left out.
+    """
+    blob = _as_bytes(value)
+    if not blob.startswith(ARRANGEMENT_MAGIC):
+        try:
+            data = orjson.loads(blob)
+        except orjson.JSONDecodeError as e:
+            raise CodecError(f"corrupt legacy arrangement: {e}") from e
+        if sections is None:
+            return data
+        wanted = set(sections)
+        return {
+            k: v for k, v in data.items()
+            if (k if k in SECTION_FIELDS else SUMMARY) in wanted
+        }
+
+    try:
+        result = {}
+        for name, start, end in _section_table(blob):
+            if sections is not None and name not in sections:
+                continue
+            data = _decompress(blob[start:end])
+            if name == SUMMARY:
+                result.update(data)
+            else:
+                result[name] = data
+        return result
+    except (IndexError, struct.error, zlib.error, UnicodeDecodeError, orjson.JSONDecodeError) as e:
+        raise CodecError(f"corrupt arrangement blob: {e}") from e
+
+
+# ---------------------------
+# Progressions
+# ---------------------------
+
+def encode_progression(progression) -> bytes:
+    """'C G Am F' or ['C', 'G', 'Am', 'F'] -> bytes."""
+    if isinstance(progression, (list, tuple)):
+        progression = " ".join(progression)
+    tokens = progression.split(" ")
+    body = bytearray()
+    for token in tokens:
+        index = _CHORD_INDEX.get(token)
+        if index is not None:
+            body.append(index)
+            continue
+        raw = token.encode()
+        if not token or len(raw) > 255:
+            # Not plain space-separated symbols; keep the exact text.
+            return PROGRESSION_MAGIC + bytes((FORMAT_VERSION, 1)) + zlib.compress(progression.encode(), 9)
+        body += bytes((_ESCAPE, len(raw))) + raw
+    return PROGRESSION_MAGIC + bytes((FORMAT_VERSION, 0)) + bytes(body)
+
+
+def decode_progression(value) -> str:
+    blob = _as_bytes(value)
+    if not blob.startswith(PROGRESSION_MAGIC):
+        return blob.decode()
+    version, mode = blob[3], blob[4]
+    if version != FORMAT_VERSION:
+        raise CodecError(f"unsupported progression format version {version}")
+    if mode == 1:
+        try:
+            return zlib.decompress(blob[5:]).decode()
+        except (zlib.error, UnicodeDecodeError) as e:
+            raise CodecError(f"corrupt progression blob: {e}") from e
+
+    tokens, pos = [], 5
+    try:
+        while pos < len(blob):
+            index = blob[pos]
+            if index == _ESCAPE:
+                size = blob[pos + 1]
+                if pos + 2 + size > len(blob):
+                    raise IndexError("escaped symbol runs past the end")
+                tokens.append(blob[pos + 2:pos + 2 + size].decode())
+                pos += 2 + size
+            else:
+                tokens.append(CHORDS[index])
+                pos += 1
+    except (IndexError, UnicodeDecodeError) as e:
+        raise CodecError(f"corrupt progression blob: {e}") from e
+    return " ".join(tokens)
@@ -1,15 +1,135 @@
 # app/config.py
+"""
+Process settings, loaded once.
+
+`.env` and the environment are read here and nowhere else: every knob is a
+field of Settings (LOG_LEVEL -> log_level, ...). Each module copies the
+fields it uses into module-level constants at import, next to the comment
+that explains them, and reads those; tests and benchmarks patch the
+constants, not the environment.
+"""
 from dotenv import load_dotenv
-import os
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-AUDD_API_KEY = os.getenv("AUDD_API_KEY")
 
-FRONTEND_ORIGINS = [
-    "http://localhost:5173"
-]
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(extra="ignore", env_ignore_empty=True)
+
+    # Local runs without Postgres fall back to a SQLite file.
+    database_url: str = "sqlite:///./nexus_dev.db"
+    sql_echo: bool = False
+
+    gemini_api_key: str | None = None
+    grok_api_key: str | None = None
+    grok_api_url: str = "https://api.x.ai/v1/chat/completions"
+    audd_api_key: str | None = None
+
+    # live | record | replay (see app/api/replayStore.py)
+    provider_mode: str = "live"
+    provider_store_dir: str = "provider_store"
+    replay_latency_ms: str = ""
+
+    # Import the Gemini SDK and numpy in the background shortly after
+    # startup instead of on the first request that needs them. The delay
+    # keeps the warm-up from competing with the first health checks.
+    warmup: bool = True
+    warmup_delay_seconds: float = 2.0
+
+    # Seconds an expired /ai result stays servable (see app/routers/ai.py):
+    # while revalidating in the background, and when every provider fails.
+    ai_stale_while_revalidate: float = 86400
+    ai_stale_if_error: float = 7 * 86400
+    # How long one request holds the claim to regenerate a stale result.
+    ai_refresh_lease: float = 120
+
+    frontend_origins: list[str] = ["http://localhost:5173"]
+    default_chord_key: str = "C"
+    # Unset: the /admin routes don't exist.
+    admin_token: str | None = None
+
+    # app/logger.py
+    log_level: str = "INFO"
+    log_format: str = "json"                  # json | text
+    log_queue_size: int = 10000
+    log_hot_path_sample: float = 0.1
+    # app/middleware.py
+    access_log_sample: float = 0.05
+    slow_request_ms: float = 2000
+    etag_max_body: int = 8 * 1024 * 1024
+    compress_min_bytes: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 5
+    # app/tracing.py, app/profiling.py
+    trace_sample_rate: float = 1.0
+    trace_buffer_size: int = 200
+    profile_token: str | None = None
+    profile_sample_rate: float = 0
+    profile_interval_ms: float = 5
+    profile_buffer_size: int = 50
+
+    # app/deadlines.py
+    ai_deadline_seconds: float = 60
+    deadline_grace_seconds: float = 2
+    min_attempt_seconds: float = 1
+    # app/executors.py
+    gemini_max_workers: int = 8
+    gemini_max_queue: int = 32
+    # app/ratelimit.py
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"        # memory | sqlite
+    rate_limit_path: str | None = None
+    rate_limit_per_minute: float = 30
+    rate_limit_per_hour: float = 300
+    rate_limit_trust_forwarded: bool = False
+    # Unset: gemini_max_workers.
+    ai_fair_share_capacity: int | None = None
+
+    # app/cache.py; the backend defaults to sqlite when a path is set.
+    cache_path: str | None = None
+    cache_backend: str | None = None          # sqlite | memory
+    cache_max_entries: int = 20000
+    # app/api/songIndex.py, app/api/arrangementStore.py
+    song_index_path: str = "song_index.npz"
+    song_index_threshold: float = 0.8
+    song_index_bands: int = 12
+    song_index_rows: int = 2
+    arrangement_max_age_days: float = 30
+
+    # app/jobs.py
+    job_workers: int = 2
+    job_max_attempts: int = 3
+    job_poll_interval: float = 1.0
+    job_lease_seconds: float = 300
+    job_retry_base_seconds: float = 5
+    job_dedup_ttl_seconds: float = 3600
+    # app/precompute.py
+    precompute_top_n: int = 50
+    precompute_window_days: float = 30
+    precompute_budget: int = 60
+    precompute_token_budget: int = 0
+    precompute_concurrency: int = 2
+    precompute_interval_minutes: float = 0
+
+    # app/jam.py
+    jam_send_queue: int = 64
+    jam_send_timeout: float = 5
+    jam_max_participants: int = 5000
+    jam_start_lead_ms: float = 1000
+    jam_presence_interval: float = 1.0
+
+    # app/seeders/synthetic.py
+    seed_chunk_size: int = 20000
+
+
+# Singleton instance
+settings = Settings()
+
+DATABASE_URL = settings.database_url
+GEMINI_API_KEY = settings.gemini_api_key
+AUDD_API_KEY = settings.audd_api_key
+
+FRONTEND_ORIGINS = settings.frontend_origins
 
-DEFAULT_CHORD_KEY = "C"
+DEFAULT_CHORD_KEY = settings.default_chord_key
@@ -0,0 +1,179 @@
+# app/deadlines.py
+"""
+Per-request deadlines and cancellation on client disconnect.
+
+DeadlineMiddleware gives every /ai/* request a time budget
+(AI_DEADLINE_SECONDS, or less via an X-Request-Timeout header) and
+stores its absolute deadline in a context variable. Provider code asks
+`remaining()` to size each upstream timeout, calls `check()` before
+starting another attempt or retry, and raises DeadlineExceeded when the
+budget is spent. The middleware also watches for the client going away
+and cancels the handler, which closes in-flight httpx connections and
+stops the Gemini fallback chain. Abandoned requests log with status 499.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import REQUESTS_CANCELLED
+
+logger = get_logger(__name__)
+
+AI_DEADLINE_SECONDS = settings.ai_deadline_seconds
+# Hard stop after the deadline, for handlers that don't check it in time.
+DEADLINE_GRACE_SECONDS = settings.deadline_grace_seconds
+# An upstream attempt isn't worth starting with less time than this left.
+MIN_ATTEMPT_SECONDS = settings.min_attempt_seconds
+DEADLINE_PATH_PREFIXES = ("/ai/",)
+
+# Status nginx uses for "client closed request"; only ever seen in our logs.
+CLIENT_CLOSED_STATUS = 499
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the work finished."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None if it has no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """`default` capped at the time left."""
+    left = remaining()
+    return default if left is None else max(0.0, min(default, left))
+
+
+def check(what: str, need: float = MIN_ATTEMPT_SECONDS):
+    """Raises DeadlineExceeded unless at least `need` seconds are left."""
+    left = remaining()
+    if left is not None and left < need:
+        raise DeadlineExceeded(f"{what}: deadline exceeded ({max(left, 0):.1f}s left)")
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Runs the block under a deadline `seconds` from now (never extends an outer one)."""
+    new = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def wait_for(awaitable, what: str):
+    """Awaits under the remaining budget, raising DeadlineExceeded on timeout."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(left, 0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{what}: deadline exceeded") from None
+
+
+def _budget(scope) -> float:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-request-timeout":
+            try:
+                requested = float(value)
+            except ValueError:
+                break
+            # Clients can shorten the budget, not extend it.
+            if requested > 0:
+                return min(requested, AI_DEADLINE_SECONDS)
+            break
+    return AI_DEADLINE_SECONDS
+
+
+def _route_label(scope) -> str:
+    """The matched route template ("/ai/melody"), never the raw path."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class DeadlineMiddleware:
+    """
+    Applies the deadline to DEADLINE_PATH_PREFIXES and cancels the handler
+    when the client disconnects or the deadline (plus grace) passes.
+    """
+
+    def __init__(self, app, prefixes=DEADLINE_PATH_PREFIXES):
+        self.app = app
+        self.prefixes = prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope.get("path", "").startswith(self.prefixes):
+            return await self.app(scope, receive, send)
+
+        budget = _budget(scope)
+        body_done = asyncio.Event()
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def receive_until_disconnect():
+            if body_done.is_set():
+                # The watcher owns the channel once the body has been read.
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_done.set()
+            return message
+
+        async def send_tracking(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        task = asyncio.current_task()
+
+        async def watch_disconnect():
+            await body_done.wait()
+            # After the full body the only message left is the disconnect.
+            if (await receive())["type"] == "http.disconnect":
+                disconnected.set()
+                task.cancel()
+
+        # The handler runs in this task, so profiles and tracebacks see its frames.
+        watcher = asyncio.ensure_future(watch_disconnect())
+        timer = asyncio.timeout(budget + DEADLINE_GRACE_SECONDS)
+        reason = None
+        try:
+            with deadline(budget):
+                async with timer:
+                    await self.app(scope, receive_until_disconnect, send_tracking)
+        except TimeoutError:
+            if not timer.expired():
+                raise
+            reason = "deadline"
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+            task.uncancel()
+            reason = "client_disconnect"
+        finally:
+            watcher.cancel()
+
+        if reason is None:
+            return
+        REQUESTS_CANCELLED.inc(route=_route_label(scope), reason=reason)
+        logger.warning("Request cancelled", extra={"reason": reason, "budget_s": budget})
+        if not response_started:
+            # Nobody reads a 499; sending one lets the outer middleware log it.
+            status = 504 if reason == "deadline" else CLIENT_CLOSED_STATUS
+            await send({"type": "http.response.start", "status": status, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,96 @@
+# app/executors.py
+"""
+Dedicated thread pools for blocking calls that must not share asyncio's
+default executor.
+
+asyncio.to_thread and FastAPI's sync dependencies/handlers (get_db, sync
+routes) all run on the loop's default pool. A burst of slow Gemini SDK
+calls can occupy every thread there and stall DB work behind them.
+`BoundedExecutor` is a separately sized pool with an optional cap on
+queued work; its queue depth, busy threads and queue wait are exported so
+saturation shows up on /metrics before latency does.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import EXECUTOR_ACTIVE, EXECUTOR_QUEUE_DEPTH, EXECUTOR_QUEUE_WAIT, EXECUTOR_REJECTED
+
+logger = get_logger(__name__)
+
+GEMINI_MAX_WORKERS = settings.gemini_max_workers
+# Calls allowed to wait for a thread; beyond this they are rejected (0 = no cap).
+GEMINI_MAX_QUEUE = settings.gemini_max_queue
+
+
+class ExecutorSaturated(Exception):
+    """The pool's queue is full; the caller should shed or reroute the work."""
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self._pool = None
+        self._lock = threading.Lock()
+        self._queued = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+        return self._pool
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def run(self, func, *args):
+        """Runs func(*args) on this pool with the caller's context, like asyncio.to_thread."""
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                EXECUTOR_REJECTED.inc(executor=self.name)
+                raise ExecutorSaturated(f"{self.name} executor saturated ({self._queued} queued)")
+            self._queued += 1
+        EXECUTOR_QUEUE_DEPTH.inc(executor=self.name)
+
+        submitted = time.perf_counter()
+        state = {"started": False, "abandoned": False}
+        context = contextvars.copy_context()
+
+        def call():
+            with self._lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+                self._queued -= 1
+            EXECUTOR_QUEUE_DEPTH.dec(executor=self.name)
+            EXECUTOR_QUEUE_WAIT.observe(time.perf_counter() - submitted, executor=self.name)
+            with EXECUTOR_ACTIVE.track(executor=self.name):
+                return context.run(func, *args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), call)
+        except asyncio.CancelledError:
+            # Cancelled while still queued: drop the work item unrun.
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self._queued -= 1
+                    EXECUTOR_QUEUE_DEPTH.dec(executor=self.name)
+            raise
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Singleton instance: Gemini SDK calls.
+gemini_executor = BoundedExecutor("gemini", GEMINI_MAX_WORKERS, GEMINI_MAX_QUEUE)
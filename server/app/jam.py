@@ -0,0 +1,350 @@
+# app/jam.py
+"""
+Real-time jam sessions: one leader sets tempo, time signature and the
+backing track, everyone else follows in time.
+
+Clock sync is NTP-style. A client sends {"type": "ping", "t0": <its clock,
+ms>}; the server answers {"type": "pong", "t0", "t1": received, "t2": sent}
+on its own clock, and with t3 = the client's clock on arrival:
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2     # server clock - client clock
+    delay  = (t3 - t0) - (t2 - t1)
+
+Clients keep the offset of the lowest-delay sample out of a handful. The
+session state carries `startAt`, the server time of beat 0, so each device
+computes the current beat as (now + offset - startAt) * bpm / 60000 and
+beats line up regardless of when the message arrived. Tempo changes while
+playing re-anchor startAt so the beat count stays continuous.
+
+Fan-out: every broadcast is serialized once and the same string is queued
+on each connection; a per-connection writer task does the actual sends, so
+one slow socket never delays the others. State updates supersede each
+other (a connection that falls behind only gets the latest), other
+messages are queued up to JAM_SEND_QUEUE; a connection whose queue
+overflows or whose send stalls for JAM_SEND_TIMEOUT seconds is closed and
+can rejoin.
+
+Messages are a few hundred bytes, so permessage-deflate only adds a
+compression per socket per broadcast; serve with
+`uvicorn --ws-per-message-deflate false`.
+
+Sessions live in the process that accepted them, so with several web
+workers a session's participants must be routed to the same worker.
+"""
+import asyncio
+import itertools
+import re
+import time
+from collections import deque
+
+import orjson
+from pydantic import ValidationError
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import JAM_CONNECTIONS, JAM_FANOUT, JAM_MESSAGES, JAM_SLOW_CLOSED
+from app.schemas import BackingTrackResult
+
+logger = get_logger(__name__)
+
+JAM_SEND_QUEUE = settings.jam_send_queue
+JAM_SEND_TIMEOUT = settings.jam_send_timeout
+JAM_MAX_PARTICIPANTS = settings.jam_max_participants
+# "start" without an explicit time begins this far ahead, so every client has the state before beat 0.
+JAM_START_LEAD_MS = settings.jam_start_lead_ms
+# Participant count updates are coalesced to at most one per interval.
+JAM_PRESENCE_INTERVAL = settings.jam_presence_interval
+
+MIN_BPM, MAX_BPM = 20, 300
+_TIME_SIGNATURE = re.compile(r"([1-9]|1[0-6])/(1|2|4|8|16)")
+
+# WebSocket close codes
+CLOSE_FULL = 1013          # try again later
+CLOSE_SLOW_CONSUMER = 1008  # policy violation: not reading
+
+
+class JamError(ValueError):
+    """A client message the session can't apply; reported back to the sender only."""
+
+
+def server_ms() -> float:
+    return time.time() * 1000
+
+
+def dumps(message: dict) -> str:
+    return orjson.dumps(message).decode()
+
+
+class JamConnection:
+    """One participant's socket and its outbound queue."""
+
+    def __init__(self, websocket, conn_id: str, name: str):
+        self.websocket = websocket
+        self.id = conn_id
+        self.name = name
+        self.joined_at = server_ms()
+        self.closed = False
+        self._queue = deque()
+        self._latest = {}
+        self._pong = None
+        self._ready = asyncio.Event()
+        self._writer = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, payload, supersede: str = None):
+        """Queue a pre-serialized message; `supersede` keeps only the newest message of that kind."""
+        if self.closed:
+            return
+        if supersede is not None:
+            self._latest[supersede] = payload
+        elif len(self._queue) >= JAM_SEND_QUEUE:
+            self.close_slow("send queue full")
+            return
+        else:
+            self._queue.append(payload)
+        self._ready.set()
+
+    def send_pong(self, t0, t1: float):
+        # Ahead of everything else, and only the newest: a client flooding pings
+        # without reading can't grow the queue. t2 is stamped when it goes out.
+        if self.closed:
+            return
+        self._pong = {"type": "pong", "t0": t0, "t1": t1}
+        self._ready.set()
+
+    def close_slow(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        JAM_SLOW_CLOSED.inc()
+        logger.warning(f"Closing slow jam connection {self.id}: {reason}")
+        asyncio.create_task(self._close(CLOSE_SLOW_CONSUMER, reason))
+
+    async def _close(self, code: int, reason: str):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), JAM_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while (self._pong or self._queue or self._latest) and not self.closed:
+                    if self._pong is not None:
+                        payload, self._pong = dumps({**self._pong, "t2": server_ms()}), None
+                    elif self._queue:
+                        payload = self._queue.popleft()
+                    else:
+                        payload = self._latest.pop(next(iter(self._latest)))
+                    try:
+                        # asyncio.timeout, unlike wait_for, doesn't start a task per send.
+                        async with asyncio.timeout(JAM_SEND_TIMEOUT):
+                            await self.websocket.send_text(payload)
+                    except TimeoutError:
+                        self.close_slow("send timed out")
+        except Exception:
+            # The socket went away; the receive side will notice and leave the session.
+            self.closed = True
+
+    async def stop(self):
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class JamSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.connections = {}
+        self.leader_id = None
+        self.bpm = 120
+        self.time_signature = "4/4"
+        self.playing = False
+        self.start_at = None
+        self.seq = 0
+        self.backing_track = None
+        self._backing_track_payload = None
+        self._presence_pending = False
+
+    # ---------------------------
+    # Messages
+    # ---------------------------
+
+    def state(self) -> dict:
+        return {
+            "type": "state",
+            "seq": self.seq,
+            "bpm": self.bpm,
+            "timeSignature": self.time_signature,
+            "playing": self.playing,
+            "startAt": self.start_at,
+            "leader": self.leader_id,
+            "participants": len(self.connections),
+            "hasBackingTrack": self.backing_track is not None,
+            "serverTime": server_ms(),
+        }
+
+    def broadcast(self, message: dict, supersede: str = None):
+        """Serialize once, queue on every connection; never waits on a socket."""
+        started = time.perf_counter()
+        payload = dumps(message)
+        for conn in self.connections.values():
+            conn.send(payload, supersede)
+        JAM_MESSAGES.inc(type=message["type"])
+        JAM_FANOUT.observe(time.perf_counter() - started)
+
+    def broadcast_state(self):
+        self.seq += 1
+        self.broadcast(self.state(), supersede="state")
+
+    def schedule_presence(self):
+        if self._presence_pending:
+            return
+        self._presence_pending = True
+        asyncio.get_running_loop().call_later(JAM_PRESENCE_INTERVAL, self._send_presence)
+
+    def _send_presence(self):
+        self._presence_pending = False
+        if self.connections:
+            self.broadcast(
+                {"type": "presence", "participants": len(self.connections), "leader": self.leader_id},
+                supersede="presence",
+            )
+
+    # ---------------------------
+    # Leader commands
+    # ---------------------------
+
+    def _set_tempo(self, bpm=None, time_signature=None):
+        if bpm is not None:
+            if not isinstance(bpm, (int, float)) or not MIN_BPM <= bpm <= MAX_BPM:
+                raise JamError(f"bpm must be between {MIN_BPM} and {MAX_BPM}")
+            if self.playing and self.start_at is not None:
+                # Keep the current beat number where it is under the new tempo.
+                now = server_ms()
+                beat = (now - self.start_at) * self.bpm / 60000
+                self.start_at = now - beat * 60000 / bpm
+            self.bpm = bpm
+        if time_signature is not None:
+            if not isinstance(time_signature, str) or not _TIME_SIGNATURE.fullmatch(time_signature):
+                raise JamError("timeSignature must look like '4/4' or '7/8'")
+            self.time_signature = time_signature
+
+    def apply(self, conn: JamConnection, message: dict):
+        """Apply a leader command and broadcast the result."""
+        kind = message.get("type")
+        if conn.id != self.leader_id:
+            raise JamError("Only the session leader can change the session")
+        if kind == "tempo":
+            self._set_tempo(message.get("bpm"), message.get("timeSignature"))
+        elif kind == "start":
+            at = message.get("at")
+            if at is not None and not isinstance(at, (int, float)):
+                raise JamError("at must be a server timestamp in ms")
+            self.playing = True
+            self.start_at = at if at is not None else server_ms() + JAM_START_LEAD_MS
+        elif kind == "stop":
+            self.playing = False
+            self.start_at = None
+        elif kind == "backingTrack":
+            try:
+                track = BackingTrackResult.model_validate(message.get("track"))
+            except ValidationError as e:
+                raise JamError(f"Invalid backing track: {e.errors(include_url=False)}")
+            self.backing_track = track.model_dump()
+            self._set_tempo(bpm=min(max(track.bpm, MIN_BPM), MAX_BPM))
+            self._backing_track_payload = dumps({"type": "backingTrack", "track": self.backing_track})
+            for other in self.connections.values():
+                other.send(self._backing_track_payload, supersede="backingTrack")
+            JAM_MESSAGES.inc(type="backingTrack")
+        elif kind == "handoff":
+            target = message.get("to")
+            if target not in self.connections:
+                raise JamError("Unknown participant")
+            self.leader_id = target
+        else:
+            raise JamError(f"Unknown message type: {kind}")
+        self.broadcast_state()
+
+    # ---------------------------
+    # Membership
+    # ---------------------------
+
+    def add(self, conn: JamConnection):
+        self.connections[conn.id] = conn
+        if self.leader_id is None:
+            self.leader_id = conn.id
+        conn.send(dumps({"type": "welcome", "id": conn.id, "state": self.state()}))
+        if self._backing_track_payload is not None:
+            conn.send(self._backing_track_payload, supersede="backingTrack")
+        self.schedule_presence()
+
+    def remove(self, conn: JamConnection):
+        if self.connections.pop(conn.id, None) is None:
+            return
+        if conn.id == self.leader_id:
+            # Longest-connected participant takes over.
+            self.leader_id = next(iter(self.connections), None)
+            if self.leader_id is not None:
+                self.broadcast_state()
+                return
+        self.schedule_presence()
+
+
+class JamHub:
+    def __init__(self):
+        self.sessions = {}
+        self._ids = itertools.count(1)
+
+    def get(self, session_id: str):
+        return self.sessions.get(session_id)
+
+    def join(self, session_id: str, websocket, name: str) -> tuple:
+        """(session, connection); raises JamError if the session is full."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = JamSession(session_id)
+        if len(session.connections) >= JAM_MAX_PARTICIPANTS:
+            raise JamError("Session is full")
+        conn = JamConnection(websocket, f"p{next(self._ids)}", name)
+        conn.start()
+        session.add(conn)
+        JAM_CONNECTIONS.inc()
+        return session, conn
+
+    async def leave(self, session: JamSession, conn: JamConnection):
+        session.remove(conn)
+        JAM_CONNECTIONS.dec()
+        await conn.stop()
+        if not session.connections:
+            self.sessions.pop(session.id, None)
+
+    def handle(self, session: JamSession, conn: JamConnection, text: str):
+        """One incoming text frame."""
+        received = server_ms()
+        try:
+            message = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            message = None
+        if not isinstance(message, dict):
+            conn.send(dumps({"type": "error", "detail": "Messages must be JSON objects"}))
+            return
+        if message.get("type") == "ping":
+            conn.send_pong(message.get("t0"), received)
+            return
+        try:
+            session.apply(conn, message)
+        except JamError as e:
+            conn.send(dumps({"type": "error", "detail": str(e)}))
+
+
+# Singleton instance
+jam_hub = JamHub()
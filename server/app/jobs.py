@@ -0,0 +1,392 @@
+# app/jobs.py
+"""
+Durable background jobs for long generations.
+
+Submissions are rows in `generation_jobs`; a pool of JOB_WORKERS asyncio
+workers claims them with a conditional UPDATE (safe across processes),
+runs the registered handler and stores the JSON result. A claimed job
+holds a lease; if the process dies, the lease runs out and another worker
+picks the job up again, so restarts don't lose work.
+
+Run workers outside the web process with `python -m app.jobs` and set
+JOB_WORKERS=0 on the web side.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta, timezone
+
+from pydantic import ValidationError
+from sqlalchemy import and_, or_, select, update
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.deadlines import deadline
+from app.logger import get_logger
+from app.metrics import JOB_DURATION, JOB_QUEUE_WAIT, JOBS_FINISHED, JOBS_RUNNING, JOBS_SUBMITTED
+from app.models import GenerationJob, utcnow
+
+logger = get_logger(__name__)
+
+JOB_WORKERS = settings.job_workers
+JOB_MAX_ATTEMPTS = settings.job_max_attempts
+JOB_POLL_INTERVAL = settings.job_poll_interval
+JOB_LEASE_SECONDS = settings.job_lease_seconds
+JOB_RETRY_BASE_SECONDS = settings.job_retry_base_seconds
+# Finished jobs younger than this are handed back for identical submissions.
+JOB_DEDUP_TTL_SECONDS = settings.job_dedup_ttl_seconds
+
+ACTIVE = ("queued", "running")
+TERMINAL = ("succeeded", "failed")
+
+
+class InvalidJobPayload(ValueError):
+    """The body doesn't match the kind's request model; retrying won't help."""
+
+    def __init__(self, errors: list):
+        super().__init__(f"Invalid job payload: {errors}")
+        self.errors = errors
+
+
+def dedup_key(kind: str, payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{kind}\0{canonical}".encode()).hexdigest()
+
+
+def _aware(dt):
+    # SQLite hands back naive datetimes; everything we store is UTC.
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+
+def job_to_dict(job: GenerationJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "maxAttempts": job.max_attempts,
+        "createdAt": _aware(job.created_at),
+        "startedAt": _aware(job.started_at),
+        "finishedAt": _aware(job.finished_at),
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._request_models = {}
+        self._tasks = []
+        self._wakeup = None
+        self._finished = {}
+        self._waiters = {}
+
+    def register(self, kind: str, handler, request_model=None):
+        """
+        `handler(payload: dict) -> awaitable JSON-able result`. With a
+        pydantic `request_model`, payloads are validated on submit.
+        """
+        self._handlers[kind] = handler
+        if request_model is not None:
+            self._request_models[kind] = request_model
+
+    def validate(self, kind: str, payload: dict):
+        """Raises InvalidJobPayload unless `payload` fits the kind's request model."""
+        model = self._request_models.get(kind)
+        if model is None:
+            return
+        try:
+            model.model_validate(payload)
+        except ValidationError as e:
+            raise InvalidJobPayload(e.errors(include_url=False)) from None
+
+    @property
+    def kinds(self):
+        return sorted(self._handlers)
+
+    # ---------------------------
+    # DB operations (sync, run via asyncio.to_thread)
+    # ---------------------------
+
+    def _submit(self, kind: str, payload: dict, max_attempts: int):
+        self.validate(kind, payload)
+        key = dedup_key(kind, payload)
+        cutoff = utcnow() - timedelta(seconds=JOB_DEDUP_TTL_SECONDS)
+        with SessionLocal() as db:
+            existing = db.execute(
+                select(GenerationJob)
+                .where(GenerationJob.dedup_key == key)
+                .where(or_(
+                    GenerationJob.status.in_(ACTIVE),
+                    and_(GenerationJob.status == "succeeded", GenerationJob.finished_at >= cutoff),
+                ))
+                .order_by(GenerationJob.created_at.desc())
+                .limit(1)
+            ).scalar_one_or_none()
+            if existing is not None:
+                return job_to_dict(existing), True
+
+            job = GenerationJob(
+                id=uuid.uuid4().hex,
+                kind=kind,
+                payload=json.dumps(payload, default=str),
+                dedup_key=key,
+                status="queued",
+                attempts=0,
+                max_attempts=max_attempts,
+                run_after=utcnow(),
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            return job_to_dict(job), False
+
+    def _get(self, job_id: str):
+        with SessionLocal() as db:
+            job = db.get(GenerationJob, job_id)
+            return job_to_dict(job) if job else None
+
+    def _claim(self):
+        """Claims one due job (queued, or running with an expired lease and attempts left)."""
+        now = utcnow()
+        expired = and_(GenerationJob.status == "running", GenerationJob.lease_expires_at < now)
+        with SessionLocal() as db:
+            # A job whose last attempt took its worker down is not run again.
+            exhausted = db.execute(
+                select(GenerationJob.id, GenerationJob.kind)
+                .where(expired, GenerationJob.attempts >= GenerationJob.max_attempts)
+                .limit(8)
+            ).all()
+            for job_id, kind in exhausted:
+                failed = db.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, expired)
+                    .values(
+                        status="failed",
+                        error="Lease expired on the last attempt",
+                        finished_at=now,
+                        lease_expires_at=None,
+                    )
+                ).rowcount
+                db.commit()
+                if failed:
+                    JOBS_FINISHED.inc(kind=kind, outcome="failed")
+                    logger.warning("Job failed: lease expired on its last attempt", extra={"job_id": job_id, "kind": kind})
+
+            candidates = db.execute(
+                select(GenerationJob.id, GenerationJob.status, GenerationJob.run_after, GenerationJob.kind)
+                .where(or_(
+                    and_(GenerationJob.status == "queued", GenerationJob.run_after <= now),
+                    and_(expired, GenerationJob.attempts < GenerationJob.max_attempts),
+                ))
+                .order_by(GenerationJob.run_after)
+                .limit(8)
+            ).all()
+
+            for job_id, status, run_after, kind in candidates:
+                if kind not in self._handlers:
+                    continue
+                # Only one worker wins the conditional update.
+                claimed = db.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, GenerationJob.status == status)
+                    .where(or_(
+                        GenerationJob.status == "queued",
+                        and_(GenerationJob.lease_expires_at < now, GenerationJob.attempts < GenerationJob.max_attempts),
+                    ))
+                    .values(
+                        status="running",
+                        locked_by=self.worker_id,
+                        attempts=GenerationJob.attempts + 1,
+                        started_at=now,
+                        lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    )
+                ).rowcount
+                db.commit()
+                if claimed:
+                    if status == "running":
+                        logger.warning("Recovered job with expired lease", extra={"job_id": job_id, "kind": kind})
+                    job = db.get(GenerationJob, job_id)
+                    JOB_QUEUE_WAIT.observe((now - _aware(run_after)).total_seconds(), kind=kind)
+                    return job.id, job.kind, json.loads(job.payload), job.attempts, job.max_attempts
+        return None
+
+    def _complete(self, job_id: str, result):
+        with SessionLocal() as db:
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.locked_by == self.worker_id)
+                .values(
+                    status="succeeded",
+                    result=json.dumps(result, default=str),
+                    error=None,
+                    finished_at=utcnow(),
+                    lease_expires_at=None,
+                )
+            )
+            db.commit()
+
+    def _fail(self, job_id: str, error: str, retry: bool, attempts: int):
+        values = {"error": error[:2000], "lease_expires_at": None}
+        if retry:
+            values.update(status="queued", run_after=utcnow() + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+        else:
+            values.update(status="failed", finished_at=utcnow())
+        with SessionLocal() as db:
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.locked_by == self.worker_id)
+                .values(**values)
+            )
+            db.commit()
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+
+    async def submit(self, kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job, deduplicated = await asyncio.to_thread(self._submit, kind, payload, max_attempts)
+        JOBS_SUBMITTED.inc(kind=kind, deduplicated=str(deduplicated).lower())
+        if not deduplicated and self._wakeup is not None:
+            self._wakeup.set()
+        return job, deduplicated
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def wait(self, job_id: str, timeout: float):
+        """Long-poll: returns once the job is terminal or `timeout` passes."""
+        deadline = time.monotonic() + timeout
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                job = await self.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in TERMINAL or remaining <= 0:
+                    return job
+                # Woken early when a worker in this process finishes the job;
+                # jobs run elsewhere are picked up by the periodic re-read.
+                event = self._finished.setdefault(job_id, asyncio.Event())
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, JOB_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # The last waiter out drops the event, whether or not the job finished.
+            waiters = self._waiters.pop(job_id) - 1
+            if waiters:
+                self._waiters[job_id] = waiters
+            else:
+                self._finished.pop(job_id, None)
+
+    # ---------------------------
+    # Workers
+    # ---------------------------
+
+    async def _run_one(self, claimed):
+        job_id, kind, payload, attempts, max_attempts = claimed
+        started = time.perf_counter()
+        JOBS_RUNNING.inc(kind=kind)
+        try:
+            # Finish (or give up) before the lease lets another worker claim it.
+            with deadline(JOB_LEASE_SECONDS * 0.9):
+                result = await self._handlers[kind](payload)
+        except asyncio.CancelledError:
+            # Shutting down: leave the lease to expire so the job is retried.
+            raise
+        except Exception as e:
+            retry = attempts < max_attempts and not isinstance(e, InvalidJobPayload)
+            JOBS_FINISHED.inc(kind=kind, outcome="retried" if retry else "failed")
+            logger.warning(
+                f"Job attempt failed: {e}",
+                extra={"job_id": job_id, "kind": kind, "attempt": attempts, "retry": retry},
+            )
+            await asyncio.to_thread(self._fail, job_id, str(e) or type(e).__name__, retry, attempts)
+        else:
+            JOBS_FINISHED.inc(kind=kind, outcome="succeeded")
+            await asyncio.to_thread(self._complete, job_id, result)
+        finally:
+            JOBS_RUNNING.dec(kind=kind)
+            JOB_DURATION.observe(time.perf_counter() - started, kind=kind)
+            event = self._finished.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    async def _worker(self, n: int):
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self._claim)
+            except Exception:
+                logger.error("Job claim failed", exc_info=True, extra={"worker": n})
+                claimed = None
+
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_one(claimed)
+
+    def _load_handlers(self):
+        # Imported lazily: the route handlers pull in the provider singletons.
+        from pydantic import TypeAdapter
+        from app.routers.ai import JOB_ROUTES
+
+        for kind, (handler, request_model, response_model) in JOB_ROUTES.items():
+            adapter = TypeAdapter(response_model)
+
+            async def run(payload, handler=handler, request_model=request_model, adapter=adapter):
+                try:
+                    body = request_model.model_validate(payload)
+                except ValidationError as e:
+                    # Queued before validation on submit, or by hand.
+                    raise InvalidJobPayload(e.errors(include_url=False)) from None
+                result = await handler(body)
+                return adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+
+            self.register(kind, run, request_model)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._load_handlers()
+        if engine.dialect.name == "sqlite":
+            # Dev fallback database: no Alembic run to create the table.
+            GenerationJob.__table__.create(bind=engine, checkfirst=True)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        if self.workers:
+            logger.info("Job workers started", extra={"workers": self.workers, "worker_id": self.worker_id})
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Singleton instance
+job_queue = JobQueue()
+
+
+if __name__ == "__main__":
+    from app.logger import setup_logging
+
+    async def _serve():
+        setup_logging()
+        job_queue.workers = max(1, JOB_WORKERS)
+        job_queue.start()
+        await asyncio.gather(*job_queue._tasks)
+
+    asyncio.run(_serve())
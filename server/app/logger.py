@@ -0,0 +1,142 @@
+# app/logger.py
+"""
+Structured, non-blocking logging.
+
+Records are enqueued from the request path with their context (request id,
+route) attached, and a background QueueListener thread formats and writes
+them. If the queue is full the record is dropped rather than blocking.
+"""
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+from app.config import settings
+
+LOG_LEVEL = settings.log_level.upper()
+LOG_FORMAT = settings.log_format.lower()          # json | text
+LOG_QUEUE_SIZE = settings.log_queue_size
+# Fraction of per-request chatter ("trying gemini", ...) that is kept.
+HOT_PATH_SAMPLE = settings.log_hot_path_sample
+
+request_id_var = ContextVar("request_id", default=None)
+route_var = ContextVar("route", default=None)
+
+# Attributes every LogRecord has; anything else came in via `extra=`.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+
+class _ContextQueueHandler(QueueHandler):
+    """Captures contextvars on the calling thread and defers formatting."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.request_id = request_id_var.get()
+        if getattr(record, "route", None) is None:
+            record.route = route_var.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of high-volume records. Call sites opt in with
+    `extra={"sample": 0.01}`; unsampled records always pass.
+    """
+
+    def filter(self, record):
+        rate = getattr(record, "sample", None)
+        if rate is None or rate >= 1:
+            return True
+        if random.random() < rate:
+            record.sampled = rate
+            return True
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in _RESERVED and value is not None
+        )
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line = f"{line} [{fields}]"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+_listener = None
+_queue_handler = None
+
+
+def setup_logging():
+    """Installs the queue handler on the `app` logger. Safe to call twice."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    sink = logging.StreamHandler(sys.stdout)
+    sink.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    _queue_handler = _ContextQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger("app")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, sink, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger("app").removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
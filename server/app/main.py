@@ -1,8 +1,33 @@
+import asyncio
+import importlib
+
 from fastapi import FastAPI
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import ai
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.logger import get_logger, setup_logging, shutdown_logging
+
+# Logging has to be in place before the provider singletons are imported.
+setup_logging()
+
+from app.api.arrangementStore import arrangement_store
+from app.deadlines import DeadlineMiddleware
+from app.executors import gemini_executor
+from app.jobs import job_queue
+from app.metrics import REGISTRY
+from app.precompute import precomputer
+from app.middleware import CompressionMiddleware, ETagMiddleware, RequestContextMiddleware
+from app.profiling import ProfilingMiddleware
+from app.ratelimit import RateLimitMiddleware
+from app.responses import ORJSONResponse
+from app.tracing import TracingMiddleware
+from app.api.geminiService import gemini_music_service
+from app.routers import admin, ai, audio, jam, jobs
+
+logger = get_logger(__name__)
 
-app = FastAPI()
+app = FastAPI(default_response_class=Default(ORJSONResponse))
 
 # Allow frontend requests
 origins = [
@@ -13,25 +38,66 @@ origins = [
     "https://ai-music-store.onrender.com/"
 ]
 
+# Inside CORS, so 429s, 504s and 499s still get CORS headers and preflights
+# never count. Deadlines wrap the handler directly so the budget starts after
+# the rate limit check and a cancelled request still passes through the others.
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],                  
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Remaining"],
 )
+# Outermost last: ETags are computed on the identity body, then compressed;
+# tracing and profiling run inside the request-id context.
+app.add_middleware(ETagMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 
 
 app.include_router(ai.router)
+app.include_router(audio.router)
+app.include_router(jobs.router)
+app.include_router(admin.router)
+app.include_router(jam.router)
+
+_background_tasks = set()
+
+
+async def warm_up():
+    """Loads the provider SDK, numpy and the song index off the event loop once we are serving."""
+    await asyncio.sleep(settings.warmup_delay_seconds)
+    await gemini_music_service.warm_up()
+    await asyncio.to_thread(importlib.import_module, "app.api.tempoService")
+    song_index = (await asyncio.to_thread(importlib.import_module, "app.api.songIndex")).song_index
+    if not song_index.loaded:
+        await asyncio.to_thread(song_index.load)
+    logger.info("Warm-up finished")
 
-# --- YOUR PRINT STATEMENTS ---
 @app.on_event("startup")
 async def startup_event():
-    print("🚀 FastAPI app is starting up...")
+    setup_logging()
+    logger.info("FastAPI app is starting up")
+    arrangement_store.ensure_schema()
+    job_queue.start()
+    precomputer.start()
+    if settings.warmup:
+        task = asyncio.create_task(warm_up())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    print("🛑 FastAPI app is shutting down...")
+    logger.info("FastAPI app is shutting down")
+    await precomputer.stop()
+    await job_queue.stop()
+    gemini_executor.shutdown()
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -41,6 +107,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "API is running successfully"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/test-cors")
 async def test_cors():
     return {"message": "CORS is working!"}
\ No newline at end of file
@@ -0,0 +1,349 @@
+# app/metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Every update is a dict lookup plus an add under a per-metric lock, so
+instrumenting the request path costs well under a microsecond.
+"""
+import threading
+from bisect import bisect_left
+
+# Latency buckets (seconds) sized for LLM calls: sub-second cache hits up to
+# the multi-attempt Grok retry chain.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def track(self, **labels):
+        return _GaugeTracker(self, labels)
+
+
+class _GaugeTracker:
+    __slots__ = ("gauge", "labels")
+
+    def __init__(self, gauge: Gauge, labels: dict):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec(**self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., +Inf count, sum]
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[idx] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self._header()
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------------------------
+# AI routes & providers
+# ---------------------------
+AI_ROUTE_LATENCY = REGISTRY.histogram(
+    "ai_route_duration_seconds",
+    "End-to-end latency of /ai routes, including provider fallback.",
+    ("route", "status"),
+)
+AI_ROUTE_IN_FLIGHT = REGISTRY.gauge(
+    "ai_route_in_flight_requests",
+    "AI route requests currently being handled.",
+    ("route",),
+)
+AI_PROVIDER_LATENCY = REGISTRY.histogram(
+    "ai_provider_call_duration_seconds",
+    "Latency of a single upstream provider attempt.",
+    ("route", "provider", "model", "outcome"),
+)
+AI_PROVIDER_IN_FLIGHT = REGISTRY.gauge(
+    "ai_provider_in_flight_calls",
+    "Upstream provider calls currently awaiting a response.",
+    ("provider",),
+)
+AI_SERVED = REGISTRY.counter(
+    "ai_responses_served_total",
+    "Successful responses by the provider and model that produced them.",
+    ("route", "provider", "model"),
+)
+AI_PROVIDER_FALLBACKS = REGISTRY.counter(
+    "ai_provider_fallbacks_total",
+    "Requests that fell through from Gemini to Grok.",
+    ("route",),
+)
+AI_MODEL_FALLBACKS = REGISTRY.counter(
+    "ai_model_fallbacks_total",
+    "Gemini model switches within FALLBACK_MODELS, by the model that failed.",
+    ("route", "model", "reason"),
+)
+AI_RATE_LIMITED = REGISTRY.counter(
+    "ai_provider_rate_limited_total",
+    "HTTP 429 / quota responses from upstream providers.",
+    ("provider", "model"),
+)
+AI_PARSE_FAILURES = REGISTRY.counter(
+    "ai_parse_failures_total",
+    "Provider responses that could not be parsed into JSON.",
+    ("route", "provider"),
+)
+AI_NORMALIZED = REGISTRY.counter(
+    "ai_normalized_responses_total",
+    "Provider responses by schema normalization outcome (valid, repaired, rejected).",
+    ("route", "provider", "outcome"),
+)
+AI_TOKENS = REGISTRY.counter(
+    "ai_tokens_total",
+    "Prompt and completion tokens reported by providers.",
+    ("route", "provider", "model", "kind"),
+)
+
+AI_DEADLINE_EXCEEDED = REGISTRY.counter(
+    "ai_deadline_exceeded_total",
+    "Provider work abandoned because the request deadline ran out, by provider.",
+    ("route", "provider"),
+)
+AI_STALE_SERVED = REGISTRY.counter(
+    "ai_stale_served_total",
+    "Expired cached results served, by reason (revalidate: refreshed in the background; error: providers failed).",
+    ("route", "reason"),
+)
+AI_REFRESHES = REGISTRY.counter(
+    "ai_background_refreshes_total",
+    "Background regenerations of stale cached results, by outcome (ok, failed).",
+    ("route", "outcome"),
+)
+REQUESTS_CANCELLED = REGISTRY.counter(
+    "http_requests_cancelled_total",
+    "Requests cancelled before completion (client_disconnect, deadline).",
+    ("route", "reason"),
+)
+
+# ---------------------------
+# Executors
+# ---------------------------
+EXECUTOR_QUEUE_DEPTH = REGISTRY.gauge(
+    "executor_queue_depth",
+    "Calls waiting for a thread in a dedicated executor.",
+    ("executor",),
+)
+EXECUTOR_ACTIVE = REGISTRY.gauge(
+    "executor_active_threads",
+    "Threads of a dedicated executor currently running a call.",
+    ("executor",),
+)
+EXECUTOR_QUEUE_WAIT = REGISTRY.histogram(
+    "executor_queue_wait_seconds",
+    "Time a call waited for a free executor thread.",
+    ("executor",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+EXECUTOR_REJECTED = REGISTRY.counter(
+    "executor_rejected_total",
+    "Calls rejected because the executor queue was full.",
+    ("executor",),
+)
+
+# ---------------------------
+# Caches
+# ---------------------------
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and result (hit/stale/miss).",
+    ("cache", "result"),
+)
+
+# ---------------------------
+# Background jobs
+# ---------------------------
+JOBS_SUBMITTED = REGISTRY.counter(
+    "jobs_submitted_total",
+    "Job submissions; deduplicated ones reuse an existing job.",
+    ("kind", "deduplicated"),
+)
+JOBS_FINISHED = REGISTRY.counter(
+    "jobs_finished_total",
+    "Job attempts by outcome (succeeded, retried, failed).",
+    ("kind", "outcome"),
+)
+JOB_DURATION = REGISTRY.histogram(
+    "job_run_duration_seconds",
+    "Time a worker spent on a single job attempt.",
+    ("kind",),
+)
+JOB_QUEUE_WAIT = REGISTRY.histogram(
+    "job_queue_wait_seconds",
+    "Time from submission (or retry) until a worker claimed the job.",
+    ("kind",),
+)
+JOBS_RUNNING = REGISTRY.gauge(
+    "jobs_running",
+    "Jobs currently executing in this process.",
+    ("kind",),
+)
+
+# ---------------------------
+# Jam sessions
+# ---------------------------
+JAM_CONNECTIONS = REGISTRY.gauge(
+    "jam_connections",
+    "Open jam session WebSockets in this process.",
+)
+JAM_MESSAGES = REGISTRY.counter(
+    "jam_messages_total",
+    "Messages broadcast to jam sessions, by type.",
+    ("type",),
+)
+JAM_FANOUT = REGISTRY.histogram(
+    "jam_fanout_seconds",
+    "Time to serialize a broadcast and queue it on every connection of the session.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+JAM_SLOW_CLOSED = REGISTRY.counter(
+    "jam_slow_consumers_closed_total",
+    "Jam connections closed because they stopped reading.",
+)
+
+# ---------------------------
+# Rate limiting
+# ---------------------------
+RATE_LIMIT_REJECTED = REGISTRY.counter(
+    "ratelimit_rejected_total",
+    "Requests turned away with 429, by the rule that rejected them (minute, hour, ip-*, fair-share).",
+    ("route", "rule"),
+)
+RATE_LIMIT_IN_FLIGHT = REGISTRY.gauge(
+    "ratelimit_ai_in_flight",
+    "AI route calls counted against AI_FAIR_SHARE_CAPACITY in this process.",
+)
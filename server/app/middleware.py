@@ -0,0 +1,269 @@
+# app/middleware.py
+import gzip
+import hashlib
+import time
+import uuid
+
+from starlette.datastructures import MutableHeaders
+
+from app.config import settings
+from app.logger import get_logger, request_id_var, route_var
+
+logger = get_logger(__name__)
+
+# Successful access lines are sampled; errors and slow requests always log.
+ACCESS_LOG_SAMPLE = settings.access_log_sample
+SLOW_REQUEST_MS = settings.slow_request_ms
+
+
+class RequestContextMiddleware:
+    """
+    Assigns every request an id (honouring an incoming X-Request-ID), binds
+    it to the logging context and echoes it back on the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        rid_token = request_id_var.set(request_id)
+        route_token = route_var.set(scope.get("path"))
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            extra = {"method": scope.get("method"), "status": status, "duration_ms": duration_ms}
+            if status < 500 and duration_ms < SLOW_REQUEST_MS:
+                extra["sample"] = ACCESS_LOG_SAMPLE
+            logger.info("request completed", extra=extra)
+            route_var.reset(route_token)
+            request_id_var.reset(rid_token)
+
+
+# ---------------------------
+# ETags
+# ---------------------------
+
+ETAG_MAX_BODY = settings.etag_max_body
+# Encodings CompressionMiddleware appends to a strong ETag ("abc" -> "abc-gzip").
+_ETAG_ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: ignore W/ and our encoding suffixes.
+    target = etag.removeprefix("W/").strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/").strip('"')
+        for suffix in _ETAG_ENCODING_SUFFIXES:
+            candidate = candidate.removesuffix(suffix)
+        if candidate == target:
+            return True
+    return False
+
+
+class ETagMiddleware:
+    """
+    Adds a strong ETag (hash of the body) to successful GET and HEAD
+    responses and answers a matching If-None-Match with 304. Other methods
+    pass through untouched: a 304 to a POST isn't a valid answer.
+    """
+
+    def __init__(self, app, max_body: int = ETAG_MAX_BODY):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope.get("method") not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        if_none_match = None
+        for name, value in scope.get("headers", ()):
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+                break
+
+        start = None
+        chunks = []
+        size = 0
+        passthrough = False
+
+        async def send_with_etag(message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if message["status"] != 200 or "content-encoding" in headers:
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if message.get("more_body", False):
+                if size > self.max_body:
+                    # Too large to hash in memory; send it untagged.
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(scope=start)
+            etag = headers.get("etag")
+            if etag is None:
+                etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+                headers["etag"] = etag
+
+            if if_none_match and _etag_matches(if_none_match, etag):
+                kept = [(k, v) for k, v in start["headers"] if k.lower() not in (b"content-length", b"content-type")]
+                await send({"type": "http.response.start", "status": 304, "headers": kept})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
+
+
+# ---------------------------
+# Compression
+# ---------------------------
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = settings.compress_min_bytes
+GZIP_LEVEL = settings.gzip_level
+BROTLI_QUALITY = settings.brotli_quality
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _negotiate(accept_encoding: str):
+    """Picks br or gzip from Accept-Encoding, honouring q=0."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    wildcard = offered.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in (("br",) if brotli else ()) + ("gzip",):
+        q = offered.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _suffix_etag(headers, encoding: str):
+    # A strong ETag names one exact byte sequence, so each encoding gets its own.
+    etag = headers.get("etag")
+    if etag and etag.endswith('"') and not etag.startswith("W/"):
+        headers["etag"] = f'{etag[:-1]}-{encoding}"'
+
+
+class CompressionMiddleware:
+    """
+    gzip (or brotli when installed) for text/JSON responses of at least
+    COMPRESS_MIN_BYTES, negotiated from Accept-Encoding.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = None
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                encoding = _negotiate(value.decode("latin-1"))
+                break
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        chunks = []
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                content_type = headers.get("content-type", "")
+                if message["status"] == 304:
+                    # Revalidated: echo the tag of the encoded variant the client holds.
+                    _suffix_etag(headers, encoding)
+                    passthrough = True
+                    return await send(message)
+                if "content-encoding" in headers or not content_type.startswith(_COMPRESSIBLE):
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(scope=start)
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) < self.minimum_size:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            body = _compress(encoding, body)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(body))
+            _suffix_etag(headers, encoding)
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
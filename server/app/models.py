@@ -1,13 +1,44 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table, DateTime, Index, Boolean, Float, UniqueConstraint, LargeBinary
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime, timezone
+from app.codec import decode_progression, encode_progression
 from app.database import Base
 
 # Helper for timezone-aware UTC timestamps
 def utcnow():
     return datetime.now(timezone.utc)
 
+# Chord progression text ("C G Am F") stored interned, see app/codec.py
+class ProgressionType(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_progression(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_progression(value)
+
+# Melody notes as app.api.melodyArray.MelodyArray; also accepts note-name text.
+# Imported lazily so loading the models doesn't pull in numpy.
+class MelodyType(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        from app.api.melodyArray import MelodyArray
+        return MelodyArray.coerce(value).to_bytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        from app.api.melodyArray import MelodyArray
+        return MelodyArray.coerce(value)
+
 # ---------------------------
 # Association table: User <-> Instruments
 # ---------------------------
@@ -16,7 +47,8 @@ user_instruments_table = Table(
     Base.metadata,
     Column("id", Integer, primary_key=True, index=True),
     Column("user_id", Integer, ForeignKey("users.id")),
-    Column("instrument_id", Integer, ForeignKey("instruments.id")),
+    Column("instrument_id", Integer, ForeignKey("instruments.id"), index=True),
+    UniqueConstraint("user_id", "instrument_id", name="uq_user_instruments_user_instrument"),
 )
 
 # ---------------------------
@@ -73,6 +105,10 @@ class Lesson(Base):
     instrument = relationship("Instrument", back_populates="lessons")
     practice_sessions = relationship("PracticeSession", back_populates="lesson")
 
+    __table_args__ = (
+        Index("ix_lessons_instrument_id_difficulty", "instrument_id", "difficulty"),
+    )
+
 # ---------------------------
 # Songs
 # ---------------------------
@@ -99,7 +135,7 @@ class ChordProgression(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     song_id = Column(Integer, ForeignKey("songs.id"), nullable=True)
     instrument_id = Column(Integer, ForeignKey("instruments.id"))
-    progression = Column(Text)
+    progression = Column(ProgressionType)
     skill_level = Column(String)
     created_at = Column(DateTime(timezone=True), default=utcnow)
 
@@ -107,6 +143,11 @@ class ChordProgression(Base):
     song = relationship("Song", back_populates="chord_progressions")
     instrument = relationship("Instrument", back_populates="chord_progressions")
 
+    __table_args__ = (
+        Index("ix_chord_progressions_user_id_created_at", "user_id", "created_at"),
+        Index("ix_chord_progressions_song_id_created_at", "song_id", "created_at"),
+    )
+
 # ---------------------------
 # Melodies
 # ---------------------------
@@ -116,12 +157,33 @@ class Melody(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     instrument_id = Column(Integer, ForeignKey("instruments.id"))
-    melody_data = Column(Text)
+    melody_data = Column(MelodyType)
+    # Derived from melody_data on assignment, for range queries in SQL
+    pitch_min = Column(Integer)
+    pitch_max = Column(Integer)
+    pitch_span = Column(Integer, index=True)
+    note_count = Column(Integer)
     created_at = Column(DateTime(timezone=True), default=utcnow)
 
     user = relationship("User", back_populates="melodies")
     instrument = relationship("Instrument", back_populates="melodies")
 
+    __table_args__ = (
+        Index("ix_melodies_user_id_created_at", "user_id", "created_at"),
+    )
+
+    @validates("melody_data")
+    def _set_pitch_columns(self, key, value):
+        if value is None:
+            self.pitch_min = self.pitch_max = self.pitch_span = self.note_count = None
+            return None
+        from app.api.melodyArray import MelodyArray
+        melody = MelodyArray.coerce(value)
+        self.pitch_min, self.pitch_max = melody.pitch_min, melody.pitch_max
+        self.pitch_span = melody.span if len(melody) else None
+        self.note_count = len(melody)
+        return melody
+
 # ---------------------------
 # Practice Sessions
 # ---------------------------
@@ -130,8 +192,8 @@ class PracticeSession(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=True)
-    song_id = Column(Integer, ForeignKey("songs.id"), nullable=True)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=True, index=True)
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=True, index=True)
     duration_minutes = Column(Integer)
     feedback = Column(Text)
     created_at = Column(DateTime(timezone=True), default=utcnow)
@@ -140,6 +202,10 @@ class PracticeSession(Base):
     lesson = relationship("Lesson", back_populates="practice_sessions")
     song = relationship("Song", back_populates="practice_sessions")
 
+    __table_args__ = (
+        Index("ix_practice_sessions_user_id_created_at", "user_id", "created_at"),
+    )
+
 # ---------------------------
 # User Songs
 # ---------------------------
@@ -154,6 +220,11 @@ class UserSong(Base):
     user = relationship("User", back_populates="user_songs")
     song = relationship("Song", back_populates="user_songs")
 
+    __table_args__ = (
+        Index("ix_user_songs_user_id_created_at", "user_id", "created_at"),
+        Index("ix_user_songs_song_id_created_at", "song_id", "created_at"),
+    )
+
 # ---------------------------
 # User Settings
 # ---------------------------
@@ -161,10 +232,62 @@ class UserSettings(Base):
     __tablename__ = "user_settings"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     tuning_reference = Column(String)
     preferred_metronome_tempo = Column(Integer)
     created_at = Column(DateTime(timezone=True), default=utcnow)
     updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
 
     user = relationship("User", back_populates="settings")
+
+# ---------------------------
+# Generation Jobs
+# ---------------------------
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    # sha256 of kind + canonical payload; identical submissions share a job
+    dedup_key = Column(String(64), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    result = Column(Text)
+    error = Column(Text)
+    locked_by = Column(String)
+    run_after = Column(DateTime(timezone=True), default=utcnow)
+    lease_expires_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        Index("ix_generation_jobs_status_run_after", "status", "run_after"),
+    )
+
+# ---------------------------
+# Precomputed Arrangements
+# ---------------------------
+class SongArrangement(Base):
+    __tablename__ = "song_arrangements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=True, index=True)
+    # normalized songQuery, see app.api.arrangementStore.query_key
+    query_key = Column(String, nullable=False)
+    instrument = Column(String, nullable=False)
+    simplified = Column(Boolean, nullable=False)
+    # app.codec arrangement blob; decode only the sections you need
+    arrangement = Column(LargeBinary, nullable=False)
+    demand_score = Column(Float)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    song = relationship("Song")
+
+    __table_args__ = (
+        UniqueConstraint("query_key", "instrument", "simplified", name="uq_song_arrangements_variant"),
+    )
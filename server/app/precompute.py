@@ -0,0 +1,244 @@
+# app/precompute.py
+"""
+Popularity-driven precomputation of song arrangements.
+
+Ranks songs by recent demand (UserSong saves and ChordProgression requests
+within PRECOMPUTE_WINDOW_DAYS), then generates the FullSongArrangement
+variants of the top N songs: every instrument ChordProgressionRequest
+accepts, simplified and full. Variants are ordered by expected hits, and
+a run stops when it has spent its generation or token budget. /ai/chords
+serves stored variants without calling a provider.
+
+    python -m app.precompute --top 25 --budget 40 --dry-run
+
+Set PRECOMPUTE_INTERVAL_MINUTES to also run it on a schedule in-process.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import timedelta
+from typing import get_args
+
+from sqlalchemy import func, select
+
+from app.api.arrangementStore import arrangement_store, query_key
+from app.api.tokenUsage import token_usage
+from app.config import settings
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models import ChordProgression, Instrument, Song, UserSong, utcnow
+from app.schemas import ChordProgressionRequest, FullSongArrangement
+
+logger = get_logger(__name__)
+
+PRECOMPUTE_TOP_N = settings.precompute_top_n
+PRECOMPUTE_WINDOW_DAYS = settings.precompute_window_days
+# Quota budget per run: provider generations, and (if > 0) tokens.
+PRECOMPUTE_BUDGET = settings.precompute_budget
+PRECOMPUTE_TOKEN_BUDGET = settings.precompute_token_budget
+PRECOMPUTE_CONCURRENCY = settings.precompute_concurrency
+PRECOMPUTE_INTERVAL_MINUTES = settings.precompute_interval_minutes
+
+# A progression request is a stronger signal than a saved song.
+USER_SONG_WEIGHT = 1.0
+PROGRESSION_WEIGHT = 2.0
+# Share of requests asking for the simplified arrangement (the default).
+SIMPLIFIED_SHARE = 0.6
+# Consecutive failures that mean the providers are out of quota.
+MAX_CONSECUTIVE_FAILURES = 3
+
+INSTRUMENTS = get_args(ChordProgressionRequest.model_fields["instrument"].annotation)
+
+
+def rank_songs(db, top_n: int, window_days: float):
+    """[(Song, score)] for the top_n songs by weighted recent demand."""
+    cutoff = utcnow() - timedelta(days=window_days)
+    scores = {}
+    saves = db.execute(
+        select(UserSong.song_id, func.count())
+        .where(UserSong.created_at >= cutoff, UserSong.song_id.isnot(None))
+        .group_by(UserSong.song_id)
+    ).all()
+    for song_id, n in saves:
+        scores[song_id] = scores.get(song_id, 0.0) + USER_SONG_WEIGHT * n
+    progressions = db.execute(
+        select(ChordProgression.song_id, func.count())
+        .where(ChordProgression.created_at >= cutoff, ChordProgression.song_id.isnot(None))
+        .group_by(ChordProgression.song_id)
+    ).all()
+    for song_id, n in progressions:
+        scores[song_id] = scores.get(song_id, 0.0) + PROGRESSION_WEIGHT * n
+
+    top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+    songs = {s.id: s for s in db.execute(select(Song).where(Song.id.in_([sid for sid, _ in top]))).scalars()}
+    return [(songs[sid], score) for sid, score in top if sid in songs]
+
+
+def instrument_weights(db, window_days: float) -> dict:
+    """Share of recent progressions per instrument, add-one smoothed."""
+    cutoff = utcnow() - timedelta(days=window_days)
+    counts = {name: 1.0 for name in INSTRUMENTS}
+    rows = db.execute(
+        select(Instrument.name, func.count(ChordProgression.id))
+        .join(ChordProgression, ChordProgression.instrument_id == Instrument.id)
+        .where(ChordProgression.created_at >= cutoff)
+        .group_by(Instrument.name)
+    ).all()
+    by_lower = {name.lower(): name for name in INSTRUMENTS}
+    for name, n in rows:
+        match = by_lower.get((name or "").strip().lower())
+        if match:
+            counts[match] += n
+    total = sum(counts.values())
+    return {name: c / total for name, c in counts.items()}
+
+
+def song_query(song: Song) -> str:
+    return f"{song.title} {song.artist}".strip() if song.artist else song.title
+
+
+def plan(top_n: int = PRECOMPUTE_TOP_N, window_days: float = PRECOMPUTE_WINDOW_DAYS):
+    """Variants of the top songs not already stored fresh, most valuable first."""
+    with SessionLocal() as db:
+        ranked = rank_songs(db, top_n, window_days)
+        weights = instrument_weights(db, window_days)
+
+    variants = []
+    for song, score in ranked:
+        query = song_query(song)
+        for instrument in INSTRUMENTS:
+            for simplified in (True, False):
+                share = SIMPLIFIED_SHARE if simplified else 1 - SIMPLIFIED_SHARE
+                variants.append({
+                    "songId": song.id,
+                    "songQuery": query,
+                    "instrument": instrument,
+                    "simplify": simplified,
+                    "priority": round(score * weights[instrument] * share, 4),
+                    "demandScore": score,
+                })
+
+    fresh = arrangement_store.fresh_variants(
+        (query_key(v["songQuery"]), v["instrument"], v["simplify"]) for v in variants
+    )
+    pending = [v for v in variants if (query_key(v["songQuery"]), v["instrument"], v["simplify"]) not in fresh]
+    pending.sort(key=lambda v: v["priority"], reverse=True)
+    return pending, len(variants) - len(pending)
+
+
+class Precomputer:
+    def __init__(self):
+        self._task = None
+        self.last_report = None
+
+    async def run(self, top_n: int = PRECOMPUTE_TOP_N, budget: int = PRECOMPUTE_BUDGET,
+                  token_budget: int = PRECOMPUTE_TOKEN_BUDGET, concurrency: int = PRECOMPUTE_CONCURRENCY,
+                  dry_run: bool = False) -> dict:
+        # Imported lazily: the router pulls in the provider singletons.
+        from app.routers import ai as ai_routes
+
+        started = time.perf_counter()
+        pending, already_fresh = await asyncio.to_thread(plan, top_n)
+        queue = pending[:budget]
+        report = {
+            "planned": len(queue),
+            "skippedFresh": already_fresh,
+            "overBudget": len(pending) - len(queue),
+            "generated": 0,
+            "failed": 0,
+            "stoppedEarly": None,
+            "tokens": 0,
+        }
+        if dry_run:
+            report["variants"] = queue
+            return report
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        consecutive_failures = 0
+        stop = asyncio.Event()
+
+        async def generate(variant):
+            nonlocal consecutive_failures
+            async with semaphore:
+                if stop.is_set():
+                    return
+                request = ChordProgressionRequest(
+                    songQuery=variant["songQuery"], instrument=variant["instrument"], simplify=variant["simplify"],
+                )
+                try:
+                    # Straight to the providers: the cached route could hand back
+                    # a stale entry, which saving would make look new.
+                    result = FullSongArrangement.model_validate(await ai_routes._generate(
+                        "chords", ai_routes.gemini_music_service.generateSongArrangement,
+                        ai_routes.grok_service.generate_song_arrangement, (request,), {"request": request},
+                    ))
+                except Exception as e:
+                    report["failed"] += 1
+                    consecutive_failures += 1
+                    logger.warning(f"Precompute failed: {e}", extra={"song": variant["songQuery"], "instrument": variant["instrument"]})
+                    if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                        report["stoppedEarly"] = "provider failures"
+                        stop.set()
+                    return
+
+                consecutive_failures = 0
+                await asyncio.to_thread(
+                    arrangement_store.save,
+                    variant["songQuery"], variant["instrument"], variant["simplify"],
+                    result.model_dump(mode="json"), variant["songId"], variant["demandScore"],
+                )
+                report["generated"] += 1
+                if token_budget and spent.tokens >= token_budget:
+                    report["stoppedEarly"] = "token budget"
+                    stop.set()
+
+        # Only this run's provider calls count against its token budget.
+        with token_usage.tally() as spent:
+            await asyncio.gather(*(generate(v) for v in queue))
+        report["tokens"] = spent.tokens
+        report["durationS"] = round(time.perf_counter() - started, 2)
+        self.last_report = report
+        logger.info("Precompute run finished", extra=report)
+        return report
+
+    async def _loop(self, interval_s: float):
+        while True:
+            try:
+                await self.run()
+            except Exception:
+                logger.error("Precompute run crashed", exc_info=True)
+            await asyncio.sleep(interval_s)
+
+    def start(self, interval_minutes: float = PRECOMPUTE_INTERVAL_MINUTES):
+        if self._task is None and interval_minutes > 0:
+            self._task = asyncio.create_task(self._loop(interval_minutes * 60))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Singleton instance
+precomputer = Precomputer()
+
+
+if __name__ == "__main__":
+    from app.logger import setup_logging
+
+    parser = argparse.ArgumentParser(description="Pre-generate arrangements for the most requested songs.")
+    parser.add_argument("--top", type=int, default=PRECOMPUTE_TOP_N)
+    parser.add_argument("--budget", type=int, default=PRECOMPUTE_BUDGET, help="max generations this run")
+    parser.add_argument("--token-budget", type=int, default=PRECOMPUTE_TOKEN_BUDGET)
+    parser.add_argument("--concurrency", type=int, default=PRECOMPUTE_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without generating")
+    args = parser.parse_args()
+
+    setup_logging()
+    arrangement_store.ensure_schema()
+    print(json.dumps(asyncio.run(precomputer.run(
+        top_n=args.top, budget=args.budget, token_budget=args.token_budget,
+        concurrency=args.concurrency, dry_run=args.dry_run,
+    )), indent=2))
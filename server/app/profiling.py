@@ -0,0 +1,357 @@
+# app/profiling.py
+"""
+Opt-in per-request profiler.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked by PROFILE_SAMPLE_RATE. While it runs, a sampler thread records the
+request's stack every PROFILE_INTERVAL_MS: the real loop-thread stack when
+its task is executing, the suspended coroutine chain when it is awaiting,
+and worker-thread stacks for calls made through `to_thread`. Code marks
+phases with `span()`. Finished profiles go to a bounded ring buffer and
+are served as JSON or collapsed stacks from /admin/profiles.
+
+When a request isn't profiled, `span()` is a single ContextVar lookup.
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+
+from app.config import settings
+from app.logger import get_logger, request_id_var
+
+logger = get_logger(__name__)
+
+PROFILE_TOKEN = settings.profile_token
+PROFILE_SAMPLE_RATE = settings.profile_sample_rate
+PROFILE_INTERVAL_MS = settings.profile_interval_ms
+PROFILE_BUFFER_SIZE = settings.profile_buffer_size
+# Deepest stack kept per sample; anything below is cut from the root end.
+MAX_STACK_DEPTH = 128
+
+_current = ContextVar("profile", default=None)
+
+
+def _label(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_qualname}"
+
+
+class Profile:
+    def __init__(self, profile_id: str, method: str, path: str, reason: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.ts = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.spans = []
+        self.stacks = Counter()
+        self.samples = 0
+        self.task = None
+        self.root_code = None
+        self.loop_thread = None
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, **attrs):
+        entry = {
+            "name": name,
+            "startMs": round((start - self.started) * 1000, 3),
+            "durationMs": round((end - start) * 1000, 3),
+        }
+        if attrs:
+            entry["attrs"] = attrs
+        with self._lock:
+            self.spans.append(entry)
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: `root;child;leaf count` per line."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "ts": self.ts,
+            "status": self.status,
+            "durationMs": self.duration_ms,
+            "samples": self.samples,
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["startMs"])
+        return {
+            **self.summary(),
+            "intervalMs": PROFILE_INTERVAL_MS,
+            "spans": spans,
+            "stacks": dict(self.stacks.most_common()),
+        }
+
+
+# ---------------------------
+# Spans
+# ---------------------------
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profile", "name", "attrs", "start")
+
+    def __init__(self, profile, name, attrs):
+        self.profile = profile
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.profile.add_span(self.name, self.start, time.perf_counter(), **self.attrs)
+        return False
+
+
+def span(name: str, **attrs):
+    profile = _current.get()
+    if profile is None:
+        return _NULL_SPAN
+    return _Span(profile, name, attrs)
+
+
+async def to_thread(name: str, func, *args, executor=None):
+    """
+    asyncio.to_thread (or `executor.run` for a dedicated BoundedExecutor)
+    that, under a profile, splits the call into a `<name>.queue` span
+    (waiting for a pool thread) and a `<name>.run` span, and lets the
+    sampler see the worker thread's stack.
+    """
+    dispatch = executor.run if executor is not None else asyncio.to_thread
+    profile = _current.get()
+    if profile is None:
+        return await dispatch(func, *args)
+
+    submitted = time.perf_counter()
+    marks = {}
+
+    def run():
+        marks["start"] = time.perf_counter()
+        tid = threading.get_ident()
+        profile.threads.add(tid)
+        try:
+            return func(*args)
+        finally:
+            profile.threads.discard(tid)
+            marks["end"] = time.perf_counter()
+
+    try:
+        return await dispatch(run)
+    finally:
+        now = time.perf_counter()
+        start = marks.get("start", now)
+        profile.add_span(f"{name}.queue", submitted, start)
+        profile.add_span(f"{name}.run", start, marks.get("end", now))
+
+
+# ---------------------------
+# Sampler
+# ---------------------------
+
+class _Sampler:
+    """One daemon thread, running only while at least one profile is active."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000.0
+        self.active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile):
+        with self._lock:
+            self.active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile):
+        with self._lock:
+            self.active.discard(profile)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                profiles = list(self.active)
+                if not profiles:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                try:
+                    self._sample(profile, frames)
+                except Exception:
+                    # Racing a coroutine that is mid-step; drop the sample.
+                    pass
+
+    @staticmethod
+    def _thread_stack(frame, stop_code=None):
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(frame)
+            if frame.f_code is stop_code:
+                break
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _sample(self, profile, frames):
+        coro = profile.task.get_coro() if profile.task else None
+        if coro is None:
+            return
+
+        if getattr(coro, "cr_running", False):
+            # The task is on the loop thread right now: take its real stack,
+            # starting at the profiling middleware.
+            stack = self._thread_stack(frames.get(profile.loop_thread), profile.root_code)
+            labels = [_label(f) for f in stack]
+        else:
+            labels = []
+            rooted = False
+            awaited = coro
+            while awaited is not None and len(labels) < MAX_STACK_DEPTH:
+                frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None)
+                if frame is None:
+                    break
+                if frame.f_code is profile.root_code:
+                    rooted = True
+                if rooted:
+                    labels.append(_label(frame))
+                awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None)
+
+            worker_labels = []
+            for tid in list(profile.threads):
+                worker_labels = [_label(f) for f in self._thread_stack(frames.get(tid))]
+                break
+            labels.extend(worker_labels or ["<await>"])
+
+        if labels:
+            profile.stacks[";".join(labels)] += 1
+            profile.samples += 1
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS)
+
+
+# ---------------------------
+# Ring buffer
+# ---------------------------
+
+class ProfileStore:
+    def __init__(self, size: int):
+        self.size = size
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles.values())]
+
+    def collapsed(self, path: str = None) -> str:
+        """Stacks of every buffered profile (optionally one path) merged."""
+        merged = Counter()
+        with self._lock:
+            profiles = list(self._profiles.values())
+        for profile in profiles:
+            if path is None or profile.path == path:
+                merged.update(profile.stacks)
+        return "\n".join(f"{stack} {count}" for stack, count in merged.most_common())
+
+
+# Singleton instance
+profile_store = ProfileStore(PROFILE_BUFFER_SIZE)
+
+
+# ---------------------------
+# Middleware
+# ---------------------------
+
+class ProfilingMiddleware:
+    """Decides per request whether to profile; costs a header scan otherwise."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope):
+        if PROFILE_TOKEN:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-profile":
+                    if value.decode("latin-1") == PROFILE_TOKEN:
+                        return "header"
+                    break
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        reason = self._reason(scope)
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(
+            request_id_var.get() or f"{time.time_ns():x}",
+            scope.get("method"), scope.get("path"), reason,
+        )
+        profile.task = asyncio.current_task()
+        profile.root_code = ProfilingMiddleware.__call__.__code__
+        profile.loop_thread = threading.get_ident()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode("latin-1"))]
+            await send(message)
+
+        token = _current.set(profile)
+        _sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _sampler.remove(profile)
+            _current.reset(token)
+            profile.duration_ms = round((time.perf_counter() - profile.started) * 1000, 3)
+            profile.task = None
+            profile_store.add(profile)
+            logger.info("request profiled", extra={"profile_id": profile.id, "duration_ms": profile.duration_ms, "samples": profile.samples})
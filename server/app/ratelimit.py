@@ -0,0 +1,411 @@
+# app/ratelimit.py
+"""
+Per-caller rate limits and a fair share of provider capacity for the AI
+routes.
+
+RateLimitMiddleware guards /ai/* and POST /jobs/* (which queue the same
+generations). A caller is its client IP (the first X-Forwarded-For hop
+when RATE_LIMIT_TRUST_FORWARDED is set, for deployments behind a proxy).
+There is no authentication yet, so nothing the client says about who it
+is can be trusted: a claimed user id would let anyone spend someone
+else's budget, or rotate ids for a fresh one. Once requests carry an
+authenticated identity, `caller_key` should return that instead.
+
+Limits are sliding windows over cost units (ROUTE_COSTS; a chord
+arrangement burns more provider tokens than a melody). Each window is
+estimated from two fixed-window counters, the current one plus the
+previous one weighted by how much of it the sliding window still covers:
+constant memory per key and a check that is a few arithmetic operations.
+Rejections are 429 with Retry-After set to the seconds until the request
+would fit.
+
+Fair share: /ai calls in flight are capped at AI_FAIR_SHARE_CAPACITY (the
+provider concurrency we can actually serve). Under that, anyone may use
+the spare capacity; at capacity, a caller already holding
+capacity / active callers is turned away (429, Retry-After: 1) while
+callers under their share still get in, so one heavy client can't queue
+everyone else behind its requests.
+
+Counters are per process by default. RATE_LIMIT_BACKEND=sqlite keeps them
+in the SQLite file RATE_LIMIT_PATH, which every worker on the host opens
+(like app/cache.py), so limits hold across workers; those checks run in a
+thread, off the event loop. Fair share is always per process, as the
+provider executors are.
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+
+import orjson
+
+from app.config import settings
+from app.executors import GEMINI_MAX_WORKERS
+from app.logger import get_logger
+from app.metrics import RATE_LIMIT_IN_FLIGHT, RATE_LIMIT_REJECTED
+
+logger = get_logger(__name__)
+
+RATE_LIMIT_ENABLED = settings.rate_limit_enabled
+RATE_LIMIT_BACKEND = settings.rate_limit_backend.lower()     # memory | sqlite
+RATE_LIMIT_PATH = settings.rate_limit_path
+# Cost units per sliding window; a melody costs 1.
+RATE_LIMIT_PER_MINUTE = settings.rate_limit_per_minute
+RATE_LIMIT_PER_HOUR = settings.rate_limit_per_hour
+RATE_LIMIT_TRUST_FORWARDED = settings.rate_limit_trust_forwarded
+AI_FAIR_SHARE_CAPACITY = settings.ai_fair_share_capacity or GEMINI_MAX_WORKERS
+
+# route -> cost units; 0 (or absent) is not limited. Rhythm patterns are
+# generated locally, so /ai/rhythm is only charged when the body asks for
+# an LLM description (BODY_COSTS); rhythm/practice-set is never charged.
+ROUTE_COSTS = {
+    "chords": 3,
+    "backing-track": 2,
+    "lesson": 2,
+    "melody": 1,
+    "improv": 1,
+    "lyrics": 1,
+    "practice-advice": 1,
+}
+# route -> (body field, cost when the field is truthy)
+BODY_COSTS = {
+    "rhythm": ("describe", 1),
+}
+# Larger bodies aren't parsed for BODY_COSTS; they are charged the cost.
+MAX_INSPECTED_BODY = 64 * 1024
+# (name, window seconds, limit)
+RULES = (
+    ("minute", 60.0, RATE_LIMIT_PER_MINUTE),
+    ("hour", 3600.0, RATE_LIMIT_PER_HOUR),
+)
+# Drop counters idle for two windows once every this many checks.
+PRUNE_EVERY = 1000
+
+
+# ---------------------------
+# Sliding window arithmetic
+# ---------------------------
+# A counter is (window index, previous window's total, current window's total).
+
+def _roll(state, window: float, now: float) -> tuple:
+    index = int(now // window)
+    if state is None or state[0] < index - 1:
+        return index, 0.0, 0.0
+    if state[0] == index - 1:
+        return index, state[2], 0.0
+    return state
+
+
+def _used(prev: float, curr: float, window: float, now: float) -> float:
+    return prev * (1 - (now % window) / window) + curr
+
+
+def _wait(prev: float, curr: float, cost: float, limit: float, window: float, now: float) -> float:
+    """Seconds until `cost` more fits: the previous window's weight decays linearly to 0 at the boundary."""
+    elapsed = now % window
+    room = limit - cost - curr
+    if room >= 0 and prev > 0:
+        return max(window * (1 - room / prev) - elapsed, 0.0)
+    # Not before the boundary, where the current total becomes the previous one.
+    wait = window - elapsed
+    room = limit - cost
+    if curr > room > 0:
+        wait += window * (1 - room / curr)
+    elif room <= 0:
+        wait += window
+    return wait
+
+
+def evaluate(states, limits, cost: float, now: float) -> tuple:
+    """
+    limits: [(name, window, limit)] matching states. Returns (new states or
+    None if rejected, rejecting rule name, retry_after, remaining).
+    """
+    new_states, rejected, retry_after, remaining = [], None, 0.0, math.inf
+    for state, (name, window, limit) in zip(states, limits):
+        index, prev, curr = _roll(state, window, now)
+        used = _used(prev, curr, window, now)
+        if used + cost > limit:
+            wait = _wait(prev, curr, cost, limit, window, now)
+            if rejected is None or wait > retry_after:
+                rejected, retry_after = name, wait
+        remaining = min(remaining, limit - used - cost)
+        new_states.append((index, prev, curr + cost))
+    if rejected is not None:
+        return None, rejected, retry_after, 0.0
+    return new_states, None, 0.0, max(remaining, 0.0)
+
+
+# ---------------------------
+# Counter stores
+# ---------------------------
+
+class MemoryStore:
+    blocking = False
+
+    def __init__(self):
+        self._counters = {}  # key -> (state, expires_at)
+        self._lock = threading.Lock()
+        self._checks = 0
+
+    def apply(self, keys, limits, cost: float, now: float) -> tuple:
+        with self._lock:
+            new_states, rejected, retry_after, remaining = evaluate(
+                [self._counters.get(k, (None,))[0] for k in keys], limits, cost, now
+            )
+            if new_states is not None:
+                for key, state, (_, window, _) in zip(keys, new_states, limits):
+                    self._counters[key] = (state, (state[0] + 2) * window)
+            self._checks += 1
+            if self._checks % PRUNE_EVERY == 0:
+                for key in [k for k, (_, expires_at) in self._counters.items() if expires_at <= now]:
+                    del self._counters[key]
+        return rejected, retry_after, remaining
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class SQLiteStore:
+    """Counters in a WAL-mode SQLite file; each check is one short write transaction."""
+
+    # Waits up to a second on a busy file; async callers run it in a thread.
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+        self._conn()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits "
+                "(key TEXT PRIMARY KEY, idx INTEGER NOT NULL, prev REAL NOT NULL, curr REAL NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def apply(self, keys, limits, cost: float, now: float) -> tuple:
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = dict(
+                    (key, (idx, prev, curr)) for key, idx, prev, curr in conn.execute(
+                        f"SELECT key, idx, prev, curr FROM rate_limits WHERE key IN ({','.join('?' * len(keys))})",
+                        keys,
+                    )
+                )
+                new_states, rejected, retry_after, remaining = evaluate(
+                    [rows.get(k) for k in keys], limits, cost, now
+                )
+                if new_states is not None:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rate_limits (key, idx, prev, curr, expires_at) VALUES (?, ?, ?, ?, ?)",
+                        [(key, *state, (state[0] + 2) * window)
+                         for key, state, (_, window, _) in zip(keys, new_states, limits)],
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._checks += 1
+            if self._checks % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            return rejected, retry_after, remaining
+        except sqlite3.Error as e:
+            # A busy or broken store must not take the AI routes down with it.
+            logger.warning(f"Rate limit store failed, allowing request: {e}")
+            return None, 0.0, 0.0
+
+    def clear(self):
+        self._conn().execute("DELETE FROM rate_limits")
+
+
+def make_store(backend: str = RATE_LIMIT_BACKEND, path: str = RATE_LIMIT_PATH):
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        if not path:
+            logger.warning("RATE_LIMIT_BACKEND=sqlite needs RATE_LIMIT_PATH; using in-memory counters")
+            return MemoryStore()
+        try:
+            return SQLiteStore(path)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite rate limit store unavailable, using in-memory counters: {e}")
+            return MemoryStore()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend!r}")
+
+
+# ---------------------------
+# Fair share
+# ---------------------------
+
+class FairShare:
+    """In-flight calls per caller. Only touched from the event loop, so no lock."""
+
+    def __init__(self, capacity: int = AI_FAIR_SHARE_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.total = 0
+        self._in_flight = {}
+
+    def share(self, caller: str) -> int:
+        active = len(self._in_flight) + (caller not in self._in_flight)
+        return max(1, self.capacity // active)
+
+    def acquire(self, caller: str) -> bool:
+        mine = self._in_flight.get(caller, 0)
+        if self.total >= self.capacity and mine >= self.share(caller):
+            return False
+        self._in_flight[caller] = mine + 1
+        self.total += 1
+        RATE_LIMIT_IN_FLIGHT.set(self.total)
+        return True
+
+    def release(self, caller: str):
+        mine = self._in_flight.get(caller, 0) - 1
+        if mine > 0:
+            self._in_flight[caller] = mine
+        else:
+            self._in_flight.pop(caller, None)
+        self.total -= 1
+        RATE_LIMIT_IN_FLIGHT.set(self.total)
+
+
+# ---------------------------
+# Limiter
+# ---------------------------
+
+class RateLimiter:
+    def __init__(self, store=None, rules=RULES, capacity: int = AI_FAIR_SHARE_CAPACITY, enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store or make_store()
+        self.rules = rules
+        self.fair_share = FairShare(capacity)
+        self.enabled = enabled
+
+    def check(self, caller: str, cost: float, now: float = None) -> tuple:
+        """(rejecting rule or None, retry_after seconds, remaining units of the tightest window)."""
+        keys = [f"{name}:{caller}" for name, _, _ in self.rules]
+        return self.store.apply(keys, self.rules, cost, time.time() if now is None else now)
+
+    async def acheck(self, caller: str, cost: float) -> tuple:
+        """check(), in a thread when the store may block."""
+        if self.store.blocking:
+            return await asyncio.to_thread(self.check, caller, cost)
+        return self.check(caller, cost)
+
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def caller_key(scope) -> str:
+    """The key limits are counted under: the client IP until there is auth."""
+    return "ip:" + client_ip(scope)
+
+
+def _route(scope) -> tuple:
+    """(route name, counts against fair share) for guarded paths, else (None, False)."""
+    path = scope.get("path", "")
+    if path.startswith("/ai/") and scope.get("method") != "OPTIONS":
+        return path[4:].rstrip("/"), True
+    if path.startswith("/jobs/") and scope.get("method") == "POST":
+        return path[6:].split("/", 1)[0], False
+    return None, False
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter=None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter or rate_limiter
+        if scope["type"] != "http" or not limiter.enabled:
+            return await self.app(scope, receive, send)
+        route, shared = _route(scope)
+        cost = ROUTE_COSTS.get(route, 0)
+        if route in BODY_COSTS and scope.get("method") == "POST":
+            cost, receive = await _body_cost(route, receive)
+        if not cost:
+            return await self.app(scope, receive, send)
+
+        caller = caller_key(scope)
+        rejected, retry_after, remaining = await limiter.acheck(caller, cost)
+        if rejected is not None:
+            RATE_LIMIT_REJECTED.inc(route=route, rule=rejected)
+            return await _too_many(send, retry_after, "Rate limit exceeded")
+        if shared and not limiter.fair_share.acquire(caller):
+            RATE_LIMIT_REJECTED.inc(route=route, rule="fair-share")
+            return await _too_many(send, 1, "Too many requests in flight; retry shortly")
+
+        async def send_with_remaining(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-ratelimit-remaining", str(int(remaining)).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_remaining)
+        finally:
+            if shared:
+                limiter.fair_share.release(caller)
+
+
+async def _body_cost(route: str, receive) -> tuple:
+    """(cost, receive that replays the body) for routes whose cost depends on the request body."""
+    field, cost = BODY_COSTS[route]
+    messages, body = [], b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body") or len(body) > MAX_INSPECTED_BODY:
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    if len(body) > MAX_INSPECTED_BODY or messages[-1].get("more_body"):
+        return cost, replay
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return 0, replay
+    return (cost if isinstance(data, dict) and data.get(field) else 0), replay
+
+
+async def _too_many(send, retry_after: float, detail: str):
+    seconds = max(1, math.ceil(retry_after))
+    body = orjson.dumps({"detail": f"{detail}; retry in {seconds}s"})
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(seconds).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Singleton instance
+rate_limiter = RateLimiter()
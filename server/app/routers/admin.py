@@ -0,0 +1,83 @@
+# server/app/routers/admin.py
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.api.arrangementStore import arrangement_store
+from app.api.tokenUsage import token_usage
+from app.config import settings
+from app.profiling import profile_store
+from app.tracing import trace_store
+
+ADMIN_TOKEN = settings.admin_token
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Without a configured token the admin surface doesn't exist.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+# ---------------- PROFILES ---------------- #
+
+@router.get("/profiles")
+async def list_profiles():
+    return profile_store.list()
+
+
+@router.get("/profiles/collapsed", response_class=PlainTextResponse)
+async def merged_flamegraph(path: Optional[str] = None):
+    """Folded stacks of every buffered profile, for flamegraph.pl or speedscope."""
+    return profile_store.collapsed(path)
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.to_dict()
+
+
+@router.get("/profiles/{profile_id}/collapsed", response_class=PlainTextResponse)
+async def get_flamegraph(profile_id: str):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.collapsed()
+
+
+# ---------------- TRACES ---------------- #
+
+@router.get("/traces")
+async def list_traces(min_duration_ms: float = 0.0, path: Optional[str] = None):
+    return trace_store.list(min_duration_ms=min_duration_ms, path=path)
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Spans sorted by start offset, each with its parent id: a waterfall."""
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict()
+
+
+# ---------------- TOKEN USAGE ---------------- #
+
+@router.get("/usage")
+async def get_token_usage(recent: int = 50):
+    """Provider token totals per route and model, plus the most recent calls."""
+    return token_usage.snapshot(recent=recent)
+
+
+# ---------------- ARRANGEMENTS ---------------- #
+
+@router.get("/songs/{song_id}/arrangements")
+def list_song_arrangements(song_id: int):
+    """Stored variants of a song, summaries only: tablature is never inflated."""
+    return arrangement_store.summaries(song_id)
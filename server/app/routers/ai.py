@@ -1,50 +1,240 @@
 # server/app/routers/ai.py
+import asyncio
+import contextvars
+import hashlib
+import time
+from typing import List
+import orjson
 from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from app.api.arrangementStore import arrangement_store
 from app.api.grokService import grok_service
+from app.api.normalize import normalize
+from app.deadlines import AI_DEADLINE_SECONDS, DeadlineExceeded, deadline
 from app.api.geminiService import gemini_music_service
+from app.api.rhythmService import rhythm_generator
+from app.cache import ai_cache
+from app.config import settings
+from app.logger import HOT_PATH_SAMPLE, get_logger
+from app.metrics import (
+    AI_DEADLINE_EXCEEDED, AI_PROVIDER_FALLBACKS, AI_REFRESHES, AI_ROUTE_IN_FLIGHT, AI_ROUTE_LATENCY,
+    AI_STALE_SERVED,
+)
+from app.profiling import span
+from app.tracing import start_span
 from app.schemas import (
     ChordProgressionRequest,
     FullSongArrangement,
+    BackingTrackRequest,
     BackingTrackResult,
     RhythmPatternResult,
+    MelodyRequest,
     MelodySuggestionResult,
+    ImprovRequest,
     ImprovTipsResult,
+    LyricsRequest,
     LyricsResult,
+    PracticeAdviceRequest,
     PracticeAdviceResult,
+    LessonRequest,
     LessonResult,
 )
 
 router = APIRouter(prefix="/ai")
+logger = get_logger(__name__)
+
+# Seconds a generated result is reused for identical input (0 = never).
+# Lyrics and practice advice are meant to differ between asks.
+AI_CACHE_TTLS = {
+    "chords": 7 * 86400,
+    "backing-track": 86400,
+    "lesson": 86400,
+    "melody": 3600,
+    "improv": 3600,
+    "lyrics": 0,
+    "practice-advice": 0,
+}
+# Expired results are kept this much longer. Up to AI_STALE_WHILE_REVALIDATE
+# past their TTL they are served at once while one request per key (across
+# workers, holding the claim for AI_REFRESH_LEASE seconds) regenerates them in
+# the background; up to AI_STALE_IF_ERROR they are served when every provider
+# fails or the deadline runs out, instead of a 503/504.
+AI_STALE_WHILE_REVALIDATE = settings.ai_stale_while_revalidate
+AI_STALE_IF_ERROR = settings.ai_stale_if_error
+AI_STALE_TTL = max(AI_STALE_WHILE_REVALIDATE, AI_STALE_IF_ERROR)
+AI_REFRESH_LEASE = settings.ai_refresh_lease
+
+_refresh_tasks = set()
+
+
+def _jsonable(value):
+    return value.model_dump(mode="json") if isinstance(value, BaseModel) else value
+
+
+def _cache_key(route: str, args) -> str:
+    canonical = orjson.dumps([route, [_jsonable(a) for a in args]], option=orjson.OPT_SORT_KEYS)
+    return f"{route}:{hashlib.sha256(canonical).hexdigest()}"
+
 
+class ProvidersUnavailable(Exception):
+    """Every provider failed for a request."""
 
-async def _try_gemini_first(gemini_func, grok_func, *args):
+
+async def _generate(route, gemini_func, grok_func, args, context):
+    """Gemini, then Grok; the normalized result. Raises DeadlineExceeded or ProvidersUnavailable."""
     if gemini_music_service.available:
         try:
-            print("→ Trying Gemini...")
-            return await gemini_func(*args)
+            logger.debug("Trying Gemini", extra={"route": route, "sample": HOT_PATH_SAMPLE})
+            with span("provider.gemini", route=route), start_span("provider.gemini", route=route):
+                result = await gemini_func(*args)
+            with span("normalize", route=route):
+                return normalize(route, result, "gemini", **context)
+        except DeadlineExceeded:
+            AI_DEADLINE_EXCEEDED.inc(route=route, provider="gemini")
+            raise
         except Exception as ge:
-            print(f"⚠ Gemini failed: {ge}")
+            logger.warning(f"Gemini failed, falling back to Grok: {ge}", extra={"route": route, "provider": "gemini"})
+        AI_PROVIDER_FALLBACKS.inc(route=route)
 
-    print("→ Switching to Grok...")
+    logger.debug("Switching to Grok", extra={"route": route, "sample": HOT_PATH_SAMPLE})
     try:
-        return await grok_func(*args)
+        with span("provider.grok", route=route), start_span("provider.grok", route=route):
+            result = await grok_func(*args)
+        with span("normalize", route=route):
+            return normalize(route, result, "grok", **context)
+    except DeadlineExceeded:
+        AI_DEADLINE_EXCEEDED.inc(route=route, provider="grok")
+        raise
     except Exception as e:
-        print(f"❌ Grok also failed: {e}")
-        raise HTTPException(status_code=503, detail="All AI systems are currently unavailable")
+        raise ProvidersUnavailable(str(e)) from e
+
+
+async def _refresh(route, cache_key, ttl, gemini_func, grok_func, args, context):
+    try:
+        # Its own budget, ending before the lease so a failed refresh can be retried.
+        with deadline(min(AI_DEADLINE_SECONDS, AI_REFRESH_LEASE)):
+            result = await _generate(route, gemini_func, grok_func, args, context)
+    except (DeadlineExceeded, ProvidersUnavailable) as e:
+        # The entry stays stale; the next request after the lease tries again.
+        AI_REFRESHES.inc(route=route, outcome="failed")
+        logger.warning(f"Background refresh failed: {e}", extra={"route": route})
+        return
+    await ai_cache.aset(cache_key, _jsonable(result), ttl, AI_STALE_TTL)
+    AI_REFRESHES.inc(route=route, outcome="ok")
+
+
+def _start_refresh(*args):
+    # Not tied to the request, so a disconnect or the response going out doesn't
+    # cancel it; an empty context, so it doesn't inherit the caller's deadline
+    # (maybe a client's X-Request-Timeout), trace span or profile either.
+    task = asyncio.create_task(_refresh(*args), context=contextvars.Context())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _try_gemini_first(route, gemini_func, grok_func, *args, context=None):
+    started = time.perf_counter()
+    status = "error"
+    AI_ROUTE_IN_FLIGHT.inc(route=route)
+    ttl = AI_CACHE_TTLS.get(route, 0)
+    cache_key = _cache_key(route, args) if ttl else None
+    # Request fields the normalizer may use to fill in derivable output fields.
+    context = context or {}
+    # An expired result to fall back on if every provider fails.
+    stale = None
+    try:
+        # Shared across workers, so one worker's generation serves them all.
+        if cache_key:
+            with span("cache.get", route=route):
+                entry = await ai_cache.aget_entry(cache_key)
+            if entry is not None:
+                cached, stale_for = entry
+                if not stale_for:
+                    status = "cached"
+                    return cached
+                if stale_for <= AI_STALE_WHILE_REVALIDATE:
+                    status = "stale"
+                    AI_STALE_SERVED.inc(route=route, reason="revalidate")
+                    if await ai_cache.aclaim_refresh(cache_key, AI_REFRESH_LEASE):
+                        _start_refresh(route, cache_key, ttl, gemini_func, grok_func, args, context)
+                    return cached
+                if stale_for <= AI_STALE_IF_ERROR:
+                    stale = cached
+
+        try:
+            result = await _generate(route, gemini_func, grok_func, args, context)
+        except ProvidersUnavailable as e:
+            logger.error(
+                f"Grok also failed: {e}",
+                extra={"route": route, "provider": "grok", "duration_ms": round((time.perf_counter() - started) * 1000, 2)},
+            )
+            if stale is not None:
+                status = "stale"
+                AI_STALE_SERVED.inc(route=route, reason="error")
+                return stale
+            status = "unavailable"
+            raise HTTPException(status_code=503, detail="All AI systems are currently unavailable")
+        status = "ok"
+        if cache_key:
+            await ai_cache.aset(cache_key, _jsonable(result), ttl, AI_STALE_TTL)
+        return result
+    except DeadlineExceeded as e:
+        logger.warning(
+            f"AI request ran out of time: {e}",
+            extra={"route": route, "duration_ms": round((time.perf_counter() - started) * 1000, 2)},
+        )
+        if stale is not None:
+            status = "stale"
+            AI_STALE_SERVED.inc(route=route, reason="error")
+            return stale
+        status = "deadline"
+        raise HTTPException(status_code=504, detail="The AI request took too long; please try again")
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        AI_ROUTE_IN_FLIGHT.dec(route=route)
+        AI_ROUTE_LATENCY.observe(time.perf_counter() - started, route=route, status=status)
 
 
 # ---------------- ROUTES ---------------- #
 
 @router.post("/chords", response_model=FullSongArrangement)
 async def generate_song_arrangement(request: ChordProgressionRequest):
+    # Near-duplicate queries ("Oasis - Wonderwall", "wonderwall by oasis")
+    # resolve to the query the song is already known by, so they share
+    # stored arrangements and cache entries. Imported here: it needs numpy.
+    from app.api.songIndex import song_index
+
+    with span("song_index.resolve"):
+        if song_index.loaded:
+            match = song_index.resolve(request.songQuery)
+        else:
+            match = await asyncio.to_thread(song_index.resolve, request.songQuery)
+    if match is not None:
+        request = request.model_copy(update={"songQuery": match.query})
+
+    # Popular songs are precomputed (app/precompute.py); serve those warm.
+    stored = await asyncio.to_thread(
+        arrangement_store.lookup, request.songQuery, request.instrument, request.simplify
+    )
+    if stored is not None:
+        return stored
+
     async def gemini_call(req):
         return await gemini_music_service.generateSongArrangement(req)
 
-    return await _try_gemini_first(
+    result = await _try_gemini_first(
+        "chords",
         gemini_call,
         grok_service.generate_song_arrangement,
-        request
+        request,
+        context={"request": request},
     )
+    if match is None:
+        # Later spellings of this song resolve to this query.
+        await asyncio.to_thread(song_index.add, request.songQuery)
+    return result
 
 
 @router.post("/backing-track", response_model=BackingTrackResult)
@@ -55,25 +245,57 @@ async def generate_backing_track(data: dict):
         return await gemini_music_service.generate_backing_track(p)
 
     return await _try_gemini_first(
+        "backing-track",
         gemini_call,
         grok_service.generate_backing_track,
-        prompt
+        prompt,
+        context={"prompt": prompt},
     )
 
 
 @router.post("/rhythm", response_model=RhythmPatternResult)
 async def generate_rhythm(data: dict):
-    time_sig = data["timeSignature"]
-    level = data["level"]
-
-    async def gemini_call(ts, lvl):
-        return await gemini_music_service.generate_rhythm_pattern(ts, lvl)
+    time_sig = data.get("timeSignature")
+    level = data.get("level")
 
-    return await _try_gemini_first(
-        gemini_call,
-        grok_service.generate_rhythm_pattern,
-        time_sig, level
-    )
+    # Local fast path: patterns are generated deterministically in-process.
+    try:
+        result = rhythm_generator.generate(
+            time_sig, level,
+            syncopation=data.get("syncopation"),
+            variant=data.get("variant"),
+            seed=data.get("seed"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The LLM is only consulted for an optional, richer description.
+    if data.get("describe"):
+        args = (result["name"], result["timeSignature"], level, result["grid"])
+        for service in (gemini_music_service, grok_service):
+            if not service.available:
+                continue
+            try:
+                described = await service.describe_rhythm_pattern(*args)
+                result["description"] = described["description"]
+                break
+            except Exception as e:
+                logger.warning(f"Rhythm description failed: {e}", extra={"route": "rhythm-description"})
+
+    return result
+
+
+@router.post("/rhythm/practice-set", response_model=List[RhythmPatternResult])
+async def generate_rhythm_practice_set(data: dict):
+    try:
+        return rhythm_generator.generate_practice_set(
+            data.get("timeSignature"),
+            data.get("level"),
+            count=data.get("count", 8),
+            seed=data.get("seed"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/melody", response_model=MelodySuggestionResult)
@@ -82,13 +304,14 @@ async def generate_melody(data: dict):
     style = data["style"]
 
     async def gemini_call(k, s):
-        result = await gemini_music_service.generate_melody(k, s)
-        return MelodySuggestionResult(**result)
+        return await gemini_music_service.generate_melody(k, s)
 
     return await _try_gemini_first(
+        "melody",
         gemini_call,
         grok_service.generate_melody,
-        key, style
+        key, style,
+        context={"key": key, "style": style},
     )
 
 
@@ -97,13 +320,14 @@ async def get_improv_tips(data: dict):
     query = data["query"]
 
     async def gemini_call(q):
-        result = await gemini_music_service.generate_improv_tips(q)
-        return ImprovTipsResult(**result)
+        return await gemini_music_service.generate_improv_tips(q)
 
     return await _try_gemini_first(
+        "improv",
         gemini_call,
         grok_service.generate_improv_tips,
-        query
+        query,
+        context={"query": query},
     )
 
 
@@ -114,13 +338,14 @@ async def generate_lyrics(data: dict):
     mood = data["mood"]
 
     async def gemini_call(t, g, m):
-        result = await gemini_music_service.generate_lyrics(t, g, m)
-        return LyricsResult(**result)
+        return await gemini_music_service.generate_lyrics(t, g, m)
 
     return await _try_gemini_first(
+        "lyrics",
         gemini_call,
         grok_service.generate_lyrics,
-        topic, genre, mood
+        topic, genre, mood,
+        context={"topic": topic, "genre": genre, "mood": mood},
     )
 
 
@@ -129,10 +354,10 @@ async def get_practice_advice(data: dict):
     sessions = data["sessions"]
 
     async def gemini_call(s):
-        result = await gemini_music_service.get_practice_advice(s)
-        return PracticeAdviceResult(**result)
+        return await gemini_music_service.get_practice_advice(s)
 
     return await _try_gemini_first(
+        "practice-advice",
         gemini_call,
         grok_service.get_practice_advice,
         sessions
@@ -146,11 +371,35 @@ async def generate_lesson(data: dict):
     focus = data["focus"]
 
     async def gemini_call(sk, inst, f):
-        result = await gemini_music_service.generate_lesson(sk, inst, f)
-        return LessonResult(**result)
+        return await gemini_music_service.generate_lesson(sk, inst, f)
 
     return await _try_gemini_first(
+        "lesson",
         gemini_call,
         grok_service.generate_lesson,
-        skill, instrument, focus
+        skill, instrument, focus,
+        context={"skill": skill, "instrument": instrument, "focus": focus},
     )
+
+
+# ---------------- JOB REGISTRY ---------------- #
+
+def _dict_body(handler):
+    """Adapts a `data: dict` route to take its validated request model."""
+    async def run(body):
+        return await handler(body.model_dump())
+    return run
+
+
+# Generations that can also be submitted to /jobs and run by the app.jobs
+# workers. kind -> (handler taking the request model, request model, response model).
+# Bodies are validated on submit, so a malformed one is a 422, not a job.
+JOB_ROUTES = {
+    "chords": (generate_song_arrangement, ChordProgressionRequest, FullSongArrangement),
+    "backing-track": (_dict_body(generate_backing_track), BackingTrackRequest, BackingTrackResult),
+    "melody": (_dict_body(generate_melody), MelodyRequest, MelodySuggestionResult),
+    "improv": (_dict_body(get_improv_tips), ImprovRequest, ImprovTipsResult),
+    "lyrics": (_dict_body(generate_lyrics), LyricsRequest, LyricsResult),
+    "practice-advice": (_dict_body(get_practice_advice), PracticeAdviceRequest, PracticeAdviceResult),
+    "lesson": (_dict_body(generate_lesson), LessonRequest, LessonResult),
+}
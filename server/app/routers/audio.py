@@ -0,0 +1,24 @@
+# server/app/routers/audio.py
+import asyncio
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from app.schemas import TempoAnalysisResult
+
+router = APIRouter(prefix="/audio")
+
+
+@router.post("/tempo", response_model=TempoAnalysisResult)
+async def analyze_tempo(file: UploadFile = File(...), beats_per_bar: int = Form(4)):
+    if not 1 <= beats_per_bar <= 16:
+        raise HTTPException(status_code=400, detail="beats_per_bar must be between 1 and 16")
+
+    # tempoService pulls in numpy; it is imported by the startup warm-up or
+    # the first upload, not at process start.
+    from app.api.tempoService import tempo_tracker, UnsupportedAudioError
+
+    # The analysis is CPU bound; keep it off the event loop.
+    try:
+        return await asyncio.to_thread(tempo_tracker.analyze, file.file, beats_per_bar)
+    except UnsupportedAudioError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
@@ -0,0 +1,38 @@
+# server/app/routers/jam.py
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from app.jam import CLOSE_FULL, JamError, jam_hub
+
+router = APIRouter(prefix="/jam")
+
+
+@router.websocket("/{session_id}")
+async def jam_session(websocket: WebSocket, session_id: str, name: str = Query("guest", max_length=64)):
+    """The first participant leads; see app/jam.py for the message protocol."""
+    await websocket.accept()
+    try:
+        session, conn = jam_hub.join(session_id, websocket, name)
+    except JamError as e:
+        await websocket.close(code=CLOSE_FULL, reason=str(e))
+        return
+    try:
+        while True:
+            jam_hub.handle(session, conn, await websocket.receive_text())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await jam_hub.leave(session, conn)
+
+
+@router.get("/{session_id}")
+async def get_jam_session(session_id: str):
+    """Current state and participants of a live session."""
+    session = jam_hub.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Jam session not found")
+    return {
+        **session.state(),
+        "backingTrack": session.backing_track,
+        "members": [
+            {"id": c.id, "name": c.name, "joinedAt": c.joined_at} for c in session.connections.values()
+        ],
+    }
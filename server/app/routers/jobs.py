@@ -0,0 +1,33 @@
+# server/app/routers/jobs.py
+from fastapi import APIRouter, HTTPException, Query, Response
+from app.jobs import InvalidJobPayload, job_queue
+from app.routers.ai import JOB_ROUTES
+from app.schemas import JobStatus
+
+router = APIRouter(prefix="/jobs")
+
+# Longest a single GET may hold the connection open.
+MAX_WAIT_SECONDS = 30.0
+
+
+@router.post("/{kind}", response_model=JobStatus, status_code=202)
+async def submit_job(kind: str, data: dict, response: Response):
+    """Queues the same body the matching /ai/{kind} route takes."""
+    if kind not in JOB_ROUTES:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+
+    try:
+        job, deduplicated = await job_queue.submit(kind, data)
+    except InvalidJobPayload as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    response.headers["Location"] = f"/jobs/{job['id']}"
+    return {**job, "deduplicated": deduplicated}
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, wait: float = Query(0.0, ge=0.0, le=MAX_WAIT_SECONDS)):
+    """Pass `wait` (seconds) to long-poll until the job finishes."""
+    job = await (job_queue.wait(job_id, wait) if wait else job_queue.get(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
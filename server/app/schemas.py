@@ -1,6 +1,7 @@
 # server/app/schemas.py
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Literal
+from datetime import datetime
+from typing import Any, List, Optional, Union, Literal
 
 # --- Tablature ---
 class TabLine(BaseModel):
@@ -47,6 +48,9 @@ class FullSongArrangement(BaseModel):
     practiceTips: List[str] = Field(default_factory=list)
 
 # --- Backing Track ---
+class BackingTrackRequest(BaseModel):
+    prompt: str
+
 class BackingTrackStep(BaseModel):
     beat: int
     notes: List[str]
@@ -71,8 +75,22 @@ class RhythmPatternResult(BaseModel):
     timeSignature: str
     description: str
     pattern: List[dict]
+    grid: Optional[str] = None
+
+# --- Tempo / Beat Tracking ---
+class TempoAnalysisResult(BaseModel):
+    bpm: float
+    confidence: float
+    beatsPerBar: int
+    duration: float
+    beats: List[float]
+    downbeats: List[float]
 
 # --- Melody ---
+class MelodyRequest(BaseModel):
+    key: str
+    style: str
+
 class MelodySuggestionResult(BaseModel):
     scale: str
     key: str
@@ -81,6 +99,9 @@ class MelodySuggestionResult(BaseModel):
     suggestion: str
 
 # --- Improv ---
+class ImprovRequest(BaseModel):
+    query: str
+
 class ImprovTipsResult(BaseModel):
     style: str
     recommendedScales: List[str]
@@ -88,20 +109,47 @@ class ImprovTipsResult(BaseModel):
     backingTrackSearch: str
 
 # --- Lyrics ---
+class LyricsRequest(BaseModel):
+    topic: str
+    genre: str
+    mood: str
+
 class LyricsResult(BaseModel):
     title: str
     structure: List[str]
     lyrics: str
 
 # --- Practice Advice ---
+class PracticeAdviceRequest(BaseModel):
+    sessions: List[Any]
+
 class PracticeAdviceResult(BaseModel):
     insight: str
     recommendation: str
     focusArea: str
 
 # --- Lesson ---
+class LessonRequest(BaseModel):
+    skill_level: str
+    instrument: str
+    focus: str
+
 class LessonResult(BaseModel):
     title: str
     lesson: str
     duration: str
     goals: List[str]
+
+# --- Background Jobs ---
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    attempts: int
+    maxAttempts: int
+    createdAt: Optional[datetime] = None
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    deduplicated: bool = False
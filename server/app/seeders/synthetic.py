@@ -0,0 +1,421 @@
+# app/seeders/synthetic.py
+"""
+Synthetic data at production scale, for load tests, query plans and
+migration rehearsals.
+
+    python -m app.seeders.synthetic --scale 1000000 --workers 4 --seed 1 --reset
+
+--scale is the number of practice sessions, the largest table; everything
+else is sized from it (SCALE_RATIOS). Popularity is skewed the way real
+usage is: a few songs get most saves and sessions, and a few users do most
+of the practising (Zipf, --zipf). Rows are generated in fixed-size chunks
+and bulk-inserted with executemany, one transaction per chunk. Each chunk
+draws from its own RNG seeded with (seed, table, chunk) and gets explicit
+ids, so the output is identical for any --workers count and children can
+reference parents without reading them back. Tables are seeded parent
+first, one phase at a time; chunks within a phase run on --workers
+processes.
+"""
+import argparse
+import multiprocessing
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import numpy as np
+from sqlalchemy import create_engine, event, insert, text
+
+from app.config import settings
+from app.database import DATABASE_URL, Base
+from app.models import (
+    ChordProgression, Instrument, Lesson, Melody, PracticeSession, Song,
+    User, UserSettings, UserSong, user_instruments_table,
+)
+
+CHUNK_SIZE = settings.seed_chunk_size
+# Rows per practice session (the --scale unit).
+SCALE_RATIOS = {
+    "users": 1 / 20,
+    "songs": 1 / 40,
+    "lessons": 1 / 2000,
+    "user_songs": 1 / 4,
+    "chord_progressions": 1 / 10,
+    "melodies": 1 / 20,
+}
+MIN_ROWS = {"users": 100, "songs": 100, "lessons": 20}
+HISTORY_DAYS = 730
+
+INSTRUMENTS = [
+    ("Guitar", "String"), ("Piano", "Keyboard"), ("Drums", "Percussion"), ("Bass", "String"),
+    ("Ukulele", "String"), ("Violin", "String"), ("Voice", "Vocal"), ("Saxophone", "Wind"),
+    ("Trumpet", "Brass"), ("Cello", "String"), ("Synth", "Keyboard"), ("Flute", "Wind"),
+]
+# Guitar and piano dominate; flute players are rare.
+INSTRUMENT_WEIGHTS = np.array([30, 25, 10, 8, 7, 4, 6, 3, 2, 2, 2, 1], dtype=float)
+SKILL_LEVELS = ["Beginner", "Intermediate", "Advanced"]
+SKILL_WEIGHTS = np.array([0.55, 0.33, 0.12])
+GENRES = ["Pop", "Rock", "Folk", "Jazz", "Blues", "Country", "R&B", "Hip-Hop", "Metal", "Classical", "Reggae", "Soul"]
+LESSON_TYPES = ["Theory", "Practice", "Technique", "Ear Training", "Repertoire"]
+FIRST_NAMES = [
+    "Alice", "Bob", "Carla", "Dmitri", "Ebele", "Farah", "Gus", "Hana", "Ivan", "Jia", "Kofi", "Lena",
+    "Mateo", "Nia", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Tariq", "Uma", "Viktor", "Wanjiru", "Yuki",
+]
+LAST_NAMES = [
+    "Smith", "Okafor", "Garcia", "Chen", "Kowalski", "Mensah", "Novak", "Silva", "Tanaka", "Haddad",
+    "Ivanova", "Kimani", "Larsen", "Moreau", "Nguyen", "Patel", "Rossi", "Schmidt", "Torres", "Weber",
+]
+TITLE_WORDS = (
+    "love night heart fire river road home dream light rain blue gold summer city wild young "
+    "broken falling dancing midnight ghost ocean stone shadow paper silver golden lonely electric "
+    "tomorrow yesterday forever highway morning window thunder sugar velvet echo"
+).split()
+FEEDBACK = [
+    "Good progress!", "Needs improvement on chords", "Timing drifted in the chorus",
+    "Clean changes at 80 bpm", "Work on the barre chord", "Great dynamics", None, None,
+]
+PROGRESSIONS = [  # scale degrees, major key
+    ("I", "V", "vi", "IV"), ("I", "IV", "V", "I"), ("vi", "IV", "I", "V"), ("I", "vi", "IV", "V"),
+    ("ii", "V", "I"), ("I", "IV", "I", "V"), ("I", "bVII", "IV", "I"), ("i", "bVI", "bIII", "bVII"),
+]
+_DEGREES = {"I": (0, ""), "ii": (2, "m"), "iii": (4, "m"), "IV": (5, ""), "V": (7, ""), "vi": (9, "m"),
+            "i": (0, "m"), "bIII": (3, ""), "bVI": (8, ""), "bVII": (10, "")}
+_KEYS = ["C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+
+
+# ---------------------------
+# Sampling helpers
+# ---------------------------
+
+def row_counts(scale: int) -> dict:
+    counts = {name: max(MIN_ROWS.get(name, 1), int(scale * ratio)) for name, ratio in SCALE_RATIOS.items()}
+    counts["instruments"] = len(INSTRUMENTS)
+    counts["user_settings"] = counts["users"]
+    counts["user_instruments"] = counts["users"] * 2
+    counts["practice_sessions"] = scale
+    return counts
+
+
+@lru_cache(maxsize=None)
+def _zipf_table(n: int, exponent: float, seed: int, name: str):
+    """CDF over popularity ranks and a fixed rank -> id shuffle."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    ids = np.random.default_rng([seed, zlib.crc32(name.encode()), n]).permutation(n) + 1
+    return cdf, ids
+
+
+def zipf_ids(rng, n: int, size: int, exponent: float, seed: int, name: str) -> np.ndarray:
+    """`size` ids in 1..n, id popularity following Zipf(exponent)."""
+    cdf, ids = _zipf_table(n, exponent, seed, name)
+    return ids[np.minimum(np.searchsorted(cdf, rng.random(size)), n - 1)]
+
+
+def timestamps(rng, size: int, now: datetime) -> list:
+    """Spread over HISTORY_DAYS, denser towards now (the user base grows)."""
+    age_seconds = (rng.random(size) ** 2) * HISTORY_DAYS * 86400
+    return [now - timedelta(seconds=s) for s in age_seconds.tolist()]
+
+
+def pick(rng, values, size: int, weights=None) -> list:
+    p = None if weights is None else weights / weights.sum()
+    return [values[i] for i in rng.choice(len(values), size, p=p).tolist()]
+
+
+# ---------------------------
+# Row generators
+# ---------------------------
+# gen(rng, first_id, count, ctx) -> list of row dicts for ids first_id..first_id+count-1
+
+def _instruments(rng, first_id, count, ctx):
+    return [{"id": i + 1, "name": name, "type": kind} for i, (name, kind) in enumerate(INSTRUMENTS)]
+
+
+def _instrument_ids(rng, size):
+    return (rng.choice(len(INSTRUMENTS), size, p=INSTRUMENT_WEIGHTS / INSTRUMENT_WEIGHTS.sum()) + 1).tolist()
+
+
+def _users(rng, first_id, count, ctx):
+    firsts, lasts = pick(rng, FIRST_NAMES, count), pick(rng, LAST_NAMES, count)
+    skills = pick(rng, SKILL_LEVELS, count, SKILL_WEIGHTS)
+    created = timestamps(rng, count, ctx["now"])
+    return [
+        {
+            "id": first_id + i, "name": f"{firsts[i]} {lasts[i]}",
+            "email": f"{firsts[i].lower()}.{lasts[i].lower()}.{first_id + i}@example.com",
+            "password": "synthetic", "skill_level": skills[i], "created_at": created[i], "updated_at": created[i],
+        }
+        for i in range(count)
+    ]
+
+
+@lru_cache(maxsize=None)
+def _artists(seed: int) -> list:
+    """Shared by every songs chunk, so popular artists span the whole table."""
+    rng = np.random.default_rng([seed, zlib.crc32(b"artists")])
+    return [f"{a} {b}".title() for a, b in zip(pick(rng, TITLE_WORDS, 4096), pick(rng, LAST_NAMES, 4096))]
+
+
+def _songs(rng, first_id, count, ctx):
+    artists = _artists(ctx["seed"])
+    artist_idx = np.minimum(rng.zipf(1.3, count) - 1, len(artists) - 1).tolist()
+    lengths = rng.integers(1, 4, count).tolist()
+    words = pick(rng, TITLE_WORDS, count * 3)
+    genres = pick(rng, GENRES, count)
+    created = timestamps(rng, count, ctx["now"])
+    return [
+        {
+            "id": first_id + i, "title": " ".join(words[3 * i:3 * i + lengths[i]]).title(),
+            "artist": artists[artist_idx[i]], "genre": genres[i], "created_at": created[i],
+        }
+        for i in range(count)
+    ]
+
+
+def _lessons(rng, first_id, count, ctx):
+    instruments = _instrument_ids(rng, count)
+    kinds, levels = pick(rng, LESSON_TYPES, count), pick(rng, SKILL_LEVELS, count, SKILL_WEIGHTS)
+    words = pick(rng, TITLE_WORDS, count)
+    created = timestamps(rng, count, ctx["now"])
+    return [
+        {
+            "id": first_id + i, "title": f"{words[i].title()} {kinds[i]} #{first_id + i}", "lesson_type": kinds[i],
+            "instrument_id": instruments[i], "difficulty": levels[i],
+            "content": f"{kinds[i]} lesson for {levels[i].lower()} players.", "created_at": created[i],
+            "updated_at": created[i],
+        }
+        for i in range(count)
+    ]
+
+
+def _user_settings(rng, first_id, count, ctx):
+    references = pick(rng, ["A440", "A440", "A440", "A442", "A432"], count)
+    tempos = rng.integers(60, 160, count).tolist()
+    return [
+        {
+            "id": first_id + i, "user_id": first_id + i, "tuning_reference": references[i],
+            "preferred_metronome_tempo": tempos[i], "created_at": ctx["now"], "updated_at": ctx["now"],
+        }
+        for i in range(count)
+    ]
+
+
+def _user_instruments(rng, first_id, count, ctx):
+    # Two distinct instruments per user: rows 2k and 2k+1 belong to user k+1.
+    first_user = (first_id - 1) // 2 + 1
+    users = count // 2
+    primary = np.array(_instrument_ids(rng, users))
+    offset = rng.integers(1, len(INSTRUMENTS), users)
+    secondary = (primary - 1 + offset) % len(INSTRUMENTS) + 1
+    rows = []
+    for k in range(users):
+        rows.append({"id": first_id + 2 * k, "user_id": first_user + k, "instrument_id": int(primary[k])})
+        rows.append({"id": first_id + 2 * k + 1, "user_id": first_user + k, "instrument_id": int(secondary[k])})
+    return rows
+
+
+def _user_songs(rng, first_id, count, ctx):
+    users = zipf_ids(rng, ctx["counts"]["users"], count, ctx["zipf"], ctx["seed"], "users").tolist()
+    songs = zipf_ids(rng, ctx["counts"]["songs"], count, ctx["zipf"], ctx["seed"], "songs").tolist()
+    created = timestamps(rng, count, ctx["now"])
+    return [
+        {"id": first_id + i, "user_id": users[i], "song_id": songs[i], "created_at": created[i]}
+        for i in range(count)
+    ]
+
+
+def _progression(rng) -> str:
+    degrees = PROGRESSIONS[rng.integers(len(PROGRESSIONS))]
+    tonic = int(rng.integers(12))
+    chords = []
+    for degree in degrees:
+        interval, quality = _DEGREES[degree]
+        chords.append(_KEYS[(tonic + interval) % 12] + quality)
+    return " ".join(chords * int(rng.integers(1, 3)))
+
+
+def _chord_progressions(rng, first_id, count, ctx):
+    users = zipf_ids(rng, ctx["counts"]["users"], count, ctx["zipf"], ctx["seed"], "users").tolist()
+    songs = zipf_ids(rng, ctx["counts"]["songs"], count, ctx["zipf"], ctx["seed"], "songs").tolist()
+    has_song = (rng.random(count) < 0.7).tolist()
+    instruments = _instrument_ids(rng, count)
+    skills = pick(rng, SKILL_LEVELS, count, SKILL_WEIGHTS)
+    created = timestamps(rng, count, ctx["now"])
+    return [
+        {
+            "id": first_id + i, "user_id": users[i], "song_id": songs[i] if has_song[i] else None,
+            "instrument_id": instruments[i], "progression": _progression(rng), "skill_level": skills[i],
+            "created_at": created[i],
+        }
+        for i in range(count)
+    ]
+
+
+def _melodies(rng, first_id, count, ctx):
+    from app.api.melodyArray import PPQ, MelodyArray
+
+    users = zipf_ids(rng, ctx["counts"]["users"], count, ctx["zipf"], ctx["seed"], "users").tolist()
+    instruments = _instrument_ids(rng, count)
+    lengths = rng.integers(8, 48, count)
+    # Mostly stepwise random walks around middle C, an occasional leap.
+    steps = rng.choice([-5, -3, -2, -1, 0, 1, 2, 3, 4, 7, 12], lengths.sum(),
+                       p=[.04, .08, .18, .14, .1, .14, .18, .06, .04, .03, .01])
+    durations = rng.choice([PPQ // 4, PPQ // 2, PPQ, PPQ * 2], lengths.sum(), p=[.15, .45, .3, .1])
+    starts = rng.integers(55, 72, count)
+    created = timestamps(rng, count, ctx["now"])
+    rows, pos = [], 0
+    for i, n in enumerate(lengths.tolist()):
+        pitch = np.clip(starts[i] + np.cumsum(steps[pos:pos + n]), 36, 96)
+        melody = MelodyArray(pitch, duration=durations[pos:pos + n])
+        pos += n
+        rows.append({
+            "id": first_id + i, "user_id": users[i], "instrument_id": instruments[i], "melody_data": melody,
+            "pitch_min": melody.pitch_min, "pitch_max": melody.pitch_max, "pitch_span": melody.span,
+            "note_count": n, "created_at": created[i],
+        })
+    return rows
+
+
+def _practice_sessions(rng, first_id, count, ctx):
+    users = zipf_ids(rng, ctx["counts"]["users"], count, ctx["zipf"], ctx["seed"], "users").tolist()
+    songs = zipf_ids(rng, ctx["counts"]["songs"], count, ctx["zipf"], ctx["seed"], "songs").tolist()
+    lessons = zipf_ids(rng, ctx["counts"]["lessons"], count, ctx["zipf"], ctx["seed"], "lessons").tolist()
+    kind = rng.random(count).tolist()  # < 0.5 song, < 0.8 lesson, else free practice
+    minutes = np.clip(rng.lognormal(3.2, 0.5, count), 5, 180).astype(int).tolist()
+    feedback = pick(rng, FEEDBACK, count)
+    created = timestamps(rng, count, ctx["now"])
+    return [
+        {
+            "id": first_id + i, "user_id": users[i],
+            "song_id": songs[i] if kind[i] < 0.5 else None,
+            "lesson_id": lessons[i] if 0.5 <= kind[i] < 0.8 else None,
+            "duration_minutes": minutes[i], "feedback": feedback[i], "created_at": created[i],
+        }
+        for i in range(count)
+    ]
+
+
+# Seeded in this order; a phase only starts once its parents are complete.
+PHASES = [
+    [("instruments", Instrument.__table__, _instruments)],
+    [("users", User.__table__, _users), ("songs", Song.__table__, _songs)],
+    [("lessons", Lesson.__table__, _lessons), ("user_settings", UserSettings.__table__, _user_settings),
+     ("user_instruments", user_instruments_table, _user_instruments)],
+    [("user_songs", UserSong.__table__, _user_songs),
+     ("chord_progressions", ChordProgression.__table__, _chord_progressions),
+     ("melodies", Melody.__table__, _melodies),
+     ("practice_sessions", PracticeSession.__table__, _practice_sessions)],
+]
+_TABLES = {name: (table, gen) for phase in PHASES for name, table, gen in phase}
+
+
+# ---------------------------
+# Insertion
+# ---------------------------
+
+_engine = None
+
+
+def _make_engine(url: str):
+    """SQLite gets bulk-load pragmas and a long lock wait for parallel writers."""
+    sqlite = url.startswith("sqlite")
+    engine = create_engine(url, future=True, connect_args={"timeout": 120} if sqlite else {})
+    if sqlite:
+        @event.listens_for(engine, "connect")
+        def _pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.close()
+    return engine
+
+
+def _worker_engine(url: str):
+    """One engine per process, created after the fork."""
+    global _engine
+    if _engine is None:
+        _engine = _make_engine(url)
+    return _engine
+
+
+def _seed_chunk(task) -> tuple:
+    url, name, chunk, first_id, count, ctx = task
+    table, gen = _TABLES[name]
+    rng = np.random.default_rng([ctx["seed"], list(_TABLES).index(name), chunk])
+    rows = gen(rng, first_id, count, ctx)
+    with _worker_engine(url).begin() as conn:
+        conn.execute(insert(table), rows)
+    return name, len(rows)
+
+
+def _chunks(name: str, total: int, chunk_size: int):
+    if name == "user_instruments":
+        chunk_size -= chunk_size % 2  # keep each user's pair in one chunk
+    for chunk, start in enumerate(range(0, total, chunk_size)):
+        yield chunk, start + 1, min(chunk_size, total - start)
+
+
+def _reset_sequences(engine, names):
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for name in names:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), COALESCE((SELECT MAX(id) FROM {name}), 1))"
+            ))
+
+
+def seed(scale: int, seed: int = 1, workers: int = 1, zipf: float = 1.1, chunk_size: int = CHUNK_SIZE,
+         reset: bool = False, url: str = DATABASE_URL) -> dict:
+    engine = _make_engine(url)
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    counts = row_counts(scale)
+    ctx = {"seed": seed, "zipf": zipf, "counts": counts, "now": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+    report = {}
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        for phase in PHASES:
+            started = time.perf_counter()
+            tasks = [
+                (url, name, chunk, first_id, count, ctx)
+                for name, _, _ in phase
+                for chunk, first_id, count in _chunks(name, counts[name], chunk_size)
+            ]
+            done = pool.imap_unordered(_seed_chunk, tasks) if pool else map(_seed_chunk, tasks)
+            for name, rows in done:
+                report[name] = report.get(name, 0) + rows
+            elapsed = time.perf_counter() - started
+            phase_rows = sum(report[name] for name, _, _ in phase)
+            print(f"✅ {', '.join(name for name, _, _ in phase)}: {phase_rows} rows in {elapsed:.1f}s "
+                  f"({phase_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    _reset_sequences(engine, report)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=10000, help="practice sessions; other tables scale from it")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew exponent")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    totals = seed(args.scale, args.seed, args.workers, args.zipf, args.chunk_size, args.reset, args.database_url)
+    print(f"🎉 Seeded {sum(totals.values())} rows in {time.perf_counter() - started:.1f}s")
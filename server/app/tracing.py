@@ -0,0 +1,279 @@
+# app/tracing.py
+"""
+In-process request tracing.
+
+Every HTTP request opens a root span (continuing an incoming W3C
+`traceparent` when there is one) and code opens child spans with
+`start_span()`. Parent/child links follow the ContextVar, so they survive
+awaits and `asyncio.to_thread`. Finished traces are kept in a bounded
+in-memory buffer and exported as JSON from /admin/traces.
+"""
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+TRACE_SAMPLE_RATE = settings.trace_sample_rate
+TRACE_BUFFER_SIZE = settings.trace_buffer_size
+# Guard against runaway loops filling one trace.
+MAX_SPANS_PER_TRACE = 512
+
+_current_span = ContextVar("trace_span", default=None)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "status", "start", "end", "_token")
+
+    def __init__(self, trace, name, parent_id, attrs):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.status = "ok"
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def set_status(self, status: str):
+        self.status = status
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None and self.status == "ok":
+            self.status = "error"
+            self.attrs.setdefault("error", f"{exc_type.__name__}: {exc}"[:200])
+        _current_span.reset(self._token)
+        self.trace.finish(self)
+        return False
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        origin = self.trace.started
+        return {
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "startMs": round((self.start - origin) * 1000, 3),
+            "durationMs": round(((self.end or time.perf_counter()) - self.start) * 1000, 3),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+class Trace:
+    def __init__(self, trace_id: str, remote_parent: str = None):
+        self.trace_id = trace_id
+        self.remote_parent = remote_parent
+        self.ts = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.root = None
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def finish(self, span):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        if span is self.root:
+            trace_store.add(self)
+
+    def summary(self) -> dict:
+        root = self.root
+        return {
+            "traceId": self.trace_id,
+            "ts": self.ts,
+            "name": root.name if root else None,
+            "status": root.attrs.get("http.status") if root else None,
+            "durationMs": root.to_dict()["durationMs"] if root else None,
+            "spans": len(self.spans),
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted((s.to_dict() for s in self.spans), key=lambda s: s["startMs"])
+        return {**self.summary(), "remoteParent": self.remote_parent, "droppedSpans": self.dropped, "spans": spans}
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def set_status(self, status):
+        pass
+
+    def traceparent(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def start_span(name: str, **attrs):
+    """Child of the current span; a no-op outside a traced request."""
+    parent = _current_span.get()
+    if parent is None:
+        return _NULL_SPAN
+    return Span(parent.trace, name, parent.span_id, attrs)
+
+
+def current_span():
+    return _current_span.get() or _NULL_SPAN
+
+
+def start_trace(name: str, traceparent: str = None, **attrs):
+    """Root span of a new trace, continuing `traceparent` if it parses."""
+    trace_id, parent_id, sampled = None, None, None
+    match = _TRACEPARENT.match(traceparent or "")
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        sampled = int(flags, 16) & 1
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    if not sampled:
+        return _NULL_SPAN
+
+    trace = Trace(trace_id or _new_id(128), parent_id)
+    trace.root = Span(trace, name, parent_id, attrs)
+    return trace.root
+
+
+# ---------------------------
+# Buffer
+# ---------------------------
+
+class TraceStore:
+    def __init__(self, size: int):
+        self.size = size
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            self._traces.move_to_end(trace.trace_id)
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str):
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def list(self, min_duration_ms: float = 0.0, path: str = None):
+        with self._lock:
+            traces = list(reversed(self._traces.values()))
+        summaries = [t.summary() for t in traces]
+        return [
+            s for s, t in zip(summaries, traces)
+            if (s["durationMs"] or 0) >= min_duration_ms
+            and (path is None or t.root.attrs.get("http.path") == path)
+        ]
+
+
+# Singleton instance
+trace_store = TraceStore(TRACE_BUFFER_SIZE)
+
+
+# ---------------------------
+# Middleware
+# ---------------------------
+
+class TracingMiddleware:
+    """Opens the root span and answers with a `traceparent` header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                incoming = value.decode("latin-1").strip().lower()
+                break
+
+        method, path = scope.get("method"), scope.get("path")
+        root = start_trace(f"{method} {path}", incoming, **{"http.method": method, "http.path": path})
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                root.set(**{"http.status": message["status"]})
+                if message["status"] >= 500:
+                    root.set_status("error")
+                header = root.traceparent()
+                if header:
+                    message["headers"] = list(message.get("headers", [])) + [(b"traceparent", header.encode("latin-1"))]
+            await send(message)
+
+        with root:
+            try:
+                await self.app(scope, receive, send_with_trace)
+            except Exception:
+                # Unhandled errors never reach send(); ServerErrorMiddleware answers 500.
+                root.set(**{"http.status": 500})
+                raise
+
+
+# ---------------------------
+# SQLAlchemy
+# ---------------------------
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = start_span("db.query", statement=statement[:200], executemany=executemany)
+    if span is not _NULL_SPAN:
+        span.__enter__()
+        conn.info.setdefault("trace_spans", []).append(span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        span = spans.pop()
+        span.set(rows=cursor.rowcount)
+        span.__exit__(None, None, None)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    spans = exception_context.connection.info.get("trace_spans") if exception_context.connection else None
+    if spans:
+        span = spans.pop()
+        span.set_status("error")
+        span.set(error=type(exception_context.original_exception).__name__)
+        span.__exit__(None, None, None)
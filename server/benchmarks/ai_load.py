@@ -0,0 +1,217 @@
+# benchmarks/ai_load.py
+"""
+Load benchmark for the /ai routes against in-process fake providers.
+
+    python -m benchmarks.ai_load --requests 400 --concurrency 32 --output bench.json
+
+Every scenario boots the real FastAPI app over an ASGI transport, swaps the
+Gemini SDK and Grok HTTP endpoint for fakes with the scenario's latency,
+error and 429 profile, and reports throughput, latency percentiles, status
+codes and upstream call counts as JSON.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+# Keep provider chatter out of the measurements.
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+# One client firing hundreds of requests; see benchmarks/rate_limit.py for the limiter.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from app.main import app
+from app.api.geminiService import gemini_music_service
+from app.api.grokService import grok_service
+from app.routers import ai as ai_routes
+from benchmarks.fakes import FakeGemini, FakeGrok, FaultProfile
+
+# route -> (path, request body, weight in the default mix)
+REQUEST_MIX = {
+    "chords": ("/ai/chords", {"songQuery": "Wonderwall Oasis", "instrument": "Guitar"}, 40),
+    "melody": ("/ai/melody", {"key": "C", "style": "pop"}, 15),
+    "lyrics": ("/ai/lyrics", {"topic": "night drive", "genre": "synthpop", "mood": "wistful"}, 10),
+    "improv": ("/ai/improv", {"query": "12-bar blues in A"}, 10),
+    "backing-track": ("/ai/backing-track", {"prompt": "pop rock in C"}, 10),
+    "lesson": ("/ai/lesson", {"skill_level": "beginner", "instrument": "Guitar", "focus": "barre chords"}, 10),
+    "practice-advice": ("/ai/practice-advice", {"sessions": [{"duration_minutes": 20, "feedback": "ok"}]}, 5),
+}
+
+# None means the provider is unavailable for the scenario.
+SCENARIOS = {
+    "healthy": {"gemini": FaultProfile(latency_ms=80), "grok": FaultProfile(latency_ms=120)},
+    "gemini-quota": {"gemini": FaultProfile(latency_ms=80, rate_limit_rate=0.5), "grok": FaultProfile(latency_ms=120)},
+    "gemini-down": {"gemini": FaultProfile(latency_ms=40, error_rate=1.0), "grok": FaultProfile(latency_ms=120)},
+    "grok-only-flaky": {"gemini": None, "grok": FaultProfile(latency_ms=120, rate_limit_rate=0.2)},
+    "all-down": {"gemini": FaultProfile(latency_ms=40, error_rate=1.0), "grok": FaultProfile(latency_ms=40, error_rate=1.0)},
+}
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank definition.
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _latency_summary(samples) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50": round(percentile(ordered, 50), 2),
+        "p95": round(percentile(ordered, 95), 2),
+        "p99": round(percentile(ordered, 99), 2),
+        "mean": round(sum(ordered) / len(ordered), 2) if ordered else 0.0,
+        "max": round(ordered[-1], 2) if ordered else 0.0,
+    }
+
+
+def _apply_overrides(profile: FaultProfile, args) -> FaultProfile:
+    if profile is None:
+        return None
+    return FaultProfile(
+        latency_ms=args.latency_ms if args.latency_ms is not None else profile.latency_ms,
+        jitter_ms=profile.jitter_ms,
+        error_rate=args.error_rate if args.error_rate is not None else profile.error_rate,
+        rate_limit_rate=args.rate_limit_rate if args.rate_limit_rate is not None else profile.rate_limit_rate,
+    )
+
+
+async def run_scenario(name: str, spec: dict, args) -> dict:
+    gemini_profile = _apply_overrides(spec["gemini"], args)
+    grok_profile = _apply_overrides(spec["grok"], args)
+
+    fake_gemini = FakeGemini(gemini_profile, seed=args.seed) if gemini_profile else None
+    fake_grok = FakeGrok(grok_profile, seed=args.seed) if grok_profile else None
+    gemini_was_available = gemini_music_service.available
+    grok_was_available = grok_service.available
+
+    if fake_gemini:
+        fake_gemini.install(gemini_music_service)
+    else:
+        gemini_music_service.available = False
+    if fake_grok:
+        fake_grok.install(grok_service)
+    else:
+        grok_service.available = False
+
+    routes = args.routes or list(REQUEST_MIX)
+    weights = [REQUEST_MIX[r][2] for r in routes]
+    rng = random.Random(args.seed)
+    plan = rng.choices(routes, weights=weights, k=args.requests)
+
+    latencies, by_route = [], defaultdict(list)
+    statuses, route_statuses = Counter(), defaultdict(Counter)
+    cursor = iter(range(args.requests))
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def worker():
+            for i in cursor:
+                route = plan[i]
+                path, body, _ = REQUEST_MIX[route]
+                started = time.perf_counter()
+                resp = await client.post(path, json=body)
+                elapsed = (time.perf_counter() - started) * 1000
+                latencies.append(elapsed)
+                by_route[route].append(elapsed)
+                statuses[resp.status_code] += 1
+                route_statuses[route][resp.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+
+    if fake_gemini:
+        fake_gemini.uninstall(gemini_music_service)
+    gemini_music_service.available = gemini_was_available
+    if fake_grok:
+        fake_grok.uninstall(grok_service)
+    grok_service.available = grok_was_available
+
+    return {
+        "scenario": name,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "duration_s": round(duration, 3),
+        "rps": round(args.requests / duration, 2) if duration else 0.0,
+        "latency_ms": _latency_summary(latencies),
+        "status": {str(code): n for code, n in sorted(statuses.items())},
+        "routes": {
+            route: {"latency_ms": _latency_summary(samples), "status": {str(c): n for c, n in sorted(route_statuses[route].items())}}
+            for route, samples in sorted(by_route.items())
+        },
+        "upstream_calls": {
+            "gemini": dict(fake_gemini.calls) if fake_gemini else {},
+            "grok": dict(fake_grok.calls) if fake_grok else {},
+            "total": (sum(fake_gemini.calls.values()) if fake_gemini else 0) + (sum(fake_grok.calls.values()) if fake_grok else 0),
+        },
+    }
+
+
+def _print_table(results):
+    header = f"{'scenario':<18}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'upstream':>10}  status"
+    print(header, file=sys.stderr)
+    for r in results:
+        lat = r["latency_ms"]
+        print(
+            f"{r['scenario']:<18}{r['rps']:>9}{lat['p50']:>10}{lat['p95']:>10}{lat['p99']:>10}"
+            f"{r['upstream_calls']['total']:>10}  {r['status']}",
+            file=sys.stderr,
+        )
+
+
+async def main(args):
+    names = args.scenario or list(SCENARIOS)
+    if not args.cache:
+        # Measure the provider path, not repeat hits on the fixed request bodies.
+        ai_routes.AI_CACHE_TTLS.clear()
+    results = []
+    for name in names:
+        results.append(await run_scenario(name, SCENARIOS[name], args))
+
+    report = {
+        "benchmark": "ai_load",
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "routes": args.routes or list(REQUEST_MIX),
+            "cache": args.cache,
+        },
+        "scenarios": results,
+    }
+    _print_table(results)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default runs all")
+    parser.add_argument("--routes", nargs="+", choices=sorted(REQUEST_MIX), help="restrict the request mix")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, help="override provider latency for every scenario")
+    parser.add_argument("--error-rate", type=float, help="override provider error rate")
+    parser.add_argument("--rate-limit-rate", type=float, help="override provider 429 rate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="keep the AI result cache enabled")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
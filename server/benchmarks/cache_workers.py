@@ -0,0 +1,138 @@
+# benchmarks/cache_workers.py
+"""
+Hit rate and latency of the AI result cache across worker processes.
+
+    python -m benchmarks.cache_workers --workers 1 4 16 --requests 4000 --output cache.json
+
+Each run forks N processes that share a Zipf-distributed request stream
+(popular songs are asked for far more often). A miss costs --miss-cost-ms
+of simulated generation and then populates the cache. The in-memory
+backend gives every worker a private cache; the SQLite backend shares one
+file, which is what a multi-worker uvicorn deployment gets.
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Keep the app's own ai_cache singleton in memory.
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from app.cache import MemoryCache, SQLiteCache
+
+# Roughly the size of a FullSongArrangement with tablature.
+PAYLOAD = {
+    "songTitle": "Benchmark Song",
+    "artist": "Fake Artist",
+    "key": "G Major",
+    "progressionSummary": ["G", "D/F#", "Em7", "Cadd9"] * 4,
+    "tablature": [
+        {"section": f"Verse {i}", "lines": [{"lyrics": "G    D/F#   Em7   Cadd9 " * 3, "isChordLine": True}] * 6}
+        for i in range(6)
+    ],
+    "practiceTips": ["Keep the strumming hand moving."] * 5,
+}
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def zipf_keys(n_keys: int, exponent: float, count: int, rng: random.Random):
+    cumulative = list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n_keys + 1)))
+    return [f"song-{i}" for i in rng.choices(range(n_keys), cum_weights=cumulative, k=count)]
+
+
+def run_worker(params):
+    backend, path, worker, requests, args = params
+    cache = SQLiteCache("bench", path=path) if backend == "sqlite" else MemoryCache("bench")
+    keys = zipf_keys(args["keys"], args["zipf"], requests, random.Random(args["seed"] * 1000 + worker))
+
+    gets, sets, misses = [], [], 0
+    started = time.perf_counter()
+    for key in keys:
+        t0 = time.perf_counter()
+        value = cache.get(key)
+        gets.append(time.perf_counter() - t0)
+        if value is None:
+            misses += 1
+            time.sleep(args["miss_cost_ms"] / 1000.0)
+            t0 = time.perf_counter()
+            cache.set(key, PAYLOAD, args["ttl"])
+            sets.append(time.perf_counter() - t0)
+    return {"requests": requests, "misses": misses, "gets": gets, "sets": sets, "elapsed": time.perf_counter() - started}
+
+
+def run(backend: str, workers: int, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="cachebench-"), "cache.sqlite3")
+    share = [args.requests // workers + (1 if i < args.requests % workers else 0) for i in range(workers)]
+    params = [(backend, path, i, n, vars(args)) for i, n in enumerate(share)]
+
+    started = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        results = pool.map(run_worker, params)
+    wall = time.perf_counter() - started
+
+    gets = sorted(itertools.chain.from_iterable(r["gets"] for r in results))
+    sets = sorted(itertools.chain.from_iterable(r["sets"] for r in results))
+    misses = sum(r["misses"] for r in results)
+    us = lambda v: round(v * 1e6, 1)
+    return {
+        "backend": backend,
+        "workers": workers,
+        "requests": args.requests,
+        "hit_rate": round(1 - misses / args.requests, 4),
+        "upstream_calls": misses,
+        "wall_s": round(wall, 3),
+        "rps": round(args.requests / wall, 1),
+        "get_us": {"p50": us(percentile(gets, 50)), "p99": us(percentile(gets, 99))},
+        "set_us": {"p50": us(percentile(sets, 50)), "p99": us(percentile(sets, 99))},
+    }
+
+
+def main(args):
+    results = [run(backend, workers, args) for backend in args.backends for workers in args.workers]
+
+    print(f"{'backend':<8}{'workers':>8}{'hit rate':>10}{'upstream':>10}{'rps':>9}{'get p50/p99 us':>18}{'set p50/p99 us':>18}", file=sys.stderr)
+    for r in results:
+        print(
+            f"{r['backend']:<8}{r['workers']:>8}{r['hit_rate']:>10}{r['upstream_calls']:>10}{r['rps']:>9}"
+            f"{str(r['get_us']['p50']) + '/' + str(r['get_us']['p99']):>18}"
+            f"{str(r['set_us']['p50']) + '/' + str(r['set_us']['p99']):>18}",
+            file=sys.stderr,
+        )
+
+    report = json.dumps({"benchmark": "cache_workers", "config": vars(args), "runs": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--backends", nargs="+", choices=["memory", "sqlite"], default=["memory", "sqlite"])
+    parser.add_argument("--requests", type=int, default=4000, help="total across all workers")
+    parser.add_argument("--keys", type=int, default=500, help="distinct songs")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew exponent")
+    parser.add_argument("--miss-cost-ms", type=float, default=20.0, help="simulated generation time per miss")
+    parser.add_argument("--ttl", type=float, default=3600.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,129 @@
+# benchmarks/codec.py
+"""
+Storage size and read time of the arrangement/progression codec versus JSON text.
+
+    python -m benchmarks.codec --arrangements 500 --output codec.json
+
+Arrangements are synthetic FullSongArrangement payloads with a realistic
+amount of tablature. "full" decodes everything; "summary" inflates only
+the summary section, which is what /songs/{id}/arrangements reads.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from app.codec import CHORDS, SUMMARY, decode_arrangement, decode_progression, encode_arrangement, encode_progression
+
+SECTIONS = ("Intro", "Verse 1", "Pre-Chorus", "Chorus", "Verse 2", "Chorus", "Bridge", "Chorus", "Outro")
+WORDS = "today is gonna be the day that they throw it back to you by now you should have somehow realized".split()
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def make_arrangement(rng: random.Random) -> dict:
+    chords = rng.sample(CHORDS, 6) + ["D/F#"]
+    tablature = []
+    for section in SECTIONS:
+        lines = []
+        for _ in range(rng.randint(4, 8)):
+            lines.append({"lyrics": "".join(f"{c:<8}" for c in rng.choices(chords, k=4)).rstrip(), "isChordLine": True})
+            lines.append({"lyrics": " ".join(rng.choices(WORDS, k=rng.randint(5, 9))).capitalize(), "isChordLine": False})
+        tablature.append({"section": section, "lines": lines})
+    return {
+        "songTitle": " ".join(rng.choices(WORDS, k=2)).title(),
+        "artist": rng.choice(WORDS).title(),
+        "key": f"{rng.choice(chords[:6])} Major",
+        "instrument": "Guitar",
+        "tuning": "E A D G B E",
+        "capoFret": rng.randint(0, 4),
+        "progressionSummary": chords[:4],
+        "tablature": tablature,
+        "chordDiagrams": [
+            {"chord": c, "frets": [rng.choice(["X", 0, 1, 2, 3]) for _ in range(6)],
+             "fingers": [rng.choice([None, 1, 2, 3, 4]) for _ in range(6)], "capoFret": 0}
+            for c in chords
+        ],
+        "substitutions": [{"originalChord": chords[0], "substitutedChord": chords[1], "theory": "Shared chord tones."}],
+        "practiceTips": ["Keep the strumming hand moving.", "Switch chords on the last beat."],
+    }
+
+
+def timed(func, values):
+    latencies = []
+    for value in values:
+        started = time.perf_counter()
+        func(value)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return {"p50": round(percentile(latencies, 50), 1), "p99": round(percentile(latencies, 99), 1)}
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    arrangements = [make_arrangement(rng) for _ in range(args.arrangements)]
+    pretty = [json.dumps(a, indent=2).encode() for a in arrangements]
+    compact = [json.dumps(a, separators=(",", ":")).encode() for a in arrangements]
+    encoded = [encode_arrangement(a) for a in arrangements]
+    assert all(decode_arrangement(b) == a for a, b in zip(arrangements, encoded))
+
+    progressions = [" ".join(rng.choices(CHORDS, k=rng.randint(3, 8))) for _ in range(args.arrangements)]
+    progression_blobs = [encode_progression(p) for p in progressions]
+    assert all(decode_progression(b) == p for p, b in zip(progressions, progression_blobs))
+
+    report = {
+        "benchmark": "codec",
+        "config": vars(args),
+        "arrangement_bytes": {
+            "json_pretty": sum(map(len, pretty)) // len(pretty),
+            "json_compact": sum(map(len, compact)) // len(compact),
+            "codec": sum(map(len, encoded)) // len(encoded),
+        },
+        "progression_bytes": {
+            "text": sum(len(p.encode()) for p in progressions) // len(progressions),
+            "codec": sum(map(len, progression_blobs)) // len(progression_blobs),
+        },
+        "read_us": {
+            "json_full": timed(json.loads, compact),
+            "codec_full": timed(decode_arrangement, encoded),
+            "codec_summary": timed(lambda b: decode_arrangement(b, sections=(SUMMARY,)), encoded),
+        },
+    }
+
+    sizes = report["arrangement_bytes"]
+    print(
+        f"arrangement bytes  pretty {sizes['json_pretty']}  compact {sizes['json_compact']}  codec {sizes['codec']}"
+        f"  ({sizes['json_pretty'] / sizes['codec']:.1f}x / {sizes['json_compact'] / sizes['codec']:.1f}x smaller)",
+        file=sys.stderr,
+    )
+    for name, r in report["read_us"].items():
+        print(f"{name:<15} p50 {r['p50']}us  p99 {r['p99']}us", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arrangements", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,136 @@
+# benchmarks/cold_start.py
+"""
+Cold start of the API process.
+
+    python -m benchmarks.cold_start --runs 5 --output cold.json
+
+Measures, in fresh interpreters:
+  * import time of `app.main`
+  * time from spawning uvicorn until `/health` first answers 200
+and lists the slowest imports (cumulative, from `python -X importtime`).
+Provider keys are set to dummy values so the production init path runs;
+nothing here talks to the network.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENV = {
+    **os.environ,
+    "PYTHONPATH": SERVER_DIR,
+    "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "bench-key"),
+    "GROK_API_KEY": os.environ.get("GROK_API_KEY", "bench-key"),
+    "LOG_LEVEL": "CRITICAL",
+    "PYTHONDONTWRITEBYTECODE": "0",
+}
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], env=ENV, cwd=SERVER_DIR,
+        capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_to_healthy(timeout: float = 60.0) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=ENV, cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+                time.sleep(0.005)
+        raise TimeoutError("server never became healthy")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def slowest_imports(top: int):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], env=ENV, cwd=SERVER_DIR,
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative_us), depth, name.strip()))
+    # Top-level and first-level packages only; deeper rows double count.
+    rows = [r for r in rows if r[1] <= 1]
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, _, name in rows[:top]]
+
+
+def _summary(samples):
+    return {
+        "median_s": round(statistics.median(samples), 3),
+        "min_s": round(min(samples), 3),
+        "max_s": round(max(samples), 3),
+        "samples": [round(s, 3) for s in samples],
+    }
+
+
+def main(args):
+    imports = [import_time() for _ in range(args.runs)]
+    healthy = [time_to_healthy() for _ in range(args.runs)]
+    report = {
+        "benchmark": "cold_start",
+        "runs": args.runs,
+        "import_app_main": _summary(imports),
+        "time_to_healthy": _summary(healthy),
+        "slowest_imports": slowest_imports(args.top),
+    }
+    print(
+        f"import app.main  median {report['import_app_main']['median_s']}s\n"
+        f"first /health    median {report['time_to_healthy']['median_s']}s",
+        file=sys.stderr,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,176 @@
+# benchmarks/fakes.py
+"""
+In-process stand-ins for the Gemini SDK and the Grok HTTP API.
+
+Both fakes sleep for a configurable latency, inject errors and 429s at a
+configurable rate and count every upstream call, so benchmarks can drive
+the real routers and provider services without network access or quota.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import httpx
+
+# Canned payloads in the shape each provider actually returns. Grok's
+# shapes intentionally mirror its prompts, not the response schemas.
+GEMINI_PAYLOADS = {
+    "chords": {
+        "songTitle": "Wonderwall", "artist": "Oasis", "key": "F# Minor", "instrument": "Guitar",
+        "tuning": "E A D G B E", "capoFret": 2, "progressionSummary": ["Em7", "G", "Dsus4", "A7sus4"],
+        "tablature": [{"section": "Verse 1", "lines": [
+            {"lyrics": "Em7        G", "isChordLine": True},
+            {"lyrics": "Today is gonna be the day", "isChordLine": False},
+        ]}] * 6,
+        "chordDiagrams": [{"chord": "Em7", "frets": [0, 2, 2, 0, 3, 3], "fingers": [0, 1, 2, 0, 3, 4], "capoFret": 2}],
+        "substitutions": [{"originalChord": "G", "substitutedChord": "G/B", "theory": "Passing bass note"}],
+        "practiceTips": ["Keep the pinky and ring finger anchored."],
+    },
+    "backing-track": {
+        "title": "Loop", "style": "pop rock", "bpm": 120, "key": "C", "description": "Test loop",
+        "youtubeQueries": ["pop rock backing track C"],
+        "tracks": [{"instrument": "drums", "steps": [{"beat": 0, "notes": ["kick"], "duration": 1}]}],
+    },
+    "lesson": {"title": "Barre Chords", "lesson": "# Barre Chords\n" + "Practice slowly. " * 200, "duration": "45 mins", "goals": ["Clean F major"]},
+    "rhythm-description": {"description": "Count sixteenths out loud. Accent beat one."},
+    "melody": {"scale": "C Major", "key": "C", "notes": ["C4", "E4", "G4", "A4"], "intervals": ["M3", "m3", "M2"], "suggestion": "Resolve to C."},
+    "improv": {"style": "Blues", "recommendedScales": ["A minor pentatonic"], "tips": ["Target the 3rd."], "backingTrackSearch": "A blues backing"},
+    "lyrics": {"title": "Night Drive", "structure": ["Verse", "Chorus"], "lyrics": "[Am] City lights [F] fading"},
+    "practice-advice": {"insight": "Short sessions", "recommendation": "Add 10 minutes of scales", "focusArea": "Technique"},
+}
+
+GROK_PAYLOADS = {
+    **GEMINI_PAYLOADS,
+    "melody": {"melody": "C4 E4 G4 A4", "description": "Rising motif", "style": "pop"},
+    "improv": {"response": "Target chord tones.", "scales": ["A minor pentatonic"], "targetNotes": ["C", "E"], "techniques": ["bends"]},
+    "lyrics": {"lyrics": "City lights fading", "title": "Night Drive", "structure": "verse-chorus"},
+    "practice-advice": {"advice": "Practice daily", "insights": ["Consistent"], "nextGoals": ["Learn barre chords"]},
+}
+
+# Grok only sees the prompt text, so the route is recovered from it.
+_GROK_ROUTE_HINTS = (
+    ("transcriber", "chords"),
+    ("backing track", "backing-track"),
+    ("how to practise", "rhythm-description"),
+    ("teacher", "lesson"),
+    ("melody", "melody"),
+    ("improv", "improv"),
+    ("lyrics", "lyrics"),
+    ("practice sessions", "practice-advice"),
+)
+
+
+@dataclass
+class FaultProfile:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+
+    def delay(self, rng: random.Random) -> float:
+        return max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def fault(self, rng: random.Random):
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return None
+
+
+class _FakeUsage:
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+
+class _FakeGeminiResponse:
+    def __init__(self, prompt: str, payload: dict):
+        self.text = json.dumps(payload)
+        self.usage_metadata = _FakeUsage(prompt, self.text)
+
+
+class _FakeGeminiModel:
+    def __init__(self, owner, model_name: str, route: str):
+        self.owner = owner
+        self.model_name = model_name
+        self.route = route
+
+    def generate_content(self, prompt: str, request_options=None):
+        # Runs on a worker thread, exactly like the real SDK call.
+        owner = self.owner
+        with owner.lock:
+            owner.calls[self.model_name] += 1
+            delay = owner.profile.delay(owner.rng)
+            fault = owner.profile.fault(owner.rng)
+        time.sleep(delay)
+        if fault == "rate_limited":
+            raise Exception("429 Quota exceeded for model")
+        if fault == "error":
+            raise Exception("503 Overloaded")
+        return _FakeGeminiResponse(prompt, GEMINI_PAYLOADS[self.route])
+
+
+class FakeGemini:
+    def __init__(self, profile: FaultProfile, seed: int = 0):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self._saved = None
+
+    def make_model(self, model_name: str, route: str):
+        return _FakeGeminiModel(self, model_name, route)
+
+    def install(self, service):
+        self._saved = (service.available, service.__dict__.get("_make_model"))
+        service.available = True
+        service._make_model = self.make_model
+
+    def uninstall(self, service):
+        available, make_model = self._saved
+        service.available = available
+        if make_model is None:
+            service.__dict__.pop("_make_model", None)
+        else:
+            service._make_model = make_model
+
+
+class FakeGrok:
+    def __init__(self, profile: FaultProfile, seed: int = 0):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self._saved = None
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        route = next((r for hint, r in _GROK_ROUTE_HINTS if hint in prompt.lower()), "chords")
+        self.calls[route] += 1
+        await asyncio.sleep(self.profile.delay(self.rng))
+
+        fault = self.profile.fault(self.rng)
+        if fault == "rate_limited":
+            return httpx.Response(429, json={"error": "rate limited"})
+        if fault == "error":
+            return httpx.Response(500, json={"error": "upstream error"})
+
+        content = json.dumps(GROK_PAYLOADS[route])
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+        })
+
+    def install(self, service):
+        self._saved = (service.headers, service.available, service.transport)
+        service.headers = {"Authorization": "Bearer fake"}
+        service.available = True
+        service.transport = httpx.MockTransport(self._handle)
+
+    def uninstall(self, service):
+        service.headers, service.available, service.transport = self._saved
@@ -0,0 +1,247 @@
+# benchmarks/jam_fanout.py
+"""
+Broadcast latency of a jam session at 1k WebSocket connections.
+
+    python -m benchmarks.jam_fanout --connections 1000 --messages 100 --output jam.json
+
+Starts uvicorn in a subprocess, joins --connections followers plus a
+leader to one session, and has the leader send --messages tempo changes
+every --interval-ms. Latency is the follower's clock on arrival minus the
+state's serverTime (same host, same clock); a follower that falls behind
+skips superseded states, which shows as "delivered" below 100%. On one
+machine the clients compete with the server for CPU, so the server's own
+cost is also reported as CPU ms per broadcast.
+
+--slow followers connect and never read, to show that a stalled socket
+doesn't hold back the others. Also reports the NTP-style clock offset the
+ping exchange estimates (true offset is 0 on one host) and the fan-out
+time from /metrics. Pass --deflate to negotiate permessage-deflate, which
+costs one compression per socket per message.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import orjson
+from websockets.asyncio.client import connect
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION = "bench"
+PINGS = 8
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, deflate: bool):
+    env = {
+        **os.environ,
+        "PYTHONPATH": SERVER_DIR,
+        "LOG_LEVEL": "CRITICAL",
+        "WARMUP": "false",
+        "JOB_WORKERS": "0",
+        "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "jam_bench.db"),
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--backlog", "4096"]
+    if not deflate:
+        cmd += ["--ws-per-message-deflate", "false"]
+    proc = subprocess.Popen(cmd, env=env, cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    started = time.perf_counter()
+    with httpx.Client(timeout=1.0) as client:
+        while time.perf_counter() - started < 60:
+            try:
+                if client.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                    return proc
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+            time.sleep(0.05)
+    proc.terminate()
+    raise TimeoutError("server never became healthy")
+
+
+class Follower:
+    def __init__(self):
+        self.latencies = {}  # seq -> ms
+        self.ws = None
+
+    async def run(self, ws):
+        self.ws = ws
+        async for raw in ws:
+            arrived = time.time() * 1000
+            message = orjson.loads(raw)
+            if message["type"] == "state" and message["seq"] > 0:
+                self.latencies[message["seq"]] = arrived - message["serverTime"]
+
+
+async def clock_offset(ws) -> tuple:
+    """(offset_ms, rtt_ms) of the lowest-delay ping out of PINGS, on a connection nobody else reads."""
+    best = None
+    for _ in range(PINGS):
+        await ws.send(orjson.dumps({"type": "ping", "t0": time.time() * 1000}).decode())
+        while True:
+            message = orjson.loads(await ws.recv())
+            if message["type"] == "pong":
+                break
+        t3 = time.time() * 1000
+        delay = (t3 - message["t0"]) - (message["t2"] - message["t1"])
+        offset = ((message["t1"] - message["t0"]) + (message["t2"] - t3)) / 2
+        if best is None or delay < best[1]:
+            best = (offset, delay)
+    return best
+
+
+def cpu_seconds(pid: int):
+    """User + system CPU time of a process (Linux only, else None)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def scrape(port: int) -> dict:
+    values = {}
+    for line in httpx.get(f"http://127.0.0.1:{port}/metrics").text.splitlines():
+        if line.startswith(("jam_fanout_seconds_sum", "jam_fanout_seconds_count", "jam_slow_consumers_closed_total")):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+async def run(args, port: int, pid: int) -> dict:
+    url = f"ws://127.0.0.1:{port}/jam/{SESSION}"
+    compression = "deflate" if args.deflate else None
+    sockets = []
+    leader = await connect(url + "?name=leader", compression=compression, max_size=None)
+    sockets.append(leader)
+
+    started = time.perf_counter()
+    followers = [Follower() for _ in range(args.connections)]
+    gate = asyncio.Semaphore(64)
+
+    async def join(i):
+        async with gate:
+            ws = await connect(f"{url}?name=f{i}", compression=compression, open_timeout=60, max_size=None)
+        sockets.append(ws)
+        return ws
+
+    follower_sockets = await asyncio.gather(*(join(i) for i in range(args.connections)))
+    slow = [await connect(f"{url}?name=slow{i}", compression=compression, max_queue=1) for i in range(args.slow)]
+    sockets.extend(slow)
+    connect_s = time.perf_counter() - started
+
+    # Clock estimates on a few dedicated connections before the followers start reading.
+    probes = [await connect(f"{url}?name=probe{i}", compression=compression) for i in range(args.probes)]
+    sockets.extend(probes)
+    offsets = [await clock_offset(ws) for ws in probes]
+
+    readers = [asyncio.create_task(f.run(ws)) for f, ws in zip(followers, follower_sockets)]
+    leader_reader = asyncio.create_task(Follower().run(leader))
+    await asyncio.sleep(1.0)
+    before = scrape(port)
+    cpu_before = cpu_seconds(pid)
+
+    for i in range(args.messages):
+        bpm = 100 + i % 40
+        await leader.send(orjson.dumps({"type": "tempo", "bpm": bpm}).decode())
+        await asyncio.sleep(args.interval_ms / 1000)
+
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline and not all(len(f.latencies) >= args.messages for f in followers):
+        await asyncio.sleep(0.1)
+    cpu_after = cpu_seconds(pid)
+    after = scrape(port)
+
+    for task in readers + [leader_reader]:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+
+    latencies = sorted(ms for f in followers for ms in f.latencies.values())
+    seqs = sorted({seq for f in followers for seq in f.latencies})
+    complete = sorted(max(f.latencies.get(seq, 0) for f in followers) for seq in seqs)
+    fanouts = after["jam_fanout_seconds_count"] - before["jam_fanout_seconds_count"]
+    offsets_ms = sorted(abs(o) for o, _ in offsets)
+    rtts = sorted(d for _, d in offsets)
+    return {
+        "connect_s": round(connect_s, 2),
+        "delivered": round(len(latencies) / (args.connections * args.messages), 4),
+        "latency_ms": {p: round(percentile(latencies, float(p)), 2) for p in ("50", "90", "99", "100")},
+        "all_delivered_ms": {p: round(percentile(complete, float(p)), 2) for p in ("50", "99")},
+        "server_fanout_us": round(
+            (after["jam_fanout_seconds_sum"] - before["jam_fanout_seconds_sum"]) / max(fanouts, 1) * 1e6, 1
+        ),
+        "server_cpu_ms_per_broadcast": (
+            round((cpu_after - cpu_before) * 1000 / args.messages, 2) if cpu_before is not None else None
+        ),
+        "slow_consumers_closed": int(after.get("jam_slow_consumers_closed_total", 0)),
+        "clock": {
+            "abs_offset_ms_p50": round(percentile(offsets_ms, 50), 3),
+            "abs_offset_ms_max": round(offsets_ms[-1], 3) if offsets_ms else 0.0,
+            "rtt_ms_p50": round(percentile(rtts, 50), 3),
+        },
+    }
+
+
+def main(args):
+    port = _free_port()
+    proc = start_server(port, args.deflate)
+    try:
+        results = asyncio.run(run(args, port, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    report = {"benchmark": "jam_fanout", "config": vars(args), **results}
+    lat = results["latency_ms"]
+    print(
+        f"{args.connections} connections{' (+%d slow)' % args.slow if args.slow else ''}, "
+        f"{args.messages} broadcasts: latency p50 {lat['50']}ms p99 {lat['99']}ms max {lat['100']}ms; "
+        f"last delivery p50 {results['all_delivered_ms']['50']}ms; delivered {results['delivered']:.1%}; "
+        f"server fan-out {results['server_fanout_us']}us + {results['server_cpu_ms_per_broadcast']}ms CPU/broadcast; "
+        f"clock offset p50 {results['clock']['abs_offset_ms_p50']}ms",
+        file=sys.stderr,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--interval-ms", type=float, default=250.0)
+    parser.add_argument("--slow", type=int, default=10, help="followers that never read")
+    parser.add_argument("--probes", type=int, default=10, help="connections that estimate the clock offset")
+    parser.add_argument("--deflate", action="store_true", help="negotiate permessage-deflate")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,130 @@
+# benchmarks/melody_analytics.py
+"""
+Whole-table melody analytics: note-name text versus MelodyArray blobs.
+
+    python -m benchmarks.melody_analytics --melodies 200000 --output melody.json
+
+Fills a throwaway SQLite database with random melodies stored both ways,
+then times (a) the per-note Python loop the text format needs (parse every
+name, walk the intervals) and (b) `analyze_table`, which decodes blobs with
+np.frombuffer and computes intervals for the whole table at once. Also
+times the "within an octave" filter on the indexed pitch_span column.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "melody_bench.db")
+
+from sqlalchemy import func, insert, select
+
+from app.api.melodyArray import MAX_INTERVAL, MelodyArray, analyze_table, span_at_most
+from app.database import Base, SessionLocal, engine
+from app.models import Melody
+
+NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+_NOTE = re.compile(r"([A-G])(#?)(-?\d)")
+
+
+def random_melody(rng: random.Random) -> str:
+    pitch = rng.randint(52, 72)
+    notes = []
+    for _ in range(rng.randint(8, 48)):
+        pitch = max(36, min(96, pitch + rng.choice((-5, -3, -2, -1, 0, 1, 2, 2, 3, 4, 7, 12))))
+        notes.append(f"{NAMES[pitch % 12]}{pitch // 12 - 1}/{rng.choice((4, 8, 8, 16, 2))}")
+    return " ".join(notes)
+
+
+def seed(count: int, rng: random.Random, batch: int = 5000):
+    Base.metadata.create_all(engine, tables=[Melody.__table__])
+    texts = []
+    with engine.begin() as conn:
+        for start in range(0, count, batch):
+            rows = []
+            for _ in range(min(batch, count - start)):
+                text = random_melody(rng)
+                melody = MelodyArray.from_names(text)
+                texts.append(text)
+                rows.append({
+                    "melody_data": melody.to_bytes(), "pitch_min": melody.pitch_min,
+                    "pitch_max": melody.pitch_max, "pitch_span": melody.span, "note_count": len(melody),
+                })
+            conn.execute(insert(Melody.__table__), rows)
+    return texts
+
+
+def analyze_text(texts) -> dict:
+    """The pre-array approach: parse names and loop over notes in Python."""
+    histogram = [0] * (MAX_INTERVAL + 1)
+    within_octave = 0
+    for text in texts:
+        pitches = []
+        for token in text.split():
+            letter, sharp, octave = _NOTE.match(token).groups()
+            pitches.append((int(octave) + 1) * 12 + NAMES.index(letter + sharp))
+        for a, b in zip(pitches, pitches[1:]):
+            histogram[min(abs(b - a), MAX_INTERVAL)] += 1
+        within_octave += max(pitches) - min(pitches) <= 12
+    return {"intervalHistogram": histogram, "withinOctave": within_octave / len(texts)}
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    texts = seed(args.melodies, rng)
+    seed_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    text_stats = analyze_text(texts)
+    text_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    array_stats = analyze_table()
+    array_s = time.perf_counter() - started
+    assert array_stats["intervalHistogram"] == text_stats["intervalHistogram"]
+
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        within_octave = db.execute(select(func.count()).select_from(Melody).where(span_at_most(12))).scalar()
+        filter_ms = (time.perf_counter() - started) * 1000
+
+    report = {
+        "benchmark": "melody_analytics",
+        "config": vars(args),
+        "notes": array_stats["notes"],
+        "seed_s": round(seed_s, 2),
+        "text_analytics_s": round(text_s, 2),
+        "array_analytics_s": round(array_s, 2),
+        "speedup": round(text_s / array_s, 1),
+        "within_octave": within_octave,
+        "within_octave_query_ms": round(filter_ms, 1),
+    }
+    print(
+        f"{args.melodies} melodies / {report['notes']} notes: text loop {text_s:.2f}s, "
+        f"arrays {array_s:.2f}s ({report['speedup']}x); span filter {filter_ms:.1f} ms",
+        file=sys.stderr,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--melodies", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,257 @@
+# benchmarks/query_plans.py
+"""
+Query plans and latency of the hot read paths, before and after the
+hot-path index migration (a7c4e2d9b315).
+
+    python -m benchmarks.query_plans --scale 1000000 --workers 4 --output query_plans.json
+    python -m benchmarks.query_plans --database-url postgresql://... --output query_plans.json
+
+Without --database-url, migrates a throwaway SQLite database to the
+revision before the indexes and fills it with app.seeders.synthetic. With
+--database-url, the database must already be seeded; it is downgraded to
+that revision first and left at head afterwards. Each query runs --samples
+times with parameters drawn the way traffic arrives (users and songs
+picked in proportion to their activity), then the migration is applied
+and everything runs again. Plans are EXPLAIN QUERY PLAN on SQLite and
+EXPLAIN on Postgres.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, func, select, text
+
+from app.models import (
+    ChordProgression, Instrument, Lesson, Melody, PracticeSession, Song,
+    UserSettings, UserSong, user_instruments_table,
+)
+from app.seeders import synthetic
+
+BEFORE_REVISION = "6f3a9c1e8b42"
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+DEMAND_WINDOW_DAYS = 30
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+# ---------------------------
+# Hot queries
+# ---------------------------
+# name -> stmt(params); params has user, song, instrument, difficulty, now
+
+def _recent_sessions(p):
+    return (select(PracticeSession.id, PracticeSession.song_id, PracticeSession.duration_minutes,
+                   PracticeSession.created_at)
+            .where(PracticeSession.user_id == p["user"])
+            .order_by(PracticeSession.created_at.desc()).limit(20))
+
+
+def _weekly_minutes(p):
+    return (select(func.coalesce(func.sum(PracticeSession.duration_minutes), 0))
+            .where(PracticeSession.user_id == p["user"], PracticeSession.created_at >= p["now"] - timedelta(days=7)))
+
+
+def _recent_progressions(p):
+    return (select(ChordProgression.id, ChordProgression.song_id, ChordProgression.progression)
+            .where(ChordProgression.user_id == p["user"])
+            .order_by(ChordProgression.created_at.desc()).limit(20))
+
+
+def _library(p):
+    return (select(Song.id, Song.title, Song.artist, UserSong.created_at)
+            .join(UserSong, UserSong.song_id == Song.id)
+            .where(UserSong.user_id == p["user"])
+            .order_by(UserSong.created_at.desc()).limit(50))
+
+
+def _recent_melodies(p):
+    return (select(Melody.id, Melody.pitch_span, Melody.created_at)
+            .where(Melody.user_id == p["user"])
+            .order_by(Melody.created_at.desc()).limit(20))
+
+
+def _user_instruments(p):
+    return (select(Instrument.name)
+            .join(user_instruments_table, user_instruments_table.c.instrument_id == Instrument.id)
+            .where(user_instruments_table.c.user_id == p["user"]))
+
+
+def _user_settings(p):
+    return select(UserSettings.tuning_reference, UserSettings.preferred_metronome_tempo).where(
+        UserSettings.user_id == p["user"])
+
+
+def _song_sessions(p):
+    return select(func.count()).select_from(PracticeSession).where(PracticeSession.song_id == p["song"])
+
+
+def _lessons_for_instrument(p):
+    return (select(Lesson.id, Lesson.title)
+            .where(Lesson.instrument_id == p["instrument"], Lesson.difficulty == p["difficulty"]))
+
+
+def _save_demand(p):
+    # The two halves of app.precompute.rank_songs.
+    return (select(UserSong.song_id, func.count())
+            .where(UserSong.created_at >= p["now"] - timedelta(days=DEMAND_WINDOW_DAYS),
+                   UserSong.song_id.isnot(None))
+            .group_by(UserSong.song_id))
+
+
+def _progression_demand(p):
+    return (select(ChordProgression.song_id, func.count())
+            .where(ChordProgression.created_at >= p["now"] - timedelta(days=DEMAND_WINDOW_DAYS),
+                   ChordProgression.song_id.isnot(None))
+            .group_by(ChordProgression.song_id))
+
+
+QUERIES = {
+    "recent_sessions": _recent_sessions,
+    "weekly_minutes": _weekly_minutes,
+    "recent_progressions": _recent_progressions,
+    "library": _library,
+    "recent_melodies": _recent_melodies,
+    "user_instruments": _user_instruments,
+    "user_settings": _user_settings,
+    "song_sessions": _song_sessions,
+    "lessons_for_instrument": _lessons_for_instrument,
+    "save_demand": _save_demand,
+    "progression_demand": _progression_demand,
+}
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+
+def sample_params(engine, count: int, rng: random.Random) -> list:
+    """Users and songs of random practice sessions / saves, i.e. weighted by activity."""
+    with engine.connect() as conn:
+        sessions = conn.execute(select(func.max(PracticeSession.id))).scalar()
+        saves = conn.execute(select(func.max(UserSong.id))).scalar()
+        now = conn.execute(select(func.max(PracticeSession.created_at))).scalar()
+        users = conn.execute(
+            select(PracticeSession.user_id).where(PracticeSession.id.in_(rng.sample(range(1, sessions + 1), count)))
+        ).scalars().all()
+        songs = conn.execute(
+            select(UserSong.song_id).where(UserSong.id.in_(rng.sample(range(1, saves + 1), count)))
+        ).scalars().all()
+        instruments = conn.execute(select(Instrument.id)).scalars().all()
+    return [
+        {"user": users[i % len(users)], "song": songs[i % len(songs)], "instrument": rng.choice(instruments),
+         "difficulty": rng.choice(synthetic.SKILL_LEVELS), "now": now}
+        for i in range(count)
+    ]
+
+
+def explain(conn, stmt) -> list:
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+    return [row[0] for row in conn.exec_driver_sql("EXPLAIN " + sql)]
+
+
+def measure(engine, params: list) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        for name, build in QUERIES.items():
+            latencies = []
+            for p in params:
+                stmt = build(p)
+                started = time.perf_counter()
+                conn.execute(stmt).all()
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            results[name] = {
+                "plan": explain(conn, build(params[0])),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+            }
+    return results
+
+
+def alembic_config(url: str) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
+
+
+def main(args):
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_plans.db")
+    config = alembic_config(url)
+    report = {"benchmark": "query_plans", "config": {**vars(args), "database_url": url.split("@")[-1]}}
+
+    # The seeder reports progress on stdout; keep stdout for the JSON report.
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.database_url:
+            command.downgrade(config, BEFORE_REVISION)
+        else:
+            command.upgrade(config, BEFORE_REVISION)
+            started = time.perf_counter()
+            report["rows"] = synthetic.seed(args.scale, args.seed, args.workers, url=url)
+            report["seed_s"] = round(time.perf_counter() - started, 1)
+
+    engine = create_engine(url, future=True)
+    params = sample_params(engine, args.samples, random.Random(args.seed))
+    before = measure(engine, params)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        command.upgrade(config, "head")
+        report["migration_s"] = round(time.perf_counter() - started, 1)
+    after = measure(engine, params)
+    engine.dispose()
+
+    report["queries"] = {
+        name: {
+            "before": before[name],
+            "after": after[name],
+            "speedup_p50": round(before[name]["p50_ms"] / max(after[name]["p50_ms"], 1e-3), 1),
+        }
+        for name in QUERIES
+    }
+
+    print(f"indexes built in {report['migration_s']}s", file=sys.stderr)
+    print(f"{'query':<24}{'before p50':>12}{'after p50':>12}{'speedup':>10}   plan after", file=sys.stderr)
+    for name, r in report["queries"].items():
+        print(f"{name:<24}{r['before']['p50_ms']:>10.2f}ms{r['after']['p50_ms']:>10.2f}ms{r['speedup_p50']:>9}x"
+              f"   {' / '.join(r['after']['plan'])}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=200000, help="practice sessions to seed (see app.seeders.synthetic)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--samples", type=int, default=30, help="parameter sets per query")
+    parser.add_argument("--database-url", help="an already seeded database to measure instead")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
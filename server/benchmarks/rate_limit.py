@@ -0,0 +1,178 @@
+# benchmarks/rate_limit.py
+"""
+Cost of a rate limit check, and what the limiter does for light users
+while one client floods the AI routes.
+
+    python -m benchmarks.rate_limit --duration 10 --output rate_limit.json
+
+"check" times RateLimiter.check for --keys callers on the memory and
+sqlite stores. "fairness" boots the real app over an ASGI transport with
+a fake Gemini (--latency-ms per call, Grok unavailable, AI cache off):
+one heavy client address keeps --heavy-concurrency melody requests in
+flight (backing off 50ms after a 429) while --light users, each from its
+own address, send one request at a time. It runs three ways: limiter off, fair share only (per-caller limits
+out of reach) and the defaults, and reports the light users' latency and
+status codes next to what the heavy client got through.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+import httpx
+
+from app import ratelimit
+from app.main import app
+from app.api.geminiService import gemini_music_service
+from app.api.grokService import grok_service
+from app.routers import ai as ai_routes
+from benchmarks.fakes import FakeGemini, FaultProfile
+
+PATH, BODY = "/ai/melody", {"key": "C", "style": "pop"}
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+# ---------------------------
+# Check cost
+# ---------------------------
+
+def bench_check(store, keys: int, checks: int) -> dict:
+    limiter = ratelimit.RateLimiter(store=store, rules=(("minute", 60.0, 1e12), ("hour", 3600.0, 1e12)))
+    started = time.perf_counter()
+    for i in range(checks):
+        limiter.check(f"ip:10.0.{i % keys // 256}.{i % 256}", 1)
+    elapsed = time.perf_counter() - started
+    return {"checks": checks, "us_per_check": round(elapsed / checks * 1e6, 2)}
+
+
+# ---------------------------
+# Fairness
+# ---------------------------
+
+async def run_fairness(name: str, limiter, args) -> dict:
+    ratelimit.rate_limiter = limiter
+    fake = FakeGemini(FaultProfile(latency_ms=args.latency_ms), seed=args.seed)
+    fake.install(gemini_music_service)
+    light_latencies, light_status, heavy_status = [], Counter(), Counter()
+    stop_at = time.perf_counter() + args.duration
+
+    def client_from(address: str):
+        # Callers are told apart by client address.
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False, client=(address, 4000))
+        return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+    async with client_from("10.1.0.1") as heavy_client:
+
+        async def heavy():
+            while time.perf_counter() < stop_at:
+                resp = await heavy_client.post(PATH, json=BODY)
+                heavy_status[resp.status_code] += 1
+                if resp.status_code == 429:
+                    await asyncio.sleep(0.05)
+
+        async def light(i):
+            async with client_from(f"10.2.0.{i + 1}") as client:
+                while time.perf_counter() < stop_at:
+                    started = time.perf_counter()
+                    resp = await client.post(PATH, json=BODY)
+                    light_latencies.append((time.perf_counter() - started) * 1000)
+                    light_status[resp.status_code] += 1
+                    await asyncio.sleep(args.think_ms / 1000)
+
+        await asyncio.gather(
+            *(heavy() for _ in range(args.heavy_concurrency)),
+            *(light(i) for i in range(args.light)),
+        )
+    fake.uninstall(gemini_music_service)
+
+    light_latencies.sort()
+    return {
+        "scenario": name,
+        "light": {
+            "requests": len(light_latencies),
+            "p50_ms": round(percentile(light_latencies, 50), 1),
+            "p99_ms": round(percentile(light_latencies, 99), 1),
+            "status": {str(code): n for code, n in sorted(light_status.items())},
+        },
+        "heavy": {
+            "ok_per_s": round(heavy_status[200] / args.duration, 1),
+            "status": {str(code): n for code, n in sorted(heavy_status.items())},
+        },
+    }
+
+
+async def fairness(args) -> list:
+    scenarios = {
+        "off": ratelimit.RateLimiter(enabled=False),
+        "fair-share": ratelimit.RateLimiter(
+            store=ratelimit.MemoryStore(), rules=(("minute", 60.0, 1e12), ("hour", 3600.0, 1e12))
+        ),
+        "default": ratelimit.RateLimiter(store=ratelimit.MemoryStore()),
+    }
+    grok_was_available = grok_service.available
+    grok_service.available = False
+    try:
+        return [await run_fairness(name, limiter, args) for name, limiter in scenarios.items()]
+    finally:
+        grok_service.available = grok_was_available
+
+
+def main(args):
+    # Measure the provider path, not repeat hits on the fixed request body.
+    ai_routes.AI_CACHE_TTLS.clear()
+    report = {"benchmark": "rate_limit", "config": vars(args), "check": {}}
+
+    report["check"]["memory"] = bench_check(ratelimit.MemoryStore(), args.keys, args.checks)
+    path = os.path.join(tempfile.mkdtemp(), "rate_limit.sqlite3")
+    report["check"]["sqlite"] = bench_check(ratelimit.SQLiteStore(path), args.keys, args.checks // 10)
+    report["fairness"] = asyncio.run(fairness(args))
+
+    print(
+        f"check: memory {report['check']['memory']['us_per_check']}us, "
+        f"sqlite {report['check']['sqlite']['us_per_check']}us",
+        file=sys.stderr,
+    )
+    print(f"{'scenario':<12}{'light p50':>11}{'light p99':>11}{'heavy ok/s':>12}  light status / heavy status",
+          file=sys.stderr)
+    for r in report["fairness"]:
+        print(f"{r['scenario']:<12}{r['light']['p50_ms']:>9}ms{r['light']['p99_ms']:>9}ms{r['heavy']['ok_per_s']:>12}"
+              f"  {r['light']['status']} / {r['heavy']['status']}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=10000, help="distinct callers in the check benchmark")
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per fairness scenario")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--heavy-concurrency", type=int, default=32)
+    parser.add_argument("--light", type=int, default=8, help="light users, one request in flight each")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="light users' pause between requests")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
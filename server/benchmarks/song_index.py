@@ -0,0 +1,138 @@
+# benchmarks/song_index.py
+"""
+Build time, lookup latency and hit rate of the song similarity index.
+
+    python -m benchmarks.song_index --songs 200000 --lookups 5000 --output song_index.json
+
+Indexes --songs synthetic "title artist" entries, then resolves lookups
+spelled the way users type them: reordered ("artist - title"), with filler
+("title by artist chords"), or with a one-letter typo. "exact" is the hit
+rate of keying on the raw query string, which is what the arrangement
+store and AI cache do without the index. Unknown songs are mixed in to
+measure false matches.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from app.api.songIndex import SongIndex
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def make_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def make_songs(count: int, rng: random.Random):
+    vocabulary = [make_word(rng) for _ in range(20000)]
+    artists = [" ".join(rng.choices(vocabulary, k=rng.randint(1, 2))).title() for _ in range(max(1, count // 8))]
+    return [
+        (" ".join(rng.choices(vocabulary, k=rng.randint(1, 4))).title(), rng.choice(artists))
+        for _ in range(count)
+    ]
+
+
+def typo(text: str, rng: random.Random) -> str:
+    positions = [i for i, c in enumerate(text) if c.isalpha()]
+    i = rng.choice(positions)
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+
+VARIANTS = {
+    "exact": lambda title, artist, rng: f"{title} {artist}",
+    "reordered": lambda title, artist, rng: f"{artist} - {title}",
+    "filler": lambda title, artist, rng: f"{title.lower()} by {artist.lower()} chords",
+    "typo": lambda title, artist, rng: typo(f"{title} {artist}", rng),
+}
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    songs = make_songs(args.songs, rng)
+    index = SongIndex(path=os.path.join(tempfile.mkdtemp(), "song_index.npz"))
+
+    started = time.perf_counter()
+    indexed = index.build((f"{title} {artist}", song_id) for song_id, (title, artist) in enumerate(songs))
+    build_s = time.perf_counter() - started
+    index.save()
+    started = time.perf_counter()
+    index.load()
+    load_s = time.perf_counter() - started
+
+    stored = set(index._arrays[3])
+    results = {}
+    for name, variant in {**VARIANTS, "unknown": None}.items():
+        latencies, exact, hits, correct = [], 0, 0, 0
+        for _ in range(args.lookups):
+            if variant is None:
+                song_id, query = None, " ".join(make_word(rng) for _ in range(3))
+            else:
+                song_id = rng.randrange(len(songs))
+                query = variant(*songs[song_id], rng)
+            exact += query in stored
+            started = time.perf_counter()
+            match = index.resolve(query)
+            latencies.append((time.perf_counter() - started) * 1e6)
+            hits += match is not None
+            correct += match is not None and match.song_id == song_id
+        latencies.sort()
+        results[name] = {
+            "exact_hit_rate": round(exact / args.lookups, 4),
+            "index_hit_rate": round(hits / args.lookups, 4),
+            "correct_rate": round(correct / args.lookups, 4),
+            "resolve_us": {
+                "p50": round(percentile(latencies, 50), 1),
+                "p99": round(percentile(latencies, 99), 1),
+                "max": round(latencies[-1], 1),
+            },
+        }
+
+    print(f"{indexed} entries: build {build_s:.1f}s, load {load_s:.2f}s", file=sys.stderr)
+    print(f"{'lookup':<11}{'exact':>8}{'index':>8}{'correct':>9}{'p50/p99 us':>16}", file=sys.stderr)
+    for name, r in results.items():
+        print(
+            f"{name:<11}{r['exact_hit_rate']:>8}{r['index_hit_rate']:>8}{r['correct_rate']:>9}"
+            f"{str(r['resolve_us']['p50']) + '/' + str(r['resolve_us']['p99']):>16}",
+            file=sys.stderr,
+        )
+
+    report = json.dumps({
+        "benchmark": "song_index",
+        "config": vars(args),
+        "entries": indexed,
+        "build_s": round(build_s, 2),
+        "load_s": round(load_s, 3),
+        "lookups": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=5000, help="per lookup variant")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,165 @@
+# benchmarks/stale_cache.py
+"""
+Latency of popular /ai results right after they expire, with and without
+stale serving.
+
+    python -m benchmarks.stale_cache --keys 20 --requests 400 --concurrency 32 --output stale.json
+
+Boots the real app over an ASGI transport with fake providers, caches a
+melody for each of --keys inputs, marks every entry expired, then sends
+--requests requests spread over those inputs. Scenarios combine stale
+serving (off, stale-if-error only, while-revalidate) with healthy or
+failing providers, and report latency, status codes, upstream calls and
+background refreshes by outcome (one per key is the target).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from app.main import app
+from app.api.geminiService import gemini_music_service
+from app.api.grokService import grok_service
+from app.cache import ai_cache
+from app.metrics import AI_REFRESHES
+from app.routers import ai as ai_routes
+from benchmarks.fakes import FakeGemini, FakeGrok, FaultProfile
+
+STYLES = ("pop", "blues", "jazz", "rock", "folk")
+KEYS = ("C", "G", "D", "A", "E", "F", "Bb", "Eb")
+
+# name -> (stale while revalidate, stale if error, providers healthy)
+SCENARIOS = {
+    "no-stale": (False, False, True),
+    "revalidate": (True, True, True),
+    "no-stale-down": (False, False, False),
+    "if-error-down": (False, True, False),
+    "revalidate-down": (True, True, False),
+}
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def inputs(count: int) -> list:
+    return [{"key": k, "style": s} for s in STYLES for k in KEYS][:count]
+
+
+def expire_all(bodies: list):
+    for body in bodies:
+        cache_key = ai_routes._cache_key("melody", (body["key"], body["style"]))
+        entry = ai_cache.get_entry(cache_key)
+        ai_cache.set(cache_key, entry[0], -1, ai_routes.AI_STALE_TTL)
+
+
+async def run_scenario(name: str, client, bodies: list, args) -> dict:
+    revalidate, if_error, healthy = SCENARIOS[name]
+    # Prime with healthy providers, then switch to the scenario's.
+    ai_cache.clear()
+    primer = FakeGemini(FaultProfile(latency_ms=1), seed=args.seed)
+    primer.install(gemini_music_service)
+    for body in bodies:
+        await client.post("/ai/melody", json=body)
+    primer.uninstall(gemini_music_service)
+    expire_all(bodies)
+
+    ai_routes.AI_STALE_WHILE_REVALIDATE = ai_routes.AI_STALE_TTL if revalidate else 0
+    ai_routes.AI_STALE_IF_ERROR = ai_routes.AI_STALE_TTL if if_error else 0
+    error_rate = 0.0 if healthy else 1.0
+    gemini = FakeGemini(FaultProfile(latency_ms=args.latency_ms, error_rate=error_rate), seed=args.seed)
+    grok = FakeGrok(FaultProfile(latency_ms=args.latency_ms, error_rate=error_rate), seed=args.seed)
+    gemini.install(gemini_music_service)
+    grok.install(grok_service)
+
+    refreshes_before = {o: AI_REFRESHES.value(route="melody", outcome=o) for o in ("ok", "failed")}
+    rng = random.Random(args.seed)
+    plan = [rng.choice(bodies) for _ in range(args.requests)]
+    cursor = iter(plan)
+    latencies, statuses = [], Counter()
+
+    async def worker():
+        for body in cursor:
+            started = time.perf_counter()
+            resp = await client.post("/ai/melody", json=body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[resp.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    duration = time.perf_counter() - started
+    # Let background refreshes land before counting.
+    while ai_routes._refresh_tasks:
+        await asyncio.sleep(0.01)
+
+    gemini.uninstall(gemini_music_service)
+    grok.uninstall(grok_service)
+    latencies.sort()
+    return {
+        "scenario": name,
+        "duration_s": round(duration, 3),
+        "latency_ms": {p: round(percentile(latencies, float(p)), 2) for p in ("50", "99")},
+        "status": {str(code): n for code, n in sorted(statuses.items())},
+        "rps": round(args.requests / duration, 1),
+        "upstream_calls": sum(gemini.calls.values()) + sum(grok.calls.values()),
+        "refreshes": {o: int(AI_REFRESHES.value(route="melody", outcome=o) - n) for o, n in refreshes_before.items()},
+    }
+
+
+async def run(args) -> list:
+    bodies = inputs(args.keys)
+    saved = (ai_routes.AI_STALE_WHILE_REVALIDATE, ai_routes.AI_STALE_IF_ERROR, gemini_music_service.available)
+    gemini_music_service.available = True
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return [await run_scenario(name, client, bodies, args) for name in args.scenario or SCENARIOS]
+    finally:
+        ai_routes.AI_STALE_WHILE_REVALIDATE, ai_routes.AI_STALE_IF_ERROR, gemini_music_service.available = saved
+
+
+def main(args):
+    results = asyncio.run(run(args))
+    report = {"benchmark": "stale_cache", "config": vars(args), "scenarios": results}
+
+    print(f"{'scenario':<18}{'rps':>8}{'p50':>11}{'p99':>11}{'upstream':>10}  refreshes / status", file=sys.stderr)
+    for r in results:
+        print(f"{r['scenario']:<18}{r['rps']:>8}{r['latency_ms']['50']:>9}ms{r['latency_ms']['99']:>9}ms"
+              f"{r['upstream_calls']:>10}  {r['refreshes']} / {r['status']}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=20, help="popular inputs (at most 40)")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake provider latency")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
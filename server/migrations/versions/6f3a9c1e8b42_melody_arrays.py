@@ -0,0 +1,158 @@
+"""Array-backed melodies with pitch range columns
+
+Revision ID: 6f3a9c1e8b42
+Revises: d2b8f4a61c07
+Create Date: 2026-10-19 12:48:09.571338
+
+"""
+import re
+import struct
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f3a9c1e8b42'
+down_revision: Union[str, Sequence[str], None] = 'd2b8f4a61c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+melodies = sa.table(
+    'melodies',
+    sa.column('id', sa.Integer),
+    sa.column('melody_data', sa.LargeBinary),
+    sa.column('pitch_min', sa.Integer),
+    sa.column('pitch_max', sa.Integer),
+    sa.column('pitch_span', sa.Integer),
+    sa.column('note_count', sa.Integer),
+)
+
+
+def _rewrite(convert) -> None:
+    """convert(melody_data) -> dict of new column values, for every non-null row in batches."""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(melodies.c.id, melodies.c.melody_data)
+            .where(melodies.c.id > last_id, melodies.c.melody_data.is_not(None))
+            .order_by(melodies.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        values = [{'row_id': row_id, **convert(data)} for row_id, data in rows]
+        bind.execute(
+            melodies.update().where(melodies.c.id == sa.bindparam('row_id'))
+            .values({name: sa.bindparam(name) for name in values[0] if name != 'row_id'}),
+            values,
+        )
+        last_id = rows[-1][0]
+
+
+# ---------------------------
+# Format version 1 of app/api/melodyArray.py
+# ---------------------------
+# A frozen, numpy-free copy, so this revision keeps writing the format it
+# introduced whatever MelodyArray turns into later.
+
+PPQ = 480
+DEFAULT_VELOCITY = 96
+MAGIC = b'NXM'
+_HEADER = struct.Struct('<3sBI')
+_TOKEN = re.compile(r'([A-Ga-g]|[Rr])([#b]?)(-?\d)?(?:/([\d.]+))?')
+_PITCH_CLASSES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+
+def _parse_names(melody: str):
+    """[(pitch, onset, duration)] from 'C4/4 E4/8 R/8 G4/2'."""
+    notes, tick = [], 0
+    for token in re.split(r'[\s,|]+', melody):
+        match = _TOKEN.fullmatch(token.strip())
+        if not match:
+            continue
+        letter, accidental, octave, denominator = match.groups()
+        length = round(PPQ * 4 / float(denominator)) if denominator else PPQ
+        if letter.upper() != 'R':
+            offset = {'#': 1, 'b': -1}.get(accidental, 0)
+            octave = int(octave) if octave else 4
+            notes.append(((octave + 1) * 12 + _PITCH_CLASSES[letter.upper()] + offset, tick, length))
+        tick += length
+    return notes
+
+
+def _pitches(data) -> list:
+    blob = bytes(data)
+    if blob[:3] != MAGIC:
+        return [pitch for pitch, _, _ in _parse_names(blob.decode())]
+    magic, version, n = _HEADER.unpack_from(blob)
+    if version != 1:
+        raise ValueError(f'unsupported melody format version {version}')
+    return list(struct.unpack_from(f'<{n}h', blob, _HEADER.size))
+
+
+def _to_array(data):
+    blob = bytes(data)
+    if blob[:3] == MAGIC:
+        # Already converted; a re-run only refills the range columns.
+        pitches = _pitches(blob)
+    else:
+        notes = _parse_names(blob.decode())
+        pitches = [pitch for pitch, _, _ in notes]
+        n = len(notes)
+        blob = b''.join((
+            _HEADER.pack(MAGIC, 1, n),
+            struct.pack(f'<{n}h', *pitches),
+            struct.pack(f'<{n}i', *(onset for _, onset, _ in notes)),
+            struct.pack(f'<{n}i', *(duration for _, _, duration in notes)),
+            bytes([DEFAULT_VELOCITY] * n),
+        ))
+    return {
+        'melody_data': blob,
+        'pitch_min': min(pitches) if pitches else None,
+        'pitch_max': max(pitches) if pitches else None,
+        'pitch_span': max(pitches) - min(pitches) if pitches else None,
+        'note_count': len(pitches),
+    }
+
+
+def _to_names(data):
+    return {'melody_data': ' '.join(f'{_NAMES[p % 12]}{p // 12 - 1}' for p in _pitches(data)).encode()}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('melodies') as batch_op:
+        batch_op.alter_column(
+            'melody_data', existing_type=sa.Text(), type_=sa.LargeBinary(), existing_nullable=True,
+            postgresql_using="convert_to(melody_data, 'UTF8')",
+        )
+        batch_op.add_column(sa.Column('pitch_min', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pitch_max', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pitch_span', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('note_count', sa.Integer(), nullable=True))
+        batch_op.create_index(op.f('ix_melodies_pitch_span'), ['pitch_span'], unique=False)
+    _rewrite(_to_array)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rewrite(_to_names)
+    with op.batch_alter_table('melodies') as batch_op:
+        batch_op.drop_index(op.f('ix_melodies_pitch_span'))
+        batch_op.drop_column('note_count')
+        batch_op.drop_column('pitch_span')
+        batch_op.drop_column('pitch_max')
+        batch_op.drop_column('pitch_min')
+        batch_op.alter_column(
+            'melody_data', existing_type=sa.LargeBinary(), type_=sa.Text(), existing_nullable=True,
+            postgresql_using="convert_from(melody_data, 'UTF8')",
+        )
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite keeps the rewritten values as BLOBs; store them as TEXT again.
+        op.execute("UPDATE melodies SET melody_data = CAST(melody_data AS TEXT) WHERE melody_data IS NOT NULL")
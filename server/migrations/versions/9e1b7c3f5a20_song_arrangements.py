@@ -0,0 +1,43 @@
+"""Song arrangements
+
+Revision ID: 9e1b7c3f5a20
+Revises: 4c2a9e7d1f03
+Create Date: 2026-10-19 11:40:02.561774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e1b7c3f5a20'
+down_revision: Union[str, Sequence[str], None] = '4c2a9e7d1f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('song_arrangements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('song_id', sa.Integer(), nullable=True),
+    sa.Column('query_key', sa.String(), nullable=False),
+    sa.Column('instrument', sa.String(), nullable=False),
+    sa.Column('simplified', sa.Boolean(), nullable=False),
+    sa.Column('arrangement', sa.Text(), nullable=False),
+    sa.Column('demand_score', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['song_id'], ['songs.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('query_key', 'instrument', 'simplified', name='uq_song_arrangements_variant')
+    )
+    op.create_index(op.f('ix_song_arrangements_id'), 'song_arrangements', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_song_arrangements_id'), table_name='song_arrangements')
+    op.drop_table('song_arrangements')
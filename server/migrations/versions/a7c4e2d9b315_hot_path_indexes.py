@@ -0,0 +1,75 @@
+"""Indexes for per-user history, demand ranking and foreign keys
+
+Revision ID: a7c4e2d9b315
+Revises: 6f3a9c1e8b42
+Create Date: 2026-10-19 14:02:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e2d9b315'
+down_revision: Union[str, Sequence[str], None] = '6f3a9c1e8b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns). (user_id, created_at) serves "this user's latest N"
+# and "this user's last 7 days" without a sort. (song_id, created_at) serves
+# song lookups and lets the precompute demand window (GROUP BY song_id over
+# recent rows) run from the index alone. The rest cover foreign key lookups.
+INDEXES = [
+    ('ix_practice_sessions_user_id_created_at', 'practice_sessions', ['user_id', 'created_at']),
+    ('ix_practice_sessions_song_id', 'practice_sessions', ['song_id']),
+    ('ix_practice_sessions_lesson_id', 'practice_sessions', ['lesson_id']),
+    ('ix_chord_progressions_user_id_created_at', 'chord_progressions', ['user_id', 'created_at']),
+    ('ix_chord_progressions_song_id_created_at', 'chord_progressions', ['song_id', 'created_at']),
+    ('ix_user_songs_user_id_created_at', 'user_songs', ['user_id', 'created_at']),
+    ('ix_user_songs_song_id_created_at', 'user_songs', ['song_id', 'created_at']),
+    ('ix_melodies_user_id_created_at', 'melodies', ['user_id', 'created_at']),
+    ('ix_lessons_instrument_id_difficulty', 'lessons', ['instrument_id', 'difficulty']),
+    ('ix_user_settings_user_id', 'user_settings', ['user_id']),
+    ('ix_user_instruments_instrument_id', 'user_instruments', ['instrument_id']),
+    ('ix_song_arrangements_song_id', 'song_arrangements', ['song_id']),
+]
+
+
+def _concurrently() -> bool:
+    # Postgres can build indexes without blocking writes, outside a transaction.
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the oldest row of any duplicated (user, instrument) pair.
+    op.execute(
+        'DELETE FROM user_instruments '
+        'WHERE user_id IS NOT NULL AND instrument_id IS NOT NULL AND id NOT IN '
+        '(SELECT MIN(id) FROM user_instruments GROUP BY user_id, instrument_id)'
+    )
+    with op.batch_alter_table('user_instruments') as batch_op:
+        batch_op.create_unique_constraint('uq_user_instruments_user_instrument', ['user_id', 'instrument_id'])
+
+    if _concurrently():
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _concurrently():
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('user_instruments') as batch_op:
+        batch_op.drop_constraint('uq_user_instruments_user_instrument', type_='unique')
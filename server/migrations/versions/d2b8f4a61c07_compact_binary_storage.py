@@ -0,0 +1,205 @@
+"""Compact binary storage for arrangements and progressions
+
+Revision ID: d2b8f4a61c07
+Revises: 9e1b7c3f5a20
+Create Date: 2026-10-19 12:05:31.204417
+
+"""
+import json
+import struct
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import orjson
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b8f4a61c07'
+down_revision: Union[str, Sequence[str], None] = '9e1b7c3f5a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+# ---------------------------
+# Format version 1 of app/codec.py
+# ---------------------------
+# A frozen copy, so this revision keeps writing the format it introduced
+# whatever app.codec turns into later.
+
+_ROOTS = ('C', 'C#', 'Db', 'D', 'D#', 'Eb', 'E', 'F', 'F#', 'Gb', 'G', 'G#', 'Ab', 'A', 'A#', 'Bb', 'B')
+_QUALITIES = ('', 'm', '7', 'maj7', 'm7', 'sus2', 'sus4', 'dim', 'aug', 'add9', '6', 'm6', '9', 'm9')
+CHORDS = tuple(root + quality for root in _ROOTS for quality in _QUALITIES)
+_CHORD_INDEX = {chord: i for i, chord in enumerate(CHORDS)}
+_ESCAPE = 255
+_ZDICT = ' '.join(CHORDS[::-1]).encode() + (
+    b'"substitutions":[{"originalChord":"","substitutedChord":"","theory":""}]'
+    b'"chordDiagrams":[{"chord":"","frets":["X",0,1,2,3],"fingers":[null,1,2,3],"capoFret":0}]'
+    b'"practiceTips":["Practice slowly"],"tuning":"E A D G B E","capoFret":0,'
+    b'"songTitle":"","artist":"","key":" Major","instrument":"Guitar","progressionSummary":["'
+    b'"tablature":[{"section":"Intro"},{"section":"Verse 1"},{"section":"Pre-Chorus"},'
+    b'{"section":"Chorus"},{"section":"Bridge"},{"section":"Outro"},'
+    b'"lines":[{"lyrics":"","isChordLine":false},{"lyrics":"      ","isChordLine":true}]}'
+)
+_SECTION_FIELDS = ('tablature', 'chordDiagrams')
+_SECTION_HEADER = struct.Struct('<I')
+
+
+def _bytes(value) -> bytes:
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, str):
+        return value.encode()
+    return value
+
+
+def encode_arrangement(arrangement: dict) -> bytes:
+    sections = {'summary': {k: v for k, v in arrangement.items() if k not in _SECTION_FIELDS}}
+    for name in _SECTION_FIELDS:
+        if name in arrangement:
+            sections[name] = arrangement[name]
+    header = [b'NXA', bytes((1, len(sections)))]
+    payloads = []
+    for name, value in sections.items():
+        compressor = zlib.compressobj(9, zdict=_ZDICT)
+        payload = compressor.compress(orjson.dumps(value)) + compressor.flush()
+        header += [bytes((len(name),)), name.encode(), _SECTION_HEADER.pack(len(payload))]
+        payloads.append(payload)
+    return b''.join(header + payloads)
+
+
+def decode_arrangement(value) -> dict:
+    blob = _bytes(value)
+    if not blob.startswith(b'NXA'):
+        return orjson.loads(blob)
+    if blob[3] != 1:
+        raise ValueError(f'unsupported arrangement format version {blob[3]}')
+    entries, pos = [], 5
+    for _ in range(blob[4]):
+        size = blob[pos]
+        name = blob[pos + 1:pos + 1 + size].decode()
+        (length,) = _SECTION_HEADER.unpack_from(blob, pos + 1 + size)
+        entries.append((name, length))
+        pos += 1 + size + _SECTION_HEADER.size
+    result = {}
+    for name, length in entries:
+        decompressor = zlib.decompressobj(zdict=_ZDICT)
+        data = orjson.loads(decompressor.decompress(blob[pos:pos + length]) + decompressor.flush())
+        if name == 'summary':
+            result.update(data)
+        else:
+            result[name] = data
+        pos += length
+    return result
+
+
+def encode_progression(progression: str) -> bytes:
+    body = bytearray()
+    for token in progression.split(' '):
+        index = _CHORD_INDEX.get(token)
+        if index is not None:
+            body.append(index)
+            continue
+        raw = token.encode()
+        if not token or len(raw) > 255:
+            return b'NXP' + bytes((1, 1)) + zlib.compress(progression.encode(), 9)
+        body += bytes((_ESCAPE, len(raw))) + raw
+    return b'NXP' + bytes((1, 0)) + bytes(body)
+
+
+def decode_progression(value) -> str:
+    blob = _bytes(value)
+    if not blob.startswith(b'NXP'):
+        return blob.decode()
+    if blob[3] != 1:
+        raise ValueError(f'unsupported progression format version {blob[3]}')
+    if blob[4] == 1:
+        return zlib.decompress(blob[5:]).decode()
+    tokens, pos = [], 5
+    while pos < len(blob):
+        if blob[pos] == _ESCAPE:
+            size = blob[pos + 1]
+            tokens.append(blob[pos + 2:pos + 2 + size].decode())
+            pos += 2 + size
+        else:
+            tokens.append(CHORDS[blob[pos]])
+            pos += 1
+    return ' '.join(tokens)
+
+
+# ---------------------------
+# Conversion
+# ---------------------------
+
+# Each decoder also accepts the other format (legacy values have no magic
+# prefix), so both directions are idempotent and safe to re-run.
+def _arrangement_up(value):
+    return encode_arrangement(decode_arrangement(value))
+
+
+def _arrangement_down(value):
+    return json.dumps(decode_arrangement(value), separators=(',', ':')).encode()
+
+
+def _progression_up(value):
+    return encode_progression(decode_progression(value))
+
+
+def _progression_down(value):
+    return decode_progression(value).encode()
+
+
+# (table, column, nullable, upgrade converter, downgrade converter)
+COLUMNS = (
+    ('song_arrangements', 'arrangement', False, _arrangement_up, _arrangement_down),
+    ('chord_progressions', 'progression', True, _progression_up, _progression_down),
+)
+
+
+def _rewrite(table_name: str, column: str, convert) -> None:
+    """Rewrites every non-null value of table.column in id order, in batches."""
+    bind = op.get_bind()
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column(column, sa.LargeBinary))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, table.c[column])
+            .where(table.c.id > last_id, table.c[column].is_not(None))
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            table.update().where(table.c.id == sa.bindparam('row_id')).values({column: sa.bindparam('value')}),
+            [{'row_id': row_id, 'value': convert(value)} for row_id, value in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table_name, column, nullable, up, _ in COLUMNS:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column, existing_type=sa.Text(), type_=sa.LargeBinary(), existing_nullable=nullable,
+                postgresql_using=f"convert_to({column}, 'UTF8')",
+            )
+        _rewrite(table_name, column, up)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name, column, nullable, _, down in COLUMNS:
+        _rewrite(table_name, column, down)
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column, existing_type=sa.LargeBinary(), type_=sa.Text(), existing_nullable=nullable,
+                postgresql_using=f"convert_from({column}, 'UTF8')",
+            )
+        if op.get_bind().dialect.name == 'sqlite':
+            # SQLite keeps the rewritten values as BLOBs; store them as TEXT again.
+            op.execute(f"UPDATE {table_name} SET {column} = CAST({column} AS TEXT) WHERE {column} IS NOT NULL")
@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+
+# Importable as `app.*` however pytest is started, with quiet logs and no cache file.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
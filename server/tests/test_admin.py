@@ -0,0 +1,38 @@
+# tests/test_admin.py
+import asyncio
+
+import httpx
+import pytest
+
+from app.api.tokenUsage import token_usage
+from app.main import app
+from app.routers import admin
+
+
+def _get(path, headers=None):
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers or {})
+
+    return asyncio.run(request())
+
+
+@pytest.mark.parametrize("configured, headers, status", [
+    (None, {"X-Admin-Token": "secret"}, 404),
+    ("secret", {}, 403),
+    ("secret", {"X-Admin-Token": "wrong"}, 403),
+])
+def test_token_usage_requires_the_admin_token(monkeypatch, configured, headers, status):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", configured)
+    assert _get("/admin/usage", headers).status_code == status
+
+
+def test_token_usage_is_served_to_admins_only(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    token_usage.record("admin-test", "grok", "grok-3", 12, 34)
+
+    resp = _get("/admin/usage?recent=1", {"X-Admin-Token": "secret"})
+    assert resp.status_code == 200
+    assert resp.json()["recent"][0]["route"] == "admin-test"
+    assert _get("/ai/usage").status_code in (404, 405)
@@ -0,0 +1,182 @@
+# tests/test_cache.py
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import deadlines
+from app.cache import MemoryCache, SQLiteCache
+from app.routers import ai as ai_routes
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCache("test")
+    return SQLiteCache("test", str(tmp_path / "cache.sqlite3"))
+
+
+def test_fresh_entries_hit(cache):
+    cache.set("k", {"a": 1}, 60)
+    assert cache.get("k") == {"a": 1}
+    assert cache.get_entry("k") == ({"a": 1}, 0.0)
+
+
+def test_expired_entries_are_stale_until_stale_ttl_runs_out(cache):
+    cache.set("stale", [1], -10, 100)
+    cache.set("gone", [2], -10, 5)
+    assert cache.get("stale") is None
+    value, stale_for = cache.get_entry("stale")
+    assert value == [1] and stale_for == pytest.approx(10, abs=1)
+    assert cache.get_entry("gone") is None
+
+
+def test_only_one_claim_per_stale_entry(cache):
+    cache.set("k", 1, -1, 100)
+    cache.set("fresh", 1, 60, 100)
+    assert cache.claim_refresh("k", 30)
+    assert not cache.claim_refresh("k", 30)
+    assert not cache.claim_refresh("fresh", 30)
+    assert not cache.claim_refresh("missing", 30)
+
+
+def test_claim_does_not_make_the_entry_fresh(cache):
+    cache.set("k", 1, -50, 100)
+    assert cache.claim_refresh("k", 30)
+    # Still stale, and by as much as before the claim.
+    assert cache.get("k") is None
+    assert cache.get_entry("k")[1] == pytest.approx(50, abs=1)
+
+
+def test_claim_lapses_and_set_clears_it(cache):
+    cache.set("k", 1, -1, 100)
+    assert cache.claim_refresh("k", -1)   # already lapsed
+    assert cache.claim_refresh("k", 30)
+    cache.set("k", 2, -1, 100)
+    assert cache.claim_refresh("k", 30)
+
+
+def test_async_methods(cache):
+    async def scenario():
+        await cache.aset("k", "v", -1, 100)
+        claimed = await cache.aclaim_refresh("k", 30)
+        return await cache.aget("k"), (await cache.aget_entry("k"))[0], claimed
+
+    assert asyncio.run(scenario()) == (None, "v", True)
+
+
+def test_sqlite_files_from_before_stale_serving_are_upgraded(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cache_ai (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+    conn.execute("INSERT INTO cache_ai VALUES ('old', '1', ?)", (time.time() + 100,))
+    conn.commit()
+    conn.close()
+    cache = SQLiteCache("ai", path)
+    assert cache.get("old") is None
+    assert cache.get_entry("old")[0] == 1
+    assert cache.claim_refresh("old", 30)
+
+
+# ---------------------------
+# Stale serving in the AI routes
+# ---------------------------
+
+@pytest.fixture
+def stale_routes(monkeypatch):
+    cache = MemoryCache("ai-test")
+    monkeypatch.setattr(ai_routes, "ai_cache", cache)
+    monkeypatch.setattr(ai_routes.gemini_music_service, "available", False)
+    monkeypatch.setitem(ai_routes.AI_CACHE_TTLS, "melody", 60)
+    monkeypatch.setattr(ai_routes, "AI_STALE_WHILE_REVALIDATE", 100)
+    monkeypatch.setattr(ai_routes, "AI_STALE_IF_ERROR", 1000)
+    monkeypatch.setattr(ai_routes, "AI_STALE_TTL", 1000)
+    return cache
+
+
+def _call(grok):
+    async def gemini(*args):
+        raise AssertionError("Gemini is unavailable")
+
+    async def scenario():
+        result = await ai_routes._try_gemini_first("melody", gemini, grok, "C", "pop")
+        while ai_routes._refresh_tasks:
+            await asyncio.sleep(0)
+        return result
+
+    return asyncio.run(scenario())
+
+
+def _melody(name):
+    return {"scale": name, "key": "C", "notes": ["C4"], "intervals": [], "suggestion": "s"}
+
+
+def _cache_key():
+    return ai_routes._cache_key("melody", ("C", "pop"))
+
+
+def test_stale_result_is_served_and_refreshed_once(stale_routes):
+    stale_routes.set(_cache_key(), _melody("old"), -10, 1000)
+    calls = []
+
+    async def grok(*args):
+        calls.append(args)
+        return _melody("new")
+
+    assert _call(grok)["scale"] == "old"
+    assert len(calls) == 1
+    assert stale_routes.get(_cache_key())["scale"] == "new"
+
+
+def test_refresh_does_not_inherit_the_callers_deadline(stale_routes):
+    stale_routes.set(_cache_key(), _melody("old"), -10, 1000)
+    budgets = []
+
+    async def grok(*args):
+        budgets.append(deadlines.remaining())
+        return _melody("new")
+
+    async def gemini(*args):
+        raise AssertionError("Gemini is unavailable")
+
+    async def scenario():
+        # A caller that asked for a tiny X-Request-Timeout.
+        with deadlines.deadline(0.01):
+            result = await ai_routes._try_gemini_first("melody", gemini, grok, "C", "pop")
+        while ai_routes._refresh_tasks:
+            await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario())["scale"] == "old"
+    assert budgets[0] > 1
+    assert stale_routes.get(_cache_key())["scale"] == "new"
+
+
+def test_failed_refresh_keeps_the_entry_stale(stale_routes):
+    stale_routes.set(_cache_key(), _melody("old"), -10, 1000)
+
+    async def grok(*args):
+        raise RuntimeError("down")
+
+    assert _call(grok)["scale"] == "old"
+    assert stale_routes.get_entry(_cache_key())[1] == pytest.approx(10, abs=1)
+
+
+def test_stale_if_error_past_the_revalidate_window(stale_routes):
+    stale_routes.set(_cache_key(), _melody("old"), -500, 1000)
+
+    async def grok(*args):
+        raise RuntimeError("down")
+
+    assert _call(grok)["scale"] == "old"
+
+
+def test_no_stale_fallback_means_503(stale_routes):
+    async def grok(*args):
+        raise RuntimeError("down")
+
+    with pytest.raises(HTTPException) as e:
+        _call(grok)
+    assert e.value.status_code == 503
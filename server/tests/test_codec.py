@@ -0,0 +1,101 @@
+# tests/test_codec.py
+import importlib.util
+import pathlib
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import codec
+from app.api import arrangementStore
+from app.metrics import CACHE_REQUESTS
+from app.models import SongArrangement
+
+ARRANGEMENT = {
+    "songTitle": "Wonderwall",
+    "artist": "Oasis",
+    "key": "F# Minor",
+    "capoFret": 2,
+    "progressionSummary": ["Em7", "G", "Dsus4", "A7sus4"],
+    "chordDiagrams": [{"chord": "Em7", "frets": [0, 2, 2, 0, 3, 3], "fingers": [None, 1, 2, None, 3, 4]}],
+    "tablature": [{"section": "Intro", "lines": [{"lyrics": "Em7  G", "isChordLine": True}]}],
+    "practiceTips": ["Practice slowly"],
+}
+
+
+def test_arrangement_round_trip_and_partial_decode():
+    blob = codec.encode_arrangement(ARRANGEMENT)
+    assert blob.startswith(codec.ARRANGEMENT_MAGIC)
+    assert codec.decode_arrangement(blob) == ARRANGEMENT
+    assert codec.decode_arrangement(memoryview(blob)) == ARRANGEMENT
+    summary = codec.decode_arrangement(blob, sections=("summary",))
+    assert "tablature" not in summary and "chordDiagrams" not in summary
+    assert summary["songTitle"] == "Wonderwall"
+
+
+def test_legacy_json_still_decodes():
+    legacy = '{"songTitle":"Old","tablature":[]}'
+    assert codec.decode_arrangement(legacy) == {"songTitle": "Old", "tablature": []}
+    assert codec.decode_arrangement(legacy, sections=("summary",)) == {"songTitle": "Old"}
+    assert codec.decode_progression(b"C G Am F") == "C G Am F"
+
+
+@pytest.mark.parametrize("progression", [
+    "C G Am F", "Bbmaj7 Ebm9 F#sus4", "C G/B Am7b5 F", "C  G", "", "x" * 300, "Dø7 – G",
+])
+def test_progression_round_trip(progression):
+    blob = codec.encode_progression(progression)
+    assert codec.decode_progression(blob) == progression
+
+
+def test_known_chords_take_one_byte():
+    assert len(codec.encode_progression(["C", "G", "Am", "F"])) == 5 + 4
+
+
+def test_corrupt_blobs_raise_codec_errors():
+    blob = codec.encode_arrangement(ARRANGEMENT)
+    with pytest.raises(codec.CodecError):
+        codec.decode_arrangement(blob[:-10])
+    with pytest.raises(codec.CodecError):
+        codec.decode_arrangement(blob[:3] + b"\x09" + blob[4:])
+    with pytest.raises(codec.CodecError):
+        codec.decode_progression(codec.encode_progression("C G")[:5] + b"\xff\x09ab")
+
+
+@pytest.mark.parametrize("value", [
+    # section name that isn't UTF-8
+    codec.ARRANGEMENT_MAGIC + bytes((codec.FORMAT_VERSION, 1, 2)) + b"\xff\xfe" + b"\0" * 4,
+    b'{"songTitle": ',
+])
+def test_undecodable_arrangements_raise_codec_errors(value):
+    with pytest.raises(codec.CodecError):
+        codec.decode_arrangement(value)
+
+
+def test_corrupt_stored_arrangements_are_misses(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'arrangements.db'}")
+    SongArrangement.__table__.create(bind=engine)
+    sessions = sessionmaker(bind=engine)
+    monkeypatch.setattr(arrangementStore, "SessionLocal", sessions)
+    with sessions() as s:
+        s.add(SongArrangement(query_key="wonderwall", instrument="Guitar", simplified=False,
+                              arrangement=codec.encode_arrangement(ARRANGEMENT)[:-10]))
+        s.commit()
+
+    misses = CACHE_REQUESTS.value(cache="arrangements", result="miss")
+    assert arrangementStore.ArrangementStore().lookup("Wonderwall", "Guitar", False) is None
+    assert CACHE_REQUESTS.value(cache="arrangements", result="miss") == misses + 1
+
+
+def test_migration_keeps_a_faithful_copy_of_version_1():
+    path = next(pathlib.Path(__file__).parents[1].glob("migrations/versions/d2b8f4a61c07_*.py"))
+    spec = importlib.util.spec_from_file_location("compact_binary_storage", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    assert codec.FORMAT_VERSION == 1
+    assert migration.encode_arrangement(ARRANGEMENT) == codec.encode_arrangement(ARRANGEMENT)
+    assert migration.decode_arrangement(codec.encode_arrangement(ARRANGEMENT)) == ARRANGEMENT
+    for progression in ("C G Am F", "C G/B Am7b5", "C  G"):
+        assert migration.encode_progression(progression) == codec.encode_progression(progression)
+        assert migration.decode_progression(codec.encode_progression(progression)) == progression
@@ -0,0 +1,98 @@
+# tests/test_jam.py
+import asyncio
+
+import orjson
+import pytest
+
+from app import jam
+from app.jam import JamConnection, JamError, JamHub
+
+
+class FakeSocket:
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.stalled = stalled
+
+    async def send_text(self, text: str):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(orjson.loads(text))
+
+    async def close(self, code: int, reason: str = ""):
+        self.closed_with = code
+
+
+def test_ping_flood_keeps_only_the_newest_pong():
+    async def scenario():
+        conn = JamConnection(FakeSocket(), "p1", "guest")
+        for i in range(jam.JAM_SEND_QUEUE * 4):
+            conn.send_pong(i, 0.0)
+        assert len(conn._queue) == 0
+        conn.start()
+        await asyncio.sleep(0.01)
+        pongs = [m for m in conn.websocket.sent if m["type"] == "pong"]
+        await conn.stop()
+        return pongs
+
+    pongs = asyncio.run(scenario())
+    assert len(pongs) == 1
+    assert pongs[0]["t0"] == jam.JAM_SEND_QUEUE * 4 - 1
+    assert "t2" in pongs[0]
+
+
+def test_pings_ignored_once_closed():
+    conn = JamConnection(FakeSocket(), "p1", "guest")
+    conn.closed = True
+    conn.send_pong(1, 2.0)
+    assert conn._pong is None
+
+
+def test_overflowing_queue_closes_slow_consumer():
+    async def scenario():
+        socket = FakeSocket(stalled=True)
+        conn = JamConnection(socket, "p1", "guest")
+        conn.start()
+        for i in range(jam.JAM_SEND_QUEUE + 2):
+            conn.send(f'{{"type":"chat","n":{i}}}')
+        await asyncio.sleep(0.01)
+        await conn.stop()
+        return conn, socket
+
+    conn, socket = asyncio.run(scenario())
+    assert conn.closed
+    assert socket.closed_with == jam.CLOSE_SLOW_CONSUMER
+
+
+def test_leader_commands_and_tempo_reanchoring():
+    async def scenario():
+        hub = JamHub()
+        session, leader = hub.join("s", FakeSocket(), "leader")
+        _, follower = hub.join("s", FakeSocket(), "follower")
+        assert session.leader_id == leader.id
+
+        hub.handle(session, leader, orjson.dumps({"type": "start", "at": jam.server_ms() - 60000}).decode())
+        beat_before = (jam.server_ms() - session.start_at) * session.bpm / 60000
+        hub.handle(session, leader, orjson.dumps({"type": "tempo", "bpm": 60}).decode())
+        beat_after = (jam.server_ms() - session.start_at) * session.bpm / 60000
+
+        hub.handle(session, follower, orjson.dumps({"type": "stop"}).decode())
+        await asyncio.sleep(0.01)
+        errors = [m for m in follower.websocket.sent if m["type"] == "error"]
+        for conn in (leader, follower):
+            await hub.leave(session, conn)
+        return session, beat_before, beat_after, errors, hub
+
+    session, beat_before, beat_after, errors, hub = asyncio.run(scenario())
+    assert session.bpm == 60 and session.playing
+    assert abs(beat_after - beat_before) < 0.1
+    assert errors and "leader" in errors[0]["detail"]
+    assert hub.get("s") is None
+
+
+def test_invalid_tempo_rejected():
+    session = jam.JamSession("s")
+    conn = JamConnection(FakeSocket(), "p1", "guest")
+    session.leader_id = conn.id
+    with pytest.raises(JamError):
+        session.apply(conn, {"type": "tempo", "bpm": 1000})
@@ -0,0 +1,118 @@
+# tests/test_jobs.py
+import asyncio
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import jobs
+from app.jobs import InvalidJobPayload, JobQueue
+from app.models import GenerationJob, utcnow
+from app.routers import jobs as jobs_router
+
+
+def _queue(statuses):
+    queue = JobQueue(workers=0)
+
+    async def get(job_id):
+        return {"id": job_id, "status": statuses[job_id]}
+
+    queue.get = get
+    return queue
+
+
+def test_timed_out_waits_leave_no_events_behind():
+    queue = _queue({"a": "running", "b": "queued"})
+
+    async def scenario():
+        await asyncio.gather(queue.wait("a", 0.05), queue.wait("a", 0.1), queue.wait("b", 0.05))
+
+    asyncio.run(scenario())
+    assert queue._finished == {} and queue._waiters == {}
+
+
+def test_finished_job_wakes_waiters_early():
+    statuses = {"a": "running"}
+    queue = _queue(statuses)
+
+    async def scenario():
+        waiter = asyncio.create_task(queue.wait("a", 30))
+        await asyncio.sleep(0.01)
+        statuses["a"] = "succeeded"
+        queue._finished["a"].set()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario())["status"] == "succeeded"
+    assert queue._finished == {} and queue._waiters == {}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    GenerationJob.__table__.create(bind=engine)
+    sessions = sessionmaker(bind=engine)
+    monkeypatch.setattr(jobs, "SessionLocal", sessions)
+    return sessions
+
+
+def _insert(sessions, **fields):
+    values = {
+        "id": uuid.uuid4().hex, "kind": "melody", "payload": '{"key": "C", "style": "pop"}', "dedup_key": "k",
+        "status": "queued", "attempts": 0, "max_attempts": 3, "run_after": utcnow(),
+    }
+    with sessions() as s:
+        s.add(GenerationJob(**{**values, **fields}))
+        s.commit()
+    return values["id"]
+
+
+def _status(sessions, job_id):
+    with sessions() as s:
+        job = s.get(GenerationJob, job_id)
+        return job.status, job.attempts, job.error
+
+
+def test_malformed_bodies_are_rejected_on_submit(db):
+    queue = JobQueue(workers=0)
+    queue._load_handlers()
+    with pytest.raises(InvalidJobPayload) as e:
+        asyncio.run(queue.submit("melody", {"key": "C"}))
+    assert e.value.errors[0]["loc"] == ("style",)
+    with db() as s:
+        assert s.query(GenerationJob).count() == 0
+
+    jobs_router.job_queue, saved = queue, jobs_router.job_queue
+    try:
+        with pytest.raises(HTTPException) as http:
+            asyncio.run(jobs_router.submit_job("lesson", {"skill_level": "beginner"}, Response()))
+        assert http.value.status_code == 422
+    finally:
+        jobs_router.job_queue = saved
+
+
+def test_invalid_payloads_fail_without_retrying(db):
+    queue = JobQueue(workers=0)
+    queue._load_handlers()
+    job_id = _insert(db, payload='{"key": "C"}')
+    claimed = queue._claim()
+    asyncio.run(queue._run_one(claimed))
+    status, attempts, error = _status(db, job_id)
+    assert (status, attempts) == ("failed", 1)
+    assert "style" in error
+
+
+def test_expired_leases_are_recovered_only_with_attempts_left(db):
+    queue = JobQueue(workers=0)
+    queue.register("melody", lambda payload: None)
+    expired = utcnow() - timedelta(seconds=1)
+    retry_id = _insert(db, status="running", attempts=1, lease_expires_at=expired)
+    dead_id = _insert(db, status="running", attempts=3, lease_expires_at=expired)
+
+    claimed = queue._claim()
+    assert claimed[0] == retry_id and claimed[3] == 2
+    assert queue._claim() is None
+    assert _status(db, dead_id)[:2] == ("failed", 3)
+    assert _status(db, retry_id)[:2] == ("running", 2)
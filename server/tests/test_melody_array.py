@@ -0,0 +1,66 @@
+# tests/test_melody_array.py
+import importlib.util
+import pathlib
+
+import numpy as np
+import pytest
+
+from app.api.melodyArray import PPQ, MelodyArray, analyze
+
+
+def test_parses_names_rests_and_durations():
+    melody = MelodyArray.from_names("C4/4 E4/8 R/8 Bb3/2 c#5")
+    assert melody.pitch.tolist() == [60, 64, 58, 73]
+    assert melody.onset.tolist() == [0, PPQ, 2 * PPQ, 4 * PPQ]
+    assert melody.duration.tolist() == [PPQ, PPQ // 2, 2 * PPQ, PPQ]
+    assert melody.names() == ["C4", "E4", "A#3", "C#5"]
+    assert len(MelodyArray.from_names("H4 xyz 12")) == 0
+
+
+def test_bytes_round_trip():
+    melody = MelodyArray.from_names("C4/4 E4/8 R/8 G4/2")
+    blob = melody.to_bytes()
+    assert MelodyArray.from_bytes(blob) == melody
+    assert MelodyArray.coerce(memoryview(blob)) == melody
+    assert MelodyArray.coerce(b"C4/4 E4/8 R/8 G4/2") == melody
+    assert MelodyArray.from_bytes(MelodyArray([]).to_bytes()) == MelodyArray([])
+    with pytest.raises(ValueError):
+        MelodyArray.from_bytes(b"NXM\x02" + blob[4:])
+
+
+def test_range_intervals_and_contour():
+    melody = MelodyArray.from_names("C4 E4 E4 C5 G3")
+    assert (melody.pitch_min, melody.pitch_max, melody.span) == (55, 72, 17)
+    assert melody.intervals().tolist() == [4, 0, 8, -17]
+    assert melody.contour().tolist() == [1, 0, 1, -1]
+    histogram = melody.interval_histogram()
+    assert histogram[0] == histogram[4] == histogram[8] == histogram[17] == 1 and histogram.sum() == 4
+    assert melody.transpose(2).names()[:2] == ["D4", "F#4"]
+    assert MelodyArray.from_names("G9").transpose(12).pitch.tolist() == [127]
+    assert MelodyArray([]).span == 0 and MelodyArray([]).pitch_min is None
+
+
+def test_analyze_does_not_count_steps_between_melodies():
+    blobs = [MelodyArray.from_names("C4 D4").to_bytes(), b"", "C6 C6", MelodyArray.from_names("G3").to_bytes()]
+    stats = analyze(blobs)
+    assert stats["melodies"] == 4 and stats["notes"] == 5
+    assert stats["contour"] == {"up": 1, "down": 0, "repeat": 1}
+    assert stats["intervalHistogram"][2] == 1 and sum(stats["intervalHistogram"]) == 2
+    assert stats["withinOctave"] == 1.0
+    assert analyze([]) == {"melodies": 0, "notes": 0}
+
+
+def test_migration_keeps_a_faithful_copy_of_version_1():
+    path = next(pathlib.Path(__file__).parents[1].glob("migrations/versions/6f3a9c1e8b42_*.py"))
+    spec = importlib.util.spec_from_file_location("melody_arrays", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    for names in ("C4/4 E4/8 R/8 G4/2", "Bb3 c#5/16, R/4 | F-1/1.5", ""):
+        melody = MelodyArray.from_names(names)
+        row = migration._to_array(names.encode())
+        assert row["melody_data"] == melody.to_bytes()
+        assert (row["pitch_min"], row["pitch_max"], row["note_count"]) == (melody.pitch_min, melody.pitch_max, len(melody))
+        assert migration._to_array(row["melody_data"]) == row
+        assert migration._to_names(row["melody_data"])["melody_data"] == " ".join(melody.names()).encode()
+    assert np.array_equal(MelodyArray.coerce(migration._to_array(b"C4 G4")["melody_data"]).pitch, [60, 67])
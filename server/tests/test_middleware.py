@@ -0,0 +1,120 @@
+# tests/test_middleware.py
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app import deadlines
+from app.api.geminiService import gemini_music_service
+from app.main import app
+from app.metrics import REQUESTS_CANCELLED
+from app.middleware import ETagMiddleware
+
+
+async def _app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+def _call(method, if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    scope = {"type": "http", "method": method, "path": "/ai/melody", "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(ETagMiddleware(_app)(scope, receive, send))
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+
+def test_get_and_head_are_tagged_and_revalidate():
+    status, headers = _call("GET")
+    etag = headers[b"etag"].decode()
+    assert status == 200
+    assert _call("HEAD")[1][b"etag"].decode() == etag
+    assert _call("GET", etag)[0] == 304
+    assert _call("GET", f"W/{etag[:-1]}-gzip\"")[0] == 304
+
+
+def test_post_is_never_tagged_or_304():
+    status, headers = _call("POST")
+    assert status == 200 and b"etag" not in headers
+    assert _call("POST", "*")[0] == 200
+
+
+def test_deadline_responses_carry_cors_headers(monkeypatch):
+    async def stalls(key, style):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(deadlines, "DEADLINE_GRACE_SECONDS", 0)
+    monkeypatch.setattr(gemini_music_service, "available", True)
+    monkeypatch.setattr(gemini_music_service, "generate_melody", stalls)
+
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/ai/melody", json={"key": "F#", "style": "deadline-test"},
+                headers={"Origin": "http://localhost:5173", "X-Request-Timeout": "0.05"},
+            )
+
+    resp = asyncio.run(request())
+    assert resp.status_code == 504
+    assert resp.headers["access-control-allow-origin"] == "http://localhost:5173"
+
+
+def _deadline_call(inner, messages, headers=()):
+    scope = {"type": "http", "method": "POST", "path": "/ai/melody", "headers": list(headers)}
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        outer = asyncio.current_task()
+        await deadlines.DeadlineMiddleware(inner)(scope, receive, send)
+        return outer
+
+    return asyncio.run(run()), sent
+
+
+def test_client_disconnect_cancels_the_handler_with_499():
+    seen = {}
+
+    async def inner(scope, receive, send):
+        scope["route"] = SimpleNamespace(path="/ai/{route}")
+        seen["task"] = asyncio.current_task()
+        await receive()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            seen["cancelled"] = True
+            raise
+
+    before = REQUESTS_CANCELLED.value(route="/ai/{route}", reason="client_disconnect")
+    outer, sent = _deadline_call(inner, [{"type": "http.request", "body": b"{}"}])
+    assert seen["cancelled"]
+    # The handler ran in the request's own task, where the profiler looks.
+    assert seen["task"] is outer
+    assert sent[0]["status"] == deadlines.CLIENT_CLOSED_STATUS
+    assert REQUESTS_CANCELLED.value(route="/ai/{route}", reason="client_disconnect") == before + 1
+    assert REQUESTS_CANCELLED.value(route="/ai/melody", reason="client_disconnect") == 0
+
+
+def test_handler_timeouts_are_not_mistaken_for_the_deadline():
+    async def inner(scope, receive, send):
+        await asyncio.wait_for(asyncio.sleep(1), 0.01)
+
+    with pytest.raises(TimeoutError):
+        _deadline_call(inner, [{"type": "http.request", "body": b""}])
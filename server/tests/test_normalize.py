@@ -0,0 +1,100 @@
+# tests/test_normalize.py
+import pytest
+
+from app.api.normalize import NormalizationError, normalize
+from app.metrics import AI_NORMALIZED
+from app.schemas import ChordProgressionRequest, MelodySuggestionResult
+
+
+def _outcome(route, outcome):
+    return AI_NORMALIZED.value(route=route, provider="grok", outcome=outcome)
+
+
+def test_valid_payloads_pass_through_untouched():
+    data = {"scale": "C major", "key": "C", "notes": ["C4"], "intervals": [], "suggestion": "s"}
+    before = _outcome("melody", "valid")
+    assert normalize("melody", data, "grok") == MelodySuggestionResult(**data)
+    assert _outcome("melody", "valid") == before + 1
+    assert normalize("rhythm", {"anything": 1}) == {"anything": 1}
+
+
+def test_melody_string_is_parsed_into_notes_and_intervals():
+    before = _outcome("melody", "repaired")
+    result = normalize("melody", {"melody": "C4/4 E4/4 R/4 G4/2 C5/1", "description": "Arpeggio"}, "grok", key="C")
+    assert result.notes == ["C4", "E4", "G4", "C5"]
+    assert result.intervals == ["M3", "m3", "P4"]
+    assert (result.key, result.scale, result.suggestion) == ("C", "C major", "Arpeggio")
+    assert _outcome("melody", "repaired") == before + 1
+
+    minor = normalize("melody", {"notes": "A3, C4, E4", "key": "A minor"})
+    assert minor.notes == ["A3", "C4", "E4"] and minor.scale == "A natural minor"
+
+
+def test_improv_scales_and_techniques():
+    result = normalize("improv", {
+        "scales": "A minor pentatonic, A blues",
+        "techniques": ["Bends", "Slides"],
+        "response": "Lean on the blue note. ",
+        "targetNotes": ["A", "C"],
+    }, query="slow blues in A")
+    assert result.style == "slow blues in A"
+    assert result.recommendedScales == ["A minor pentatonic", "A blues"]
+    assert result.tips == ["Lean on the blue note.", "Bends", "Slides", "Target notes: A, C"]
+    assert result.backingTrackSearch == "slow blues in A backing track"
+
+
+def test_lyrics_structure_string_and_headers():
+    result = normalize("lyrics", {"structure": "verse-chorus-verse-pre-chorus-bridge", "lyrics": ["la", "la"]}, topic="rain")
+    assert result.structure == ["Verse", "Chorus", "Verse", "Pre-Chorus", "Bridge"]
+    assert (result.title, result.lyrics) == ("Rain", "la\nla")
+
+    from_headers = normalize("lyrics", {"title": "T", "lyrics": "[Verse 1]\nla\nChorus:\nlo\n"})
+    assert from_headers.structure == ["Verse 1", "Chorus"]
+
+
+def test_practice_advice_from_insights_and_goals():
+    result = normalize("practice-advice", {
+        "advice": "Slow down the changes.",
+        "insights": ["You practice daily", "Chord changes lag"],
+        "nextGoals": "Clean G to C; 80 bpm strumming",
+    })
+    assert result.insight == "You practice daily Chord changes lag"
+    assert result.recommendation == "Slow down the changes."
+    assert result.focusArea == "Clean G to C"
+
+    sparse = normalize("practice-advice", {"summary": "Keep going."})
+    assert (sparse.insight, sparse.recommendation, sparse.focusArea) == ("Keep going.", "Keep going.", "General practice")
+
+
+def test_lesson_title_duration_and_goals_from_markdown():
+    lesson = "# Barre Chords\n## Goals\n- Clean F barre\n- Move shapes\n## Drills\nPractice."
+    result = normalize("lesson", {"lesson": lesson, "duration": 30})
+    assert (result.title, result.duration) == ("Barre Chords", "30 mins")
+    assert result.goals == ["Clean F barre", "Move shapes"]
+    assert normalize("lesson", {"lesson": "Just play."}, focus="rhythm").title == "Rhythm Lesson"
+
+
+def test_chords_and_backing_track_fill_from_the_request():
+    request = ChordProgressionRequest(songQuery="Wonderwall", instrument="Piano")
+    result = normalize("chords", {"key": "F#m", "chordDiagrams": [{"chord": "Em7", "frets": ["x", 2, 2, 0, 3, 3], "fingers": []}]}, request=request)
+    assert (result.songTitle, result.instrument, result.artist) == ("Wonderwall", "Piano", "Unknown Artist")
+    assert result.chordDiagrams[0].frets[0] == "X"
+
+    track = normalize("backing-track", {"bpm": 90, "key": "E", "tracks": [
+        {"instrument": "Piano", "steps": [{"beat": 1, "notes": "E2"}]}, "junk",
+    ]}, prompt="funk groove")
+    assert (track.title, track.style) == ("funk groove", "funk groove")
+    assert track.tracks[0].instrument == "keys" and track.tracks[0].steps[0].notes == ["E2"]
+
+
+@pytest.mark.parametrize("route, data, message", [
+    ("melody", ["C4", "E4"], "expected a JSON object"),
+    ("melody", {"melody": "no notes here", "key": "C"}, "notes"),
+    ("backing-track", {"tracks": [{"instrument": "kazoo", "steps": []}], "bpm": 90, "key": "C"}, "tracks.0.instrument"),
+    ("chords", {"songTitle": "x"}, "key"),
+])
+def test_unrepairable_payloads_are_rejected(route, data, message):
+    before = AI_NORMALIZED.value(route=route, provider="grok", outcome="rejected")
+    with pytest.raises(NormalizationError, match=message):
+        normalize(route, data, "grok")
+    assert AI_NORMALIZED.value(route=route, provider="grok", outcome="rejected") == before + 1
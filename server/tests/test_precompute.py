@@ -0,0 +1,65 @@
+# tests/test_precompute.py
+import asyncio
+import threading
+
+import pytest
+
+from app import precompute
+from app.api.tokenUsage import token_usage
+from app.routers import ai as ai_routes
+
+
+def _variant(query, instrument="Guitar"):
+    return {"songId": 1, "songQuery": query, "instrument": instrument, "simplify": True,
+            "priority": 1.0, "demandScore": 3.0}
+
+
+@pytest.fixture
+def run(monkeypatch):
+    saved = []
+    monkeypatch.setattr(ai_routes.gemini_music_service, "available", False)
+    monkeypatch.setattr(precompute.arrangement_store, "save", lambda *args: saved.append(args))
+
+    def start(variants, grok, **kwargs):
+        monkeypatch.setattr(precompute, "plan", lambda top_n: (variants, 0))
+        monkeypatch.setattr(ai_routes.grok_service, "generate_song_arrangement", grok)
+        return asyncio.run(precompute.Precomputer().run(**kwargs)), saved
+
+    return start
+
+
+def test_generates_from_providers_not_the_cache(run, monkeypatch):
+    async def stale_route(request):
+        raise AssertionError("precompute must not go through the cached route")
+
+    monkeypatch.setattr(ai_routes, "generate_song_arrangement", stale_route)
+
+    async def grok(request):
+        return {"songTitle": request.songQuery, "artist": "A", "key": "C", "instrument": request.instrument}
+
+    report, saved = run([_variant("Song One"), _variant("Song Two", "Piano")], grok)
+    assert report["generated"] == 2 and report["failed"] == 0
+    assert {args[0] for args in saved} == {"Song One", "Song Two"}
+    assert saved[0][3]["songTitle"] == saved[0][0]
+
+
+def test_token_budget_counts_only_this_runs_spend(run):
+    async def grok(request):
+        token_usage.record("chords", "grok", "grok-beta", 100, 50)
+        # Other traffic in the same process while the run is going.
+        other = threading.Thread(target=token_usage.record, args=("melody", "grok", "grok-beta", 10_000, 10_000))
+        other.start()
+        other.join()
+        return {"songTitle": request.songQuery, "artist": "A", "key": "C", "instrument": request.instrument}
+
+    report, saved = run([_variant(f"Song {i}") for i in range(5)], grok, token_budget=300, concurrency=1)
+    assert report["tokens"] == 300
+    assert report["generated"] == 2 and report["stoppedEarly"] == "token budget"
+
+
+def test_tally_is_scoped_to_its_block():
+    token_usage.record("chords", "grok", "grok-beta", 5, 5)
+    with token_usage.tally() as spent:
+        token_usage.record("chords", "grok", "grok-beta", 7, 3)
+    token_usage.record("chords", "grok", "grok-beta", 5, 5)
+    assert spent.tokens == 10
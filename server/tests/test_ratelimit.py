@@ -0,0 +1,123 @@
+# tests/test_ratelimit.py
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from app.ratelimit import (
+    FairShare, MemoryStore, RateLimiter, RateLimitMiddleware, SQLiteStore, _used, _wait, evaluate,
+)
+
+MINUTE = [("minute", 60.0, 10)]
+
+
+def test_sliding_estimate_weights_previous_window():
+    # Half-way through the window, half of the previous window still counts.
+    assert _used(prev=10, curr=2, window=60, now=150) == pytest.approx(7.0)
+    assert _used(prev=10, curr=2, window=60, now=120) == pytest.approx(12.0)
+
+
+def test_evaluate_admits_until_the_limit():
+    states = [None]
+    for _ in range(10):
+        new_states, rejected, _, _ = evaluate(states, MINUTE, 1, now=60.0)
+        assert rejected is None
+        states = new_states
+    assert states == [(1, 0.0, 10.0)]
+    new_states, rejected, retry_after, remaining = evaluate(states, MINUTE, 1, now=90.0)
+    assert new_states is None and rejected == "minute" and remaining == 0.0
+    assert retry_after > 0
+
+
+def test_wait_is_when_the_request_first_fits():
+    # Full previous window, nothing in the current one: the weighted previous
+    # total has to decay to limit - cost.
+    prev, curr, cost, limit, window, now = 10.0, 0.0, 1.0, 10.0, 60.0, 120.0
+    wait = _wait(prev, curr, cost, limit, window, now)
+    assert wait == pytest.approx(6.0)
+    assert _used(prev, curr, window, now + wait) + cost == pytest.approx(limit)
+
+    # Current window full: not before the boundary, then the carried-over weight decays.
+    wait = _wait(0.0, 10.0, 1.0, 10.0, 60.0, 150.0)
+    assert wait == pytest.approx(30.0 + 6.0)
+
+
+def test_cost_above_the_limit_never_fits_this_window():
+    assert _wait(0.0, 0.0, 20.0, 10.0, 60.0, 0.0) == pytest.approx(120.0)
+
+
+def test_limits_are_per_caller():
+    limiter = RateLimiter(store=MemoryStore(), rules=(("minute", 60.0, 2),), capacity=8)
+    assert [limiter.check("ip:1.2.3.4", 1, now=60.0)[0] for _ in range(3)] == [None, None, "minute"]
+    assert limiter.check("ip:5.6.7.8", 1, now=60.0)[0] is None
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    a, b = SQLiteStore(path), SQLiteStore(path)
+    assert a.apply(["k"], MINUTE, 6, 0.0)[0] is None
+    rejected, retry_after, _ = b.apply(["k"], MINUTE, 6, 1.0)
+    assert rejected == "minute" and retry_after == pytest.approx(79.0)
+
+
+def test_fair_share_lets_light_callers_in_at_capacity():
+    fair = FairShare(capacity=2)
+    assert fair.acquire("heavy") and fair.acquire("heavy")
+    assert not fair.acquire("heavy")
+    assert fair.acquire("light")
+    fair.release("heavy")
+    assert fair.total == 2
+
+
+async def _echo(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _post(limiter, path, body, headers=None, ip="127.0.0.1"):
+    app = RateLimitMiddleware(_echo, limiter=limiter)
+
+    async def go():
+        transport = httpx.ASGITransport(app=app, client=(ip, 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, content=orjson.dumps(body), headers=headers or {})
+
+    return asyncio.run(go())
+
+
+def test_middleware_rejects_with_retry_after():
+    limiter = RateLimiter(store=MemoryStore(), rules=(("minute", 60.0, 3),), enabled=True)
+    first = _post(limiter, "/ai/chords", {"songQuery": "x"})
+    assert first.status_code == 200 and first.headers["x-ratelimit-remaining"] == "0"
+    second = _post(limiter, "/ai/chords", {"songQuery": "x"})
+    assert second.status_code == 429
+    assert int(second.headers["retry-after"]) >= 1
+    assert limiter.fair_share.total == 0
+
+
+def test_claimed_user_ids_are_not_trusted():
+    limiter = RateLimiter(store=MemoryStore(), rules=(("minute", 60.0, 3),), enabled=True)
+    assert _post(limiter, "/ai/chords", {}, {"X-User-Id": "victim"}, ip="10.0.0.1").status_code == 200
+    # Another client claiming the same id has its own budget, and rotating
+    # ids from one address doesn't buy a fresh one.
+    assert _post(limiter, "/ai/chords", {}, {"X-User-Id": "victim"}, ip="10.0.0.2").status_code == 200
+    assert _post(limiter, "/ai/chords", {}, {"X-User-Id": "other"}, ip="10.0.0.1").status_code == 429
+
+
+def test_rhythm_is_charged_only_when_described():
+    limiter = RateLimiter(store=MemoryStore(), rules=(("minute", 60.0, 1),), enabled=True)
+    body = {"timeSignature": "4/4", "level": "beginner"}
+    for _ in range(3):
+        resp = _post(limiter, "/ai/rhythm", body)
+        assert resp.status_code == 200 and orjson.loads(resp.content) == body
+    assert _post(limiter, "/ai/rhythm", {**body, "describe": True}).status_code == 200
+    described = _post(limiter, "/ai/rhythm", {**body, "describe": True})
+    assert described.status_code == 429
+    assert _post(limiter, "/ai/rhythm/practice-set", {**body, "describe": True}).status_code == 200
@@ -0,0 +1,42 @@
+# tests/test_replay_store.py
+import asyncio
+
+import pytest
+
+from app.api import geminiService
+from app.api.replayStore import ProviderStore, ReplayMissError
+
+
+def test_replay_returns_recordings_and_misses_explicitly(tmp_path):
+    store = ProviderStore("record", str(tmp_path))
+    store.record("grok", "grok-beta", "melody", "prompt", '{"notes": []}', 10, 20, 5.0)
+
+    replay = ProviderStore("replay", str(tmp_path))
+    entry = asyncio.run(replay.replay("grok", "grok-beta", "prompt"))
+    assert entry["text"] == '{"notes": []}' and entry["completionTokens"] == 20
+    with pytest.raises(ReplayMissError):
+        asyncio.run(replay.replay("grok", "grok-beta", "another prompt"))
+
+
+def test_memo_is_bounded_and_keeps_recent_entries(tmp_path):
+    store = ProviderStore("record", str(tmp_path), memo_size=2)
+    for i in range(3):
+        store.put(f"{i:064x}", {"text": str(i)})
+    store.get(f"{1:064x}")
+    store.put(f"{3:064x}", {"text": "3"})
+    assert list(store._memo) == [f"{1:064x}", f"{3:064x}"]
+    # Evicted entries are still served from disk.
+    assert store.get(f"{0:064x}") == {"text": "0"}
+    assert len(store._memo) == 2
+
+
+def test_gemini_replay_miss_falls_back_to_a_recorded_model(tmp_path, monkeypatch):
+    store = ProviderStore("replay", str(tmp_path))
+    fallback = geminiService.FALLBACK_MODELS[1]
+    store.record("gemini", fallback, "melody", "prompt", '{"ok": true}')
+    monkeypatch.setattr(geminiService, "provider_store", store)
+    monkeypatch.setattr(geminiService.gemini_music_service, "available", True)
+
+    assert asyncio.run(geminiService.gemini_music_service._generate_json("prompt", "melody")) == {"ok": True}
+    with pytest.raises(Exception, match="Service busy"):
+        asyncio.run(geminiService.gemini_music_service._generate_json("unrecorded", "melody"))
@@ -0,0 +1,82 @@
+# tests/test_rhythm.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.rhythmService import (
+    MAX_PRACTICE_SET, euclidean, normalize_level, parse_time_signature, rhythm_generator,
+)
+from app.routers import ai as ai_routes
+
+
+def _grid(hits):
+    return "".join("x" if h else "-" for h in hits)
+
+
+@pytest.mark.parametrize("pulses, steps, expected", [
+    (3, 8, "x--x--x-"),      # tresillo
+    (5, 8, "x-x-xx-x"),      # cinquillo, rotated to start on a hit
+    (4, 16, "x---x---x---x---"),
+    (0, 4, "----"),
+    (9, 4, "xxxx"),
+])
+def test_euclidean_spreads_pulses_evenly(pulses, steps, expected):
+    grid = euclidean(pulses, steps)
+    assert sum(grid) == min(pulses, steps)
+    assert _grid(grid) == expected
+
+
+def test_euclidean_rotation_and_empty():
+    assert euclidean(3, 8, rotation=8) == euclidean(3, 8)
+    assert _grid(euclidean(1, 4, rotation=1)) == "---x"
+    assert euclidean(3, 0) == []
+
+
+def test_time_signatures():
+    assert parse_time_signature("6/8").steps == 12
+    assert parse_time_signature(" 4/4 ").steps == 16
+    for bad in ("4", "4/3", "0/4", "x/4"):
+        with pytest.raises(ValueError):
+            parse_time_signature(bad)
+
+
+def test_levels_map_ui_labels():
+    assert normalize_level("Expert (Polyrhythmic)") == "expert"
+    assert normalize_level("nonsense") == "beginner"
+    assert normalize_level(None) == "beginner"
+
+
+def test_patterns_are_deterministic_and_start_on_beat_one():
+    a = rhythm_generator.generate("4/4", "intermediate", variant=2, seed=7)
+    b = rhythm_generator.generate("4/4", "intermediate", variant=2, seed=7)
+    assert a == b
+    assert a["grid"][0] == "x" and len(a["grid"]) == 16
+    assert a["pattern"][0]["beat"] == 1.0
+
+
+def test_practice_set_is_distinct_and_capped():
+    patterns = rhythm_generator.generate_practice_set("4/4", "advanced", count=6, seed=1)
+    assert len({p["grid"] for p in patterns}) == len(patterns) <= 6
+    assert len(rhythm_generator.generate_practice_set("4/4", "beginner", count=10 ** 6)) <= MAX_PRACTICE_SET
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"variant": "a"}, {"variant": 1.5}, {"variant": None, "seed": [1]}, {"syncopation": "lots"}, {"variant": True},
+])
+def test_bad_parameters_are_value_errors(kwargs):
+    with pytest.raises(ValueError):
+        rhythm_generator.generate("4/4", "beginner", **kwargs)
+
+
+@pytest.mark.parametrize("route, body", [
+    (ai_routes.generate_rhythm, {"timeSignature": "4/4", "level": "beginner", "variant": "x"}),
+    (ai_routes.generate_rhythm, {"level": "beginner"}),
+    (ai_routes.generate_rhythm, {"timeSignature": ["4/4"], "level": "beginner"}),
+    (ai_routes.generate_rhythm_practice_set, {"timeSignature": "4/4", "level": "beginner", "count": None}),
+    (ai_routes.generate_rhythm_practice_set, {"timeSignature": "4/4", "level": "beginner", "count": "8"}),
+])
+def test_routes_answer_400_for_bad_input(route, body):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(route(body))
+    assert e.value.status_code == 400
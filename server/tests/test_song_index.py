@@ -0,0 +1,106 @@
+# tests/test_song_index.py
+import threading
+
+import pytest
+
+from app.api.songIndex import MERGE_EVERY, SongIndex, canonical_query, dice, same_words, _trigrams
+
+SONGS = [
+    ("Wonderwall Oasis", 1),
+    ("Love Story Taylor Swift", 2),
+    ("Love Sara Bareilles", 3),
+    ("Perfect", 4),
+    ("Hotel California Eagles", 5),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SongIndex(path=str(tmp_path / "song_index.npz"))
+    index.build(SONGS)
+    return index
+
+
+@pytest.mark.parametrize("query", [
+    "wonderwall oasis",
+    "Oasis - Wonderwall",
+    "wonderwall by oasis chords",
+    "wonderwal oasis",
+    "Hotel Califórnia by the Eagles",
+])
+def test_resolves_spellings_of_the_same_song(index, query):
+    match = index.resolve(query)
+    assert match is not None
+    assert match.song_id in (1, 5)
+
+
+@pytest.mark.parametrize("query, other", [
+    ("Love Song Taylor Swift", "Love Story Taylor Swift"),
+    ("Love Song Sara Bareilles", "Love Sara Bareilles"),
+    ("Perfect Duet Ed Sheeran", "Perfect"),
+])
+def test_distinct_songs_do_not_merge(index, query, other):
+    assert index.resolve(query) is None
+    assert not same_words(canonical_query(query), canonical_query(other))
+
+
+def test_title_words_are_not_filler():
+    assert canonical_query("Love Song Sara Bareilles") != canonical_query("Love Sara Bareilles")
+    assert canonical_query("The Chords by Oasis") == canonical_query("oasis")
+
+
+def test_same_words_allows_one_typo_in_long_words_only():
+    assert same_words("oasis wonderwall", "oasis wonderwal")
+    assert same_words("oasis wonderwall", "oasis wonderwsll")
+    assert not same_words("love swift", "lose swift")
+    assert not same_words("oasis wonderwall", "oasis")
+
+
+def test_dice_bounds():
+    grams = _trigrams("oasis wonderwall")
+    assert dice(grams, grams) == 1.0
+    assert dice(grams, set()) == 0.0
+
+
+def test_pending_entries_resolve_before_and_after_merge(tmp_path):
+    index = SongIndex(path=str(tmp_path / "song_index.npz"))
+    index.build([])
+    index.add("Bohemian Rhapsody Queen", 7)
+    assert index.resolve("queen bohemian rhapsody").song_id == 7
+    for i in range(MERGE_EVERY):
+        index.add(f"filler song number {i} qzx{i}")
+    assert len(index._pending) < MERGE_EVERY
+    assert index.resolve("queen bohemian rhapsody").song_id == 7
+
+
+def test_resolve_during_concurrent_merges(tmp_path):
+    index = SongIndex(path=str(tmp_path / "song_index.npz"))
+    index.build(SONGS)
+    errors = []
+
+    def writer():
+        for i in range(MERGE_EVERY * 4):
+            index.add(f"generated tune {i} zq{i}", 1000 + i)
+
+    def reader():
+        try:
+            for _ in range(2000):
+                match = index.resolve("oasis wonderwall")
+                assert match is not None and match.song_id == 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_save_and_load_round_trip(index):
+    index.save()
+    loaded = SongIndex(path=index.path)
+    loaded.load()
+    assert len(loaded) == len(SONGS)
+    assert loaded.resolve("oasis - wonderwall").song_id == 1
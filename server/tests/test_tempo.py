@@ -0,0 +1,77 @@
+# tests/test_tempo.py
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from app.api.tempoService import TempoTracker, UnsupportedAudioError
+
+
+def click_track(bpm=120.0, seconds=12.0, rate=22050, channels=1, sampwidth=2, accent_every=4):
+    """Noise bursts on every beat, with a low thump on the first beat of each bar."""
+    rng = np.random.default_rng(0)
+    signal = np.zeros(int(seconds * rate), dtype=np.float64)
+    burst = int(0.03 * rate)
+    t = np.arange(int(0.08 * rate)) / rate
+    thump = np.sin(2 * np.pi * 60 * t) * np.exp(-t * 40)
+    for i, start in enumerate(np.arange(0.25, seconds - 0.1, 60.0 / bpm)):
+        s = int(start * rate)
+        signal[s:s + burst] += 0.5 * rng.standard_normal(burst) * np.exp(-np.arange(burst) / (burst / 4))
+        if i % accent_every == 0:
+            signal[s:s + thump.size] += 0.8 * thump[:signal.size - s]
+    signal = np.clip(signal, -1, 1)
+    if sampwidth == 2:
+        frames = (signal * 32767).astype("<i2")
+        frames = np.repeat(frames, channels).tobytes()
+    else:
+        ints = (signal * 8388607).astype(np.int32)
+        raw = np.stack([ints & 0xFF, (ints >> 8) & 0xFF, (ints >> 16) & 0xFF], axis=1).astype(np.uint8)
+        frames = np.repeat(raw, channels, axis=0).tobytes()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(rate)
+        w.writeframes(frames)
+    buf.seek(0)
+    return buf
+
+
+@pytest.mark.parametrize("bpm", [90.0, 120.0, 150.0])
+def test_tempo_and_beats_follow_the_clicks(bpm):
+    result = TempoTracker().analyze(click_track(bpm=bpm))
+    assert result["bpm"] == pytest.approx(bpm, rel=0.03)
+    gaps = np.diff(result["beats"])
+    assert np.median(gaps) == pytest.approx(60.0 / bpm, abs=0.03)
+    assert len(result["beats"]) >= 12 * bpm / 60 - 4
+
+
+def test_downbeats_land_on_the_accented_beats():
+    result = TempoTracker().analyze(click_track(bpm=120.0))
+    downbeats = np.array(result["downbeats"])
+    assert np.median(np.diff(downbeats)) == pytest.approx(2.0, abs=0.05)
+    # Accents sit at 0.25s + 2s * k; allow for the STFT frame offset.
+    phase = (downbeats - 0.25) % 2.0
+    assert np.all(np.minimum(phase, 2.0 - phase) < 0.1)
+
+
+def test_stereo_24_bit_44k_is_downmixed_and_decimated():
+    result = TempoTracker().analyze(click_track(rate=44100, channels=2, sampwidth=3))
+    assert result["bpm"] == pytest.approx(120.0, rel=0.03)
+    assert result["duration"] == pytest.approx(12.0, abs=0.01)
+
+
+def test_results_are_cached_per_upload_and_meter():
+    tracker = TempoTracker()
+    upload = click_track()
+    first = tracker.analyze(upload)
+    assert tracker.analyze(upload) is first
+    assert tracker.analyze(upload, beats_per_bar=3) is not first
+
+
+def test_rejects_short_and_non_wav_uploads():
+    with pytest.raises(ValueError):
+        TempoTracker().analyze(click_track(seconds=1.0))
+    with pytest.raises(UnsupportedAudioError):
+        TempoTracker().analyze(io.BytesIO(b"ID3 not a wav file at all"))